@@ -0,0 +1,151 @@
+import threading
+import time
+
+# Sibling paths under one directory beyond this count collapse into a single prefix purge
+COLLAPSE_THRESHOLD = 20
+MAX_TAGS_PER_REQUEST = 10
+COALESCE_WINDOW = 2.0
+
+
+def _normalize_path(path):
+    path = "/" + str(path).strip().lstrip("/")
+    return path.split("?", 1)[0].split("#", 1)[0]
+
+
+def _is_prefix(path):
+    return path.endswith("/*")
+
+
+def _covered(path, prefixes):
+    """True if a prefix purge already invalidates `path` (exact or narrower prefix)."""
+    for prefix in prefixes:
+        base = prefix[:-1]
+        if path != prefix and path.startswith(base):
+            return True
+    return False
+
+
+def collapse_paths(paths, threshold=COLLAPSE_THRESHOLD):
+    """Dedupes paths and folds them into the fewest exact/prefix ('/dir/*') invalidations."""
+    paths = {_normalize_path(p) for p in paths if str(p).strip()}
+    if "/*" in paths:
+        return ["/*"]
+
+    # Many siblings in the same directory cost more calls than one prefix purge
+    by_dir = {}
+    for p in paths:
+        if not _is_prefix(p):
+            by_dir.setdefault(p.rsplit("/", 1)[0], []).append(p)
+    for directory, members in by_dir.items():
+        # Root-level files never collapse: '/*' would purge the whole cache
+        if directory and len(members) >= threshold:
+            paths.difference_update(members)
+            paths.add(directory + "/*")
+
+    prefixes = sorted((p for p in paths if _is_prefix(p)), key=len)
+    kept_prefixes = []
+    for prefix in prefixes:
+        if not _covered(prefix, kept_prefixes):
+            kept_prefixes.append(prefix)
+    exact = [p for p in paths if not _is_prefix(p) and not _covered(p, kept_prefixes)]
+    return sorted(kept_prefixes) + sorted(exact)
+
+
+def add_targets(targets, paths=None, hosts=None):
+    """Adds one request's purge targets to `targets`, a {host or None (every host): set of paths} map.
+
+    Each host gets exactly the request's own paths, so merging requests never
+    narrows what any of them purges; hosts without paths purge '/*'.
+    """
+    hosts = sorted({h.strip().lower() for h in (hosts or []) if h and h.strip()})
+    paths = [p for p in (paths or []) if str(p).strip()]
+    if not paths and hosts:
+        # Host-only purge: everything served for that host
+        paths = ["/*"]
+    if paths:
+        for host in hosts or [None]:
+            targets.setdefault(host, set()).update(paths)
+    return targets
+
+
+def plan_invalidations(paths=None, hosts=None, tags=None, threshold=COLLAPSE_THRESHOLD, targets=None):
+    """Builds the minimal list of invalidateCache request bodies for the given targets.
+
+    Pass either one request's paths/hosts or `targets` merged with add_targets.
+    Host-specific paths already purged on every host are dropped.
+    """
+    if targets is None:
+        targets = add_targets({}, paths, hosts)
+    tags = sorted({t.strip() for t in (tags or []) if t and t.strip()})
+
+    everywhere = collapse_paths(targets.get(None, []), threshold)
+    wide = [p for p in everywhere if _is_prefix(p)]
+    bodies = [{"path": path} for path in everywhere]
+    for host in sorted(h for h in targets if h is not None):
+        for path in collapse_paths(targets[host], threshold):
+            if path not in everywhere and not _covered(path, wide):
+                bodies.append({"host": host, "path": path})
+
+    for i in range(0, len(tags), MAX_TAGS_PER_REQUEST):
+        bodies.append({"cacheTags": tags[i:i + MAX_TAGS_PER_REQUEST]})
+    return bodies
+
+
+class RateLimiter:
+    """Token bucket limiting calls per minute against the invalidation quota."""
+
+    def __init__(self, per_minute, burst=None):
+        self.rate = per_minute / 60.0
+        self.capacity = burst or max(1, per_minute)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class InvalidationCoalescer:
+    """Merges invalidation requests for the same service that arrive within `window` seconds.
+
+    The first request for a service opens a batch and schedules `flush(service_id,
+    batch)`; later requests inside the window join it and share its batch ID.
+    Each request's (hosts, paths) target is kept per host (see add_targets).
+    """
+
+    def __init__(self, flush, window=COALESCE_WINDOW):
+        self.flush = flush
+        self.window = window
+        self._batches = {}
+        self._lock = threading.Lock()
+
+    def submit(self, service_id, paths=None, hosts=None, tags=None, new_batch_id=None):
+        """Returns (batch_id, joined_existing_batch)."""
+        with self._lock:
+            batch = self._batches.get(service_id)
+            joined = batch is not None
+            if not joined:
+                batch = {"id": new_batch_id(), "targets": {}, "tags": set(), "requests": 0}
+                self._batches[service_id] = batch
+                timer = threading.Timer(self.window, self._fire, args=(service_id,))
+                timer.daemon = True
+                timer.start()
+            add_targets(batch["targets"], paths, hosts)
+            batch["tags"].update(tags or [])
+            batch["requests"] += 1
+            return batch["id"], joined
+
+    def _fire(self, service_id):
+        with self._lock:
+            batch = self._batches.pop(service_id, None)
+        if batch:
+            self.flush(service_id, batch)
@@ -0,0 +1,220 @@
+import hashlib
+import json
+
+from config_validator import READ_ONLY_FIELDS
+
+
+def _copy_json(value):
+    if isinstance(value, dict):
+        return {k: _copy_json(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_copy_json(v) for v in value]
+    return value
+
+
+def _canonical_json_value(value):
+    """Drops unset values (None, {}, []) recursively so absent and empty compare equal."""
+    if isinstance(value, ConfigModel):
+        return value.canonical()
+    if isinstance(value, dict):
+        out = {k: _canonical_json_value(v) for k, v in value.items()}
+        return {k: v for k, v in out.items() if v not in (None, {}, [])}
+    if isinstance(value, list):
+        return [_canonical_json_value(v) for v in value]
+    return value
+
+
+def _same_scalar(a, b):
+    if a == b:
+        return True
+    # int64 fields (e.g. priority) come back from the API as strings
+    return isinstance(a, (int, str)) and isinstance(b, (int, str)) and not isinstance(a, bool) and str(a) == str(b)
+
+
+def structural_diff(old, new, path="", out=None):
+    """Lists differences as {"path", "change", "stored", "live"}; change is added, removed or changed."""
+    out = [] if out is None else out
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key in sorted(set(old) | set(new)):
+            child = f"{path}.{key}" if path else key
+            if key not in new:
+                out.append({"path": child, "change": "removed", "stored": old[key]})
+            elif key not in old:
+                out.append({"path": child, "change": "added", "live": new[key]})
+            else:
+                structural_diff(old[key], new[key], child, out)
+    elif isinstance(old, list) and isinstance(new, list):
+        for idx in range(max(len(old), len(new))):
+            child = f"{path}[{idx}]"
+            if idx >= len(new):
+                out.append({"path": child, "change": "removed", "stored": old[idx]})
+            elif idx >= len(old):
+                out.append({"path": child, "change": "added", "live": new[idx]})
+            else:
+                structural_diff(old[idx], new[idx], child, out)
+    elif not _same_scalar(old, new):
+        out.append({"path": path, "change": "changed", "stored": old, "live": new})
+    return out
+
+
+class ConfigModel:
+    """Base for the typed config models.
+
+    FIELDS maps API field names (also the slot names) to None for plain JSON
+    values, a ConfigModel subclass, or [Subclass] for repeated messages.
+    Unknown fields are kept in _extra so API bodies round-trip unchanged.
+    content_hash() is cached; call touch() after changing nested values in place.
+    """
+
+    __slots__ = ("_extra", "_digest")
+    FIELDS = {}
+    READ_ONLY = ()
+    INT64_FIELDS = ()
+
+    @classmethod
+    def from_api(cls, data):
+        """Parses an API JSON object, dropping read-only fields. The result shares nothing with `data`."""
+        if isinstance(data, ConfigModel):
+            return data.copy()
+        if not isinstance(data, dict):
+            raise Exception(f"{cls.__name__} expects a JSON object, got {type(data).__name__}")
+        obj = cls.__new__(cls)
+        extra = None
+        for name in cls.FIELDS:
+            object.__setattr__(obj, name, None)
+        for key, value in data.items():
+            if key in cls.READ_ONLY:
+                continue
+            kind = cls.FIELDS.get(key, False)
+            if kind is False:
+                extra = extra or {}
+                extra[key] = _copy_json(value)
+            elif value is None or kind is None:
+                object.__setattr__(obj, key, _copy_json(value))
+            elif isinstance(kind, list):
+                object.__setattr__(obj, key, [kind[0].from_api(item) for item in value])
+            else:
+                object.__setattr__(obj, key, kind.from_api(value))
+        object.__setattr__(obj, "_extra", extra)
+        object.__setattr__(obj, "_digest", None)
+        return obj
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name != "_digest":
+            object.__setattr__(self, "_digest", None)
+
+    def touch(self):
+        object.__setattr__(self, "_digest", None)
+
+    def to_dict(self):
+        """API body as a fresh dict (field order as declared, unknown fields last)."""
+        out = {}
+        for name in self.FIELDS:
+            value = getattr(self, name)
+            if value is None:
+                continue
+            if isinstance(value, ConfigModel):
+                out[name] = value.to_dict()
+            elif isinstance(value, list) and value and isinstance(value[0], ConfigModel):
+                out[name] = [item.to_dict() for item in value]
+            else:
+                out[name] = _copy_json(value)
+        if self._extra:
+            out.update(_copy_json(self._extra))
+        return out
+
+    def canonical(self):
+        """Normalized form for hashing and diffs: unset values dropped, int64 fields as strings."""
+        out = {}
+        for name in self.FIELDS:
+            value = getattr(self, name)
+            if name in self.INT64_FIELDS and value is not None:
+                value = str(value)
+            out[name] = _canonical_json_value(value)
+        for name, value in (self._extra or {}).items():
+            out[name] = _canonical_json_value(value)
+        return {k: v for k, v in out.items() if v not in (None, {}, [])}
+
+    def canonical_json(self):
+        return json.dumps(self.canonical(), sort_keys=True, separators=(",", ":"))
+
+    def content_hash(self):
+        if self._digest is None:
+            object.__setattr__(self, "_digest", hashlib.sha256(self.canonical_json().encode()).hexdigest())
+        return self._digest
+
+    def diff(self, other):
+        """Structural differences from self (reported as 'stored') to other ('live')."""
+        return structural_diff(self.canonical(), other.canonical())
+
+    def copy(self):
+        return type(self).from_api(self.to_dict())
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.content_hash() == other.content_hash()
+
+    def __hash__(self):
+        return hash(self.content_hash())
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.content_hash()[:12]})"
+
+
+class CdnPolicy(ConfigModel):
+    FIELDS = dict.fromkeys([
+        "cacheMode", "defaultTtl", "maxTtl", "clientTtl", "cacheKeyPolicy", "negativeCaching", "negativeCachingPolicy",
+        "signedRequestMode", "signedRequestKeyset", "signedRequestMaximumExpirationTtl", "signedTokenOptions", "addSignatures"
+    ])
+    __slots__ = tuple(FIELDS)
+
+
+class RouteAction(ConfigModel):
+    FIELDS = {"cdnPolicy": CdnPolicy, "corsPolicy": None, "urlRewrite": None, "compressionMode": None}
+    __slots__ = tuple(FIELDS)
+
+
+class RouteRule(ConfigModel):
+    FIELDS = {"priority": None, "description": None, "matchRules": None, "origin": None, "headerAction": None,
+              "routeAction": RouteAction, "urlRedirect": None, "routeMethods": None}
+    __slots__ = tuple(FIELDS)
+    INT64_FIELDS = ("priority",)
+
+    @property
+    def cdn_policy(self):
+        return self.routeAction.cdnPolicy if self.routeAction is not None else None
+
+
+class PathMatcher(ConfigModel):
+    FIELDS = {"name": None, "description": None, "routeRules": [RouteRule]}
+    __slots__ = tuple(FIELDS)
+
+
+class Routing(ConfigModel):
+    FIELDS = {"hostRules": None, "pathMatchers": [PathMatcher]}
+    __slots__ = tuple(FIELDS)
+
+
+class ServiceConfig(ConfigModel):
+    """An edgeCacheService without its read-only fields."""
+
+    FIELDS = {"description": None, "labels": None, "routing": Routing, "logConfig": None, "edgeSslCertificates": None,
+              "edgeSecurityPolicy": None, "requireTls": None, "disableQuic": None, "disableHttp2": None}
+    __slots__ = tuple(FIELDS)
+    READ_ONLY = tuple(READ_ONLY_FIELDS)
+
+    def route_rules(self):
+        if self.routing is None:
+            return []
+        return [rule for pm in self.routing.pathMatchers or [] for rule in pm.routeRules or []]
+
+
+class OriginConfig(ConfigModel):
+    """An edgeCacheOrigin without its read-only fields."""
+
+    FIELDS = dict.fromkeys([
+        "originAddress", "protocol", "port", "maxAttempts", "timeout", "retryConditions", "failoverOrigin",
+        "originOverrideAction", "originRedirect", "description", "labels"
+    ])
+    __slots__ = tuple(FIELDS)
+    READ_ONLY = tuple(READ_ONLY_FIELDS)
@@ -0,0 +1,451 @@
+import re
+
+# Fields returned by the API that must never be sent back on create/update
+READ_ONLY_FIELDS = ["updateTime", "createTime", "etag", "ipv4Addresses", "ipv6Addresses", "name"]
+
+VALID_CACHE_MODES = ["CACHE_ALL_STATIC", "USE_ORIGIN_HEADERS", "FORCE_CACHE_ALL", "BYPASS_CACHE"]
+VALID_SIGNED_REQUEST_MODES = ["DISABLED", "REQUIRE_SIGNATURES", "REQUIRE_TOKENS"]
+VALID_COMPRESSION_MODES = ["DISABLED", "AUTOMATIC"]
+# Status codes negativeCachingPolicy accepts, and its TTL ceiling in seconds
+NEGATIVE_CACHING_CODES = {204, 206, 300, 301, 302, 303, 304, 307, 308, 400, 403, 404, 405, 410, 421, 451, 501}
+MAX_NEGATIVE_CACHING_TTL = 1800
+MAX_CACHE_KEY_QUERY_PARAMETERS = 10
+MAX_CACHE_KEY_HEADERS = 5
+VALID_ORIGIN_PROTOCOLS = ["HTTP2", "HTTPS", "HTTP"]
+VALID_RETRY_CONDITIONS = ["CONNECT_FAILURE", "HTTP_5XX", "GATEWAY_ERROR", "RETRIABLE_4XX", "NOT_FOUND", "FORBIDDEN"]
+# Allowed range (seconds) and API default for each edgeCacheOrigin timeout
+ORIGIN_TIMEOUTS = {
+    "connectTimeout": (1, 15, 5),
+    "maxAttemptsTimeout": (1, 30, 15),
+    "responseTimeout": (1, 120, 30),
+    "readTimeout": (1, 30, 15),
+}
+# Cache fill attempts across an origin and all of its failover origins
+MAX_FILL_ATTEMPTS = 4
+
+_DURATION_RE = re.compile(r"^(\d+)(\.\d{1,9})?s$")
+_VARIABLE_RE = re.compile(r"^\{([A-Za-z_][A-Za-z0-9_]*)(?:=([^{}]*))?\}$")
+
+
+def parse_duration(value):
+    """Parses an API duration string such as '3600s' into seconds (float)."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _DURATION_RE.match(str(value or ""))
+    if not match:
+        raise ValueError(f"Invalid duration '{value}' (expected e.g. '3600s')")
+    return float(match.group(1) + (match.group(2) or ""))
+
+
+def _segment_to_regex(segment):
+    """Translates a single pathTemplateMatch segment (no slashes) into a regex."""
+    var = _VARIABLE_RE.match(segment)
+    if var:
+        inner = var.group(2)
+        if inner is None or inner == "*":
+            return "[^/]+"
+        return _segment_to_regex(inner)
+    out = []
+    i = 0
+    while i < len(segment):
+        if segment.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif segment[i] == "*":
+            out.append("[^/]*")
+            i += 1
+        else:
+            out.append(re.escape(segment[i]))
+            i += 1
+    return "".join(out)
+
+
+def compile_path_template(pattern, ignore_case=False):
+    """Compiles a Media CDN pathTemplateMatch pattern into a regular expression.
+
+    '*' matches within one path segment and '**' matches any number of segments,
+    including the leading part of a segment as in '/**.m3u8'.
+    """
+    parts = pattern.split("/")[1:]
+    regex = ""
+    for idx, part in enumerate(parts):
+        is_last = idx == len(parts) - 1
+        var = _VARIABLE_RE.match(part)
+        if part == "**" or (var and var.group(2) == "**"):
+            # Zero or more complete segments
+            regex += "(?:/.*)?" if is_last else "(?:/[^/]+)*"
+            continue
+        if part.startswith("**"):
+            # '/**.ext' style: any number of segments followed by a segment suffix
+            regex += "/.*" + _segment_to_regex(part[2:])
+            continue
+        regex += "/" + _segment_to_regex(part)
+    flags = re.IGNORECASE if ignore_case else 0
+    return re.compile("^" + (regex or "/") + "$", flags)
+
+
+def _check_path_template(pattern):
+    if not isinstance(pattern, str) or not pattern.startswith("/"):
+        return "pathTemplateMatch must start with '/'"
+    if len(pattern) > 255:
+        return "pathTemplateMatch must be at most 255 characters"
+    if pattern.count("**") > 1:
+        return "pathTemplateMatch may contain at most one '**' operator"
+    if pattern.count("{") != pattern.count("}"):
+        return "pathTemplateMatch has unbalanced variable braces"
+    names = re.findall(r"\{([^}=]*)", pattern)
+    if len(names) != len(set(names)):
+        return "pathTemplateMatch declares the same variable more than once"
+    try:
+        compile_path_template(pattern)
+    except re.error as e:
+        return f"pathTemplateMatch could not be compiled: {e}"
+    return None
+
+
+# Representative expansions used to decide whether one pattern covers another
+_WILDCARD_SAMPLES = [("x", "x"), ("a/b/c", "seg"), ("", "Y-1")]
+
+
+def _sample_paths(match_rule):
+    """Builds concrete paths that a match rule is known to accept."""
+    if "fullPathMatch" in match_rule:
+        return [match_rule["fullPathMatch"]]
+    if "prefixMatch" in match_rule:
+        prefix = match_rule["prefixMatch"]
+        return [prefix, prefix.rstrip("/") + "/x/y.z"]
+    pattern = match_rule.get("pathTemplateMatch")
+    if not pattern:
+        return []
+    samples = []
+    for double, single in _WILDCARD_SAMPLES:
+        path = re.sub(r"\{[^}]*=\*\*\}", "**", pattern)
+        path = re.sub(r"\{[^}]*\}", "*", path)
+        path = path.replace("**", "\0").replace("*", single).replace("\0", double)
+        samples.append(re.sub(r"/+", "/", path))
+    return samples
+
+
+def _matcher_for(match_rule):
+    """Returns a callable(path) for a match rule, or None if it has extra conditions."""
+    if match_rule.get("headerMatches") or match_rule.get("queryParameterMatches"):
+        return None
+    ignore_case = match_rule.get("ignoreCase", False)
+    if "fullPathMatch" in match_rule:
+        full = match_rule["fullPathMatch"]
+        if ignore_case:
+            return lambda p: p.lower() == full.lower()
+        return lambda p: p == full
+    if "prefixMatch" in match_rule:
+        prefix = match_rule["prefixMatch"]
+        if ignore_case:
+            return lambda p: p.lower().startswith(prefix.lower())
+        return lambda p: p.startswith(prefix)
+    if "pathTemplateMatch" in match_rule:
+        regex = compile_path_template(match_rule["pathTemplateMatch"], ignore_case)
+        return lambda p: regex.match(p) is not None
+    return None
+
+
+def _rule_covers(broad_rule, narrow_rule):
+    """True if every matchRule of narrow_rule is accepted by some matchRule of broad_rule."""
+    matchers = [m for m in (_matcher_for(mr) for mr in broad_rule.get("matchRules", [])) if m]
+    if not matchers:
+        return False
+    for mr in narrow_rule.get("matchRules", []):
+        samples = _sample_paths(mr)
+        if not samples:
+            return False
+        if not any(all(m(s) for s in samples) for m in matchers):
+            return False
+    return True
+
+
+def _resource_id(name):
+    """Reduces a full resource name to its short ID for inventory lookups."""
+    return str(name).rstrip("/").rsplit("/", 1)[-1]
+
+
+def _exists(inventory, kind, name):
+    return inventory is None or _resource_id(name) in inventory.get(kind, set())
+
+
+def _validate_cdn_policy(policy, path, inventory, errors):
+    mode = policy.get("cacheMode")
+    if mode and mode not in VALID_CACHE_MODES:
+        errors.append({"path": f"{path}.cacheMode", "message": f"Unknown cacheMode '{mode}'"})
+
+    ttls = {}
+    for field in ["defaultTtl", "maxTtl", "clientTtl", "signedRequestMaximumExpirationTtl"]:
+        if field in policy:
+            try:
+                ttls[field] = parse_duration(policy[field])
+            except ValueError as e:
+                errors.append({"path": f"{path}.{field}", "message": str(e)})
+    if ttls.get("defaultTtl", 0) > 31536000:
+        errors.append({"path": f"{path}.defaultTtl", "message": "defaultTtl cannot exceed 31536000s (1 year)"})
+    if "maxTtl" in ttls:
+        for field in ["defaultTtl", "clientTtl"]:
+            if field in ttls and ttls[field] > ttls["maxTtl"]:
+                errors.append({"path": f"{path}.{field}", "message": f"{field} must not exceed maxTtl"})
+    if mode == "BYPASS_CACHE":
+        for field in ["defaultTtl", "maxTtl", "clientTtl"]:
+            if field in policy:
+                errors.append({"path": f"{path}.{field}", "message": f"{field} cannot be set when cacheMode is BYPASS_CACHE"})
+    if mode == "USE_ORIGIN_HEADERS" and "defaultTtl" in policy:
+        errors.append({"path": f"{path}.defaultTtl", "message": "defaultTtl cannot be set when cacheMode is USE_ORIGIN_HEADERS"})
+
+    key_policy = policy.get("cacheKeyPolicy") or {}
+    set_fields = [f for f in ["excludeQueryString", "includedQueryParameters", "excludedQueryParameters"] if key_policy.get(f)]
+    if len(set_fields) > 1:
+        errors.append({"path": f"{path}.cacheKeyPolicy", "message": f"Only one of {', '.join(set_fields)} may be set"})
+    for field, limit in [("includedQueryParameters", MAX_CACHE_KEY_QUERY_PARAMETERS), ("excludedQueryParameters", MAX_CACHE_KEY_QUERY_PARAMETERS),
+                         ("includedHeaderNames", MAX_CACHE_KEY_HEADERS)]:
+        if len(key_policy.get(field, [])) > limit:
+            errors.append({"path": f"{path}.cacheKeyPolicy.{field}", "message": f"At most {limit} entries are allowed"})
+
+    negative_policy = policy.get("negativeCachingPolicy") or {}
+    if negative_policy and not policy.get("negativeCaching"):
+        errors.append({"path": f"{path}.negativeCachingPolicy", "message": "negativeCachingPolicy requires negativeCaching to be true"})
+    if policy.get("negativeCaching") and mode == "BYPASS_CACHE":
+        errors.append({"path": f"{path}.negativeCaching", "message": "negativeCaching cannot be enabled when cacheMode is BYPASS_CACHE"})
+    for code, ttl in negative_policy.items():
+        code_path = f"{path}.negativeCachingPolicy.{code}"
+        if not str(code).isdigit() or int(code) not in NEGATIVE_CACHING_CODES:
+            errors.append({"path": code_path, "message": f"Status code {code} cannot be negatively cached"})
+        try:
+            if parse_duration(ttl) > MAX_NEGATIVE_CACHING_TTL:
+                errors.append({"path": code_path, "message": f"Negative caching TTL cannot exceed {MAX_NEGATIVE_CACHING_TTL}s"})
+        except ValueError as e:
+            errors.append({"path": code_path, "message": str(e)})
+
+    signed_mode = policy.get("signedRequestMode", "DISABLED")
+    if signed_mode not in VALID_SIGNED_REQUEST_MODES:
+        errors.append({"path": f"{path}.signedRequestMode", "message": f"Unknown signedRequestMode '{signed_mode}'"})
+    elif signed_mode != "DISABLED":
+        keyset = policy.get("signedRequestKeyset")
+        if not keyset:
+            errors.append({"path": f"{path}.signedRequestKeyset", "message": f"signedRequestKeyset is required when signedRequestMode is {signed_mode}"})
+        elif not _exists(inventory, "keysets", keyset):
+            errors.append({"path": f"{path}.signedRequestKeyset", "message": f"Keyset '{keyset}' does not exist"})
+
+    add_sig = policy.get("addSignatures")
+    if add_sig:
+        actions = add_sig.get("actions", [])
+        if "GENERATE_TOKEN_HLS_COOKIELESS" in actions:
+            keyset = add_sig.get("keyset")
+            if not keyset:
+                errors.append({"path": f"{path}.addSignatures.keyset", "message": "keyset is required for GENERATE_TOKEN_HLS_COOKIELESS"})
+            elif not _exists(inventory, "keysets", keyset):
+                errors.append({"path": f"{path}.addSignatures.keyset", "message": f"Keyset '{keyset}' does not exist"})
+        if actions and signed_mode == "DISABLED":
+            errors.append({"path": f"{path}.addSignatures", "message": "addSignatures requires signedRequestMode REQUIRE_TOKENS"})
+
+
+def _validate_route_rules(route_rules, path, inventory, errors):
+    seen_priorities = {}
+    for idx, rule in enumerate(route_rules):
+        rule_path = f"{path}.routeRules[{idx}]"
+        priority = rule.get("priority")
+        try:
+            prio = int(priority)
+            if not 1 <= prio <= 999:
+                raise ValueError()
+        except (TypeError, ValueError):
+            errors.append({"path": f"{rule_path}.priority", "message": f"priority must be an integer between 1 and 999, got '{priority}'"})
+            prio = None
+        if prio is not None:
+            if prio in seen_priorities:
+                errors.append({"path": f"{rule_path}.priority", "message": f"Duplicate priority {prio} (also used by routeRules[{seen_priorities[prio]}])"})
+            else:
+                seen_priorities[prio] = idx
+
+        match_rules = rule.get("matchRules", [])
+        if not match_rules:
+            errors.append({"path": f"{rule_path}.matchRules", "message": "At least one matchRule is required"})
+        for m_idx, mr in enumerate(match_rules):
+            mr_path = f"{rule_path}.matchRules[{m_idx}]"
+            kinds = [k for k in ["prefixMatch", "fullPathMatch", "pathTemplateMatch"] if k in mr]
+            if len(kinds) != 1:
+                errors.append({"path": mr_path, "message": "Exactly one of prefixMatch, fullPathMatch or pathTemplateMatch is required"})
+            if "pathTemplateMatch" in mr:
+                problem = _check_path_template(mr["pathTemplateMatch"])
+                if problem:
+                    errors.append({"path": f"{mr_path}.pathTemplateMatch", "message": problem})
+
+        origin = rule.get("origin")
+        if not origin and not rule.get("urlRedirect"):
+            errors.append({"path": f"{rule_path}.origin", "message": "Either origin or urlRedirect is required"})
+        elif origin and not _exists(inventory, "origins", origin):
+            errors.append({"path": f"{rule_path}.origin", "message": f"Origin '{origin}' does not exist"})
+
+        compression = rule.get("routeAction", {}).get("compressionMode")
+        if compression and compression not in VALID_COMPRESSION_MODES:
+            errors.append({"path": f"{rule_path}.routeAction.compressionMode", "message": f"Unknown compressionMode '{compression}'"})
+
+        policy = rule.get("routeAction", {}).get("cdnPolicy")
+        if policy:
+            _validate_cdn_policy(policy, f"{rule_path}.routeAction.cdnPolicy", inventory, errors)
+
+    for idx, prio, prev_idx, prev_prio in find_shadowed_rules(route_rules):
+        errors.append({
+            "path": f"{path}.routeRules[{idx}]",
+            "message": f"Rule (priority {prio}) is unreachable: shadowed by routeRules[{prev_idx}] (priority {prev_prio})"
+        })
+
+
+def find_shadowed_rules(route_rules):
+    """Finds rules whose every path is already claimed by a higher-priority rule.
+
+    Returns (index, priority, shadowing_index, shadowing_priority) tuples.
+    """
+    ordered = []
+    for idx, rule in enumerate(route_rules):
+        try:
+            ordered.append((int(rule.get("priority")), idx, rule))
+        except (TypeError, ValueError):
+            continue
+    ordered.sort(key=lambda item: (item[0], item[1]))
+
+    shadowed = []
+    for pos, (prio, idx, rule) in enumerate(ordered):
+        for prev_prio, prev_idx, prev_rule in ordered[:pos]:
+            try:
+                covered = _rule_covers(prev_rule, rule)
+            except re.error:
+                covered = False
+            if covered:
+                shadowed.append((idx, prio, prev_idx, prev_prio))
+                break
+    return shadowed
+
+
+def validate_service_config(service_body, inventory=None):
+    """Checks an edgeCacheService body locally before it is submitted.
+
+    `inventory` is an optional dict of sets with the short IDs of existing
+    'origins', 'keysets' and 'certificates'. Returns a list of
+    {"path", "message"} errors; an empty list means the config is valid.
+    """
+    errors = []
+    if not isinstance(service_body, dict):
+        return [{"path": "", "message": "Service config must be a JSON object"}]
+
+    for field in READ_ONLY_FIELDS:
+        if field in service_body:
+            errors.append({"path": field, "message": f"Read-only field '{field}' must be stripped before submitting"})
+
+    routing = service_body.get("routing")
+    if not routing:
+        errors.append({"path": "routing", "message": "routing is required"})
+        return errors
+
+    matchers = {}
+    for idx, pm in enumerate(routing.get("pathMatchers", [])):
+        name = pm.get("name")
+        if not name:
+            errors.append({"path": f"routing.pathMatchers[{idx}].name", "message": "pathMatcher name is required"})
+        elif name in matchers:
+            errors.append({"path": f"routing.pathMatchers[{idx}].name", "message": f"Duplicate pathMatcher name '{name}'"})
+        matchers[name] = idx
+        route_rules = pm.get("routeRules", [])
+        if not route_rules:
+            errors.append({"path": f"routing.pathMatchers[{idx}].routeRules", "message": "At least one routeRule is required"})
+        _validate_route_rules(route_rules, f"routing.pathMatchers[{idx}]", inventory, errors)
+
+    seen_hosts = {}
+    host_rules = routing.get("hostRules", [])
+    if not host_rules:
+        errors.append({"path": "routing.hostRules", "message": "At least one hostRule is required"})
+    for idx, hr in enumerate(host_rules):
+        if hr.get("pathMatcher") not in matchers:
+            errors.append({"path": f"routing.hostRules[{idx}].pathMatcher", "message": f"pathMatcher '{hr.get('pathMatcher')}' is not defined"})
+        hosts = hr.get("hosts", [])
+        if not hosts:
+            errors.append({"path": f"routing.hostRules[{idx}].hosts", "message": "At least one host is required"})
+        for host in hosts:
+            key = str(host).lower()
+            if key in seen_hosts:
+                errors.append({"path": f"routing.hostRules[{idx}].hosts", "message": f"Host '{host}' is already used by hostRules[{seen_hosts[key]}]"})
+            else:
+                seen_hosts[key] = idx
+
+    for idx, cert in enumerate(service_body.get("edgeSslCertificates", [])):
+        if not _exists(inventory, "certificates", cert):
+            errors.append({"path": f"edgeSslCertificates[{idx}]", "message": f"Certificate '{cert}' does not exist"})
+
+    log_config = service_body.get("logConfig")
+    if log_config and "sampleRate" in log_config:
+        rate = log_config["sampleRate"]
+        if not isinstance(rate, (int, float)) or not 0 <= rate <= 1:
+            errors.append({"path": "logConfig.sampleRate", "message": "sampleRate must be between 0.0 and 1.0"})
+
+    return errors
+
+
+def validate_origin_config(origin_body, path=""):
+    """Checks an edgeCacheOrigin body: protocol, port, attempts, retry conditions and timeout relationships."""
+    errors = []
+    prefix = f"{path}." if path else ""
+    if not origin_body.get("originAddress"):
+        errors.append({"path": f"{prefix}originAddress", "message": "originAddress is required"})
+    if origin_body.get("protocol", "HTTP2") not in VALID_ORIGIN_PROTOCOLS:
+        errors.append({"path": f"{prefix}protocol", "message": f"protocol must be one of {', '.join(VALID_ORIGIN_PROTOCOLS)}"})
+    port = origin_body.get("port", 443)
+    if not isinstance(port, int) or not 1 <= port <= 65535:
+        errors.append({"path": f"{prefix}port", "message": "port must be between 1 and 65535"})
+
+    max_attempts = origin_body.get("maxAttempts", 1)
+    if not isinstance(max_attempts, int) or not 1 <= max_attempts <= MAX_FILL_ATTEMPTS:
+        errors.append({"path": f"{prefix}maxAttempts", "message": f"maxAttempts must be between 1 and {MAX_FILL_ATTEMPTS}"})
+    for idx, condition in enumerate(origin_body.get("retryConditions", [])):
+        if condition not in VALID_RETRY_CONDITIONS:
+            errors.append({"path": f"{prefix}retryConditions[{idx}]", "message": f"Unknown retry condition '{condition}'"})
+
+    timeouts = {}
+    for field, value in origin_body.get("timeout", {}).items():
+        if field not in ORIGIN_TIMEOUTS:
+            errors.append({"path": f"{prefix}timeout.{field}", "message": f"Unknown timeout field '{field}'"})
+            continue
+        try:
+            seconds = parse_duration(value)
+        except ValueError as e:
+            errors.append({"path": f"{prefix}timeout.{field}", "message": str(e)})
+            continue
+        low, high, _ = ORIGIN_TIMEOUTS[field]
+        if not low <= seconds <= high:
+            errors.append({"path": f"{prefix}timeout.{field}", "message": f"{field} must be between {low}s and {high}s"})
+        timeouts[field] = seconds
+
+    # Relationships are checked against the effective values (explicit or API default)
+    effective = {field: timeouts.get(field, default) for field, (_, _, default) in ORIGIN_TIMEOUTS.items()}
+    if effective["connectTimeout"] > effective["maxAttemptsTimeout"]:
+        errors.append({"path": f"{prefix}timeout.maxAttemptsTimeout",
+                       "message": f"maxAttemptsTimeout ({effective['maxAttemptsTimeout']:g}s) must not be shorter than connectTimeout ({effective['connectTimeout']:g}s)"})
+    if effective["readTimeout"] > effective["responseTimeout"]:
+        errors.append({"path": f"{prefix}timeout.readTimeout",
+                       "message": f"readTimeout ({effective['readTimeout']:g}s) must not exceed responseTimeout ({effective['responseTimeout']:g}s)"})
+    return errors
+
+
+def validate_failover_chain(chain):
+    """Checks an ordered list of (origin_id, origin_body) from the primary down its failover chain."""
+    errors = []
+    seen = set()
+    total_attempts = 0
+    for origin_id, body in chain:
+        if origin_id in seen:
+            errors.append({"path": origin_id, "message": f"Failover chain loops back to '{origin_id}'"})
+            break
+        seen.add(origin_id)
+        attempts = body.get("maxAttempts", 1)
+        total_attempts += attempts if isinstance(attempts, int) else 1
+    if total_attempts > MAX_FILL_ATTEMPTS:
+        errors.append({"path": "maxAttempts",
+                       "message": f"Origin and failover origins allow {total_attempts} attempts in total; the limit is {MAX_FILL_ATTEMPTS}"})
+    return errors
+
+
+def format_errors(errors):
+    """Renders validation errors as human-readable log lines."""
+    return [f"{e['path'] or '<root>'}: {e['message']}" for e in errors]
@@ -0,0 +1,152 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from cache_invalidator import RateLimiter
+from config_model import ServiceConfig
+from logging_setup import get_logger
+from media_cdn_api import list_all_resources, list_gcs_objects, get_gcs_object_content
+
+log = get_logger("drift")
+
+DEFAULT_INTERVAL = 900
+DEFAULT_CONCURRENCY = 4
+DEFAULT_RATE_PER_MINUTE = 60
+# Diff entries kept per service; the count is always exact
+MAX_DIFFS = 200
+# run_staging_task replaces the description with staging notes, so it is not compared
+IGNORED_FIELDS = ["description"]
+# Object metadata key under which run_staging_task stores drift_hash() of the config
+CONTENT_HASH_KEY = "content-hash"
+
+
+def drift_hash(config):
+    """Canonical content hash of a ServiceConfig with IGNORED_FIELDS left out."""
+    config = config.copy()
+    for field in IGNORED_FIELDS:
+        setattr(config, field, None)
+    return config.content_hash()
+
+
+def live_version(service):
+    """What identifies a live revision: the etag, or updateTime when the API sends none."""
+    return service.get("etag") or service.get("updateTime")
+
+
+class DriftDetector:
+    """Compares live edgeCacheServices with their latest {service_id}.json in the system bucket.
+
+    Cheap checks come first: an unchanged (service etag, object generation)
+    pair reuses the previous verdict, and a live body whose drift_hash equals
+    the content hash stored in the object's metadata is in sync without
+    downloading anything.
+    Only the remaining candidates have their stored generation fetched and
+    diffed, `concurrency` at a time and at most `rate_per_minute` overall.
+    """
+
+    def __init__(self, concurrency=DEFAULT_CONCURRENCY, rate_per_minute=DEFAULT_RATE_PER_MINUTE):
+        self.concurrency = max(1, concurrency)
+        self._limiter = RateLimiter(rate_per_minute)
+        self._verdicts = {}
+        self._reports = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def report(self, project_id):
+        with self._lock:
+            return self._reports.get(project_id)
+
+    def scan(self, project_id, token, bucket_name):
+        started = time.time()
+        services = list_all_resources(
+            f"https://networkservices.googleapis.com/v1alpha1/projects/{project_id}/locations/global/edgeCacheServices",
+            "edgeCacheServices", token)
+        try:
+            objects = {o["name"][:-len(".json")]: o for o in list_gcs_objects(bucket_name, "", token)
+                       if o["name"].endswith(".json") and "/" not in o["name"]}
+        except Exception as e:
+            if "404" not in str(e):
+                raise
+            # No system bucket yet: nothing has been staged in this project
+            objects = {}
+
+        results, candidates = {}, []
+        stats = {"cached": 0, "fingerprint_matches": 0, "fetched": 0}
+        for service in services:
+            service_id = service["name"].rsplit("/", 1)[-1]
+            obj = objects.get(service_id)
+            if obj is None:
+                results[service_id] = {"status": "untracked"}
+                continue
+            previous = self._verdicts.get((project_id, service_id))
+            if previous and previous[0] and previous[0] == live_version(service) and previous[1] == obj["generation"]:
+                stats["cached"] += 1
+                results[service_id] = previous[2]
+            elif (obj.get("metadata") or {}).get(CONTENT_HASH_KEY) == drift_hash(ServiceConfig.from_api(service)):
+                stats["fingerprint_matches"] += 1
+                self._record(project_id, service_id, service, obj, {"status": "in_sync"}, results)
+            else:
+                candidates.append((service_id, service, obj))
+
+        def compare(candidate):
+            service_id, service, obj = candidate
+            self._limiter.acquire()
+            try:
+                stored = ServiceConfig.from_api(json.loads(get_gcs_object_content(bucket_name, f"{service_id}.json", obj["generation"], token)))
+                live = ServiceConfig.from_api(service)
+                for config in (stored, live):
+                    for field in IGNORED_FIELDS:
+                        setattr(config, field, None)
+                return candidate, stored.diff(live), None
+            except Exception as e:
+                return candidate, None, str(e)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for (service_id, service, obj), diffs, error in pool.map(compare, candidates):
+                stats["fetched"] += 1
+                if error:
+                    results[service_id] = {"status": "error", "error": error}
+                    continue
+                verdict = {"status": "drifted" if diffs else "in_sync", "diff_count": len(diffs), "diffs": diffs[:MAX_DIFFS]}
+                self._record(project_id, service_id, service, obj, verdict, results)
+
+        summary = {}
+        for result in results.values():
+            summary[result["status"]] = summary.get(result["status"], 0) + 1
+        report = {
+            "project": project_id,
+            "bucket": bucket_name,
+            "scanned_at": started,
+            "duration_seconds": round(time.time() - started, 3),
+            "summary": summary,
+            "stats": stats,
+            "services": dict(sorted(results.items()))
+        }
+        with self._lock:
+            self._reports[project_id] = report
+        if summary.get("drifted"):
+            log.warning("Drift detected in %s: %d service(s)", project_id, summary["drifted"])
+        return report
+
+    def _record(self, project_id, service_id, service, obj, verdict, results):
+        verdict.update({"generation": obj["generation"], "stored_updated": obj.get("updated"),
+                        "live_updated": service.get("updateTime")})
+        self._verdicts[(project_id, service_id)] = (live_version(service), obj["generation"], verdict)
+        results[service_id] = verdict
+
+    def start(self, interval, scan_all):
+        """Runs scan_all() now and then every `interval` seconds on a daemon thread."""
+        if self._thread is not None or interval <= 0:
+            return
+
+        def loop():
+            while True:
+                try:
+                    scan_all()
+                except Exception as e:
+                    log.warning("Drift scan failed: %s", e)
+                time.sleep(interval)
+
+        self._thread = threading.Thread(target=loop, name="drift-detector", daemon=True)
+        self._thread.start()
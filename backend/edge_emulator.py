@@ -0,0 +1,453 @@
+import argparse
+import http.client
+import http.server
+import json
+import re
+import secrets
+import socket
+import socketserver
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter, OrderedDict
+
+from config_validator import parse_duration
+from route_matcher import RouteMatcher
+from token_signer import TokenSigner, decode_key, verify_token
+
+DEFAULT_TOKEN_PARAM = "edge-cache-token"
+DEFAULT_CACHE_BYTES = 512 * 1024 * 1024
+LATENCY_SAMPLES = 10000
+METRICS_PATH = "/__emulator/metrics"
+ORIGIN_TIMEOUT = 30
+# TTLs Media CDN applies when negativeCaching is on and negativeCachingPolicy does not list the status
+NEGATIVE_CACHING_DEFAULTS = {300: 600, 301: 600, 308: 600, 404: 120, 410: 120, 451: 120, 405: 60, 421: 60, 501: 60}
+
+_MAX_AGE_RE = re.compile(r"(?:s-maxage|max-age)=(\d+)")
+_STATIC_TYPES = ("video/", "audio/", "image/", "font/", "application/vnd.apple.mpegurl",
+                 "application/x-mpegurl", "application/dash+xml", "application/octet-stream",
+                 "text/css", "application/javascript")
+
+
+class OriginError(Exception):
+    """An origin that could not be reached; status is the 502/504 the edge answers with."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class CacheEntry:
+    __slots__ = ("status", "headers", "body", "expires_at", "stored_at")
+
+    def __init__(self, status, headers, body, expires_at):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.expires_at = expires_at
+        self.stored_at = time.time()
+
+
+class EdgeCache:
+    """Byte-bounded LRU cache with per-entry expiry."""
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at <= time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if len(entry.body) > self.max_bytes:
+                return
+            self._entries[key] = entry
+            self.size += len(entry.body)
+            while self.size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self.size -= len(entry.body)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class EdgeMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = Counter()
+        self.by_rule = {}
+        self.bytes_served = 0
+        self.bytes_from_origin = 0
+        self._latencies = []
+        self._seen = 0
+
+    def record(self, rule_desc, outcome, status, size, latency_ms, origin_bytes=0):
+        with self._lock:
+            self.counts[outcome] += 1
+            self.counts[f"status_{status}"] += 1
+            rule = self.by_rule.setdefault(rule_desc, Counter())
+            rule[outcome] += 1
+            self.bytes_served += size
+            self.bytes_from_origin += origin_bytes
+            # Reservoir sample keeps percentile memory constant under load
+            self._seen += 1
+            if len(self._latencies) < LATENCY_SAMPLES:
+                self._latencies.append(latency_ms)
+            else:
+                slot = secrets.randbelow(self._seen)
+                if slot < LATENCY_SAMPLES:
+                    self._latencies[slot] = latency_ms
+
+    def snapshot(self, cache):
+        with self._lock:
+            lookups = self.counts["hit"] + self.counts["miss"]
+            latencies = sorted(self._latencies)
+
+            def pct(p):
+                if not latencies:
+                    return None
+                return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))], 2)
+
+            return {
+                "requests": sum(v for k, v in self.counts.items() if not k.startswith("status_")),
+                "outcomes": {k: v for k, v in self.counts.items() if not k.startswith("status_")},
+                "statuses": {k[7:]: v for k, v in self.counts.items() if k.startswith("status_")},
+                "hit_ratio": round(self.counts["hit"] / lookups, 4) if lookups else None,
+                "bytes_served": self.bytes_served,
+                "bytes_from_origin": self.bytes_from_origin,
+                "origin_offload": round(1 - self.bytes_from_origin / self.bytes_served, 4) if self.bytes_served else None,
+                "latency_ms": {"p50": pct(0.5), "p95": pct(0.95), "p99": pct(0.99)},
+                "by_rule": {k: dict(v) for k, v in self.by_rule.items()},
+                "cache_objects": len(cache),
+                "cache_bytes": cache.size
+            }
+
+
+def compute_cache_ttl(policy, status, headers):
+    """Returns how long (seconds) an origin response may be cached under the rule's cdnPolicy."""
+    mode = policy.get("cacheMode", "CACHE_ALL_STATIC")
+    if mode == "BYPASS_CACHE":
+        return 0
+    if status != 200:
+        return negative_cache_ttl(policy, status)
+    cache_control = headers.get("Cache-Control", "").lower()
+    origin_ttl = None
+    match = _MAX_AGE_RE.search(cache_control)
+    if match:
+        origin_ttl = int(match.group(1))
+    default_ttl = parse_duration(policy.get("defaultTtl", "3600s"))
+    max_ttl = parse_duration(policy.get("maxTtl", "86400s"))
+
+    if mode == "FORCE_CACHE_ALL":
+        return default_ttl
+    if "no-store" in cache_control or "private" in cache_control:
+        return 0
+    if mode == "USE_ORIGIN_HEADERS":
+        return origin_ttl or 0
+    # CACHE_ALL_STATIC
+    if origin_ttl is not None:
+        return min(origin_ttl, max_ttl)
+    content_type = headers.get("Content-Type", "").lower()
+    return default_ttl if content_type.startswith(_STATIC_TYPES) else 0
+
+
+def negative_cache_ttl(policy, status):
+    """TTL for a non-200 response: negativeCachingPolicy when set, otherwise the negativeCaching defaults."""
+    if not policy.get("negativeCaching"):
+        return 0
+    per_status = policy.get("negativeCachingPolicy")
+    if per_status:
+        ttl = per_status.get(str(status))
+        return int(parse_duration(ttl)) if ttl is not None else 0
+    return NEGATIVE_CACHING_DEFAULTS.get(status, 0)
+
+
+def cache_key(host, path, query, policy, token_params):
+    """Builds the cache key the way cacheKeyPolicy describes it, always dropping token parameters."""
+    key_policy = policy.get("cacheKeyPolicy", {})
+    params = urllib.parse.parse_qsl(query, keep_blank_values=True)
+    params = [(k, v) for k, v in params if k not in token_params]
+    if key_policy.get("excludeQueryString"):
+        params = []
+    elif key_policy.get("includedQueryParameters"):
+        allowed = set(key_policy["includedQueryParameters"])
+        params = [(k, v) for k, v in params if k in allowed]
+    elif key_policy.get("excludedQueryParameters"):
+        excluded = set(key_policy["excludedQueryParameters"])
+        params = [(k, v) for k, v in params if k not in excluded]
+    key_host = "" if key_policy.get("excludeHost") else host
+    return key_host + path + ("?" + urllib.parse.urlencode(sorted(params)) if params else "")
+
+
+class EdgeEmulator:
+    """In-process model of one Media CDN service in front of local origins."""
+
+    def __init__(self, service_body, origin_url, origin_map=None, keys=None, cache_bytes=DEFAULT_CACHE_BYTES):
+        self.service_body = service_body
+        self.matcher = RouteMatcher(service_body)
+        self.origin_url = origin_url.rstrip("/") if origin_url else None
+        self.origin_map = {k: v.rstrip("/") for k, v in (origin_map or {}).items()}
+        self.keys = keys or {}
+        self.cache = EdgeCache(cache_bytes)
+        self.metrics = EdgeMetrics()
+        self._fills = {}
+        self._fills_lock = threading.Lock()
+
+        # Full rule bodies by matcher id so handlers can read cdnPolicy/origin details
+        self.rule_bodies = {}
+        for pm in service_body.get("routing", {}).get("pathMatchers", []):
+            for idx, rule in enumerate(pm.get("routeRules", [])):
+                self.rule_bodies[(pm.get("name"), idx)] = rule
+
+        self.token_params = {"hdnts", "hdntl", DEFAULT_TOKEN_PARAM}
+        for rule in self.rule_bodies.values():
+            policy = rule.get("routeAction", {}).get("cdnPolicy", {})
+            for section in ("signedTokenOptions", "addSignatures"):
+                param = policy.get(section, {}).get("tokenQueryParameter")
+                if param:
+                    self.token_params.add(param)
+            # Google-managed keysets have no exportable key; mint a local one for the session
+            keyset = policy.get("addSignatures", {}).get("keyset")
+            if keyset and keyset.split("/")[-1] not in self.keys:
+                self.keys[keyset.split("/")[-1]] = [("HMAC_SHA_256", secrets.token_bytes(32))]
+
+    def origin_for(self, rule):
+        name = str(rule.get("origin", "")).split("/")[-1]
+        return self.origin_map.get(name, self.origin_url)
+
+    def check_token(self, policy, url, query, headers):
+        mode = policy.get("signedRequestMode", "DISABLED")
+        if mode == "DISABLED":
+            return True, None
+        params = urllib.parse.parse_qs(query)
+        param = policy.get("signedTokenOptions", {}).get("tokenQueryParameter", DEFAULT_TOKEN_PARAM)
+        token = (params.get(param) or [None])[0]
+        if not token:
+            return False, f"Missing {param} token"
+        keyset = str(policy.get("signedRequestKeyset", "")).split("/")[-1]
+        keys = self.keys.get(keyset)
+        if not keys:
+            return False, f"No local key configured for keyset {keyset}"
+        ok, reason = verify_token(token, url, keys, request_headers=headers)
+        return ok, None if ok else reason
+
+    def rewrite_manifest(self, body, policy, request_url, query):
+        """Applies addSignatures to HLS playlists: mint or propagate the long-lived token on child URIs."""
+        add_sig = policy.get("addSignatures")
+        if not add_sig:
+            return body
+        param = add_sig.get("tokenQueryParameter", "hdntl")
+        actions = add_sig.get("actions", [])
+        token = None
+        if "GENERATE_TOKEN_HLS_COOKIELESS" in actions:
+            keyset = add_sig.get("keyset", "").split("/")[-1]
+            algorithm, key = self.keys[keyset][0]
+            ttl = parse_duration(add_sig.get("tokenTtl", "86400s"))
+            prefix = request_url.split("?", 1)[0].rsplit("/", 1)[0] + "/"
+            token = TokenSigner(key, algorithm).sign_token(time.time() + ttl, url_prefix=prefix)
+        elif "PROPAGATE_TOKEN_HLS_COOKIELESS" in actions:
+            token = (urllib.parse.parse_qs(query).get(param) or [None])[0]
+        if not token:
+            return body
+
+        lines = []
+        for line in body.decode("utf-8", errors="replace").split("\n"):
+            stripped = line.strip()
+            if stripped and not stripped.startswith("#"):
+                sep = "&" if "?" in stripped else "?"
+                line = f"{stripped}{sep}{param}={token}"
+            lines.append(line)
+        return "\n".join(lines).encode()
+
+    def fetch_origin(self, origin, path, query, headers):
+        """Returns (status, headers, body); raises OriginError when the origin cannot be reached."""
+        url = origin + path + ("?" + query if query else "")
+        req = urllib.request.Request(url, headers=headers)
+        try:
+            with urllib.request.urlopen(req, timeout=ORIGIN_TIMEOUT) as resp:
+                return resp.status, dict(resp.headers), resp.read()
+        except urllib.error.HTTPError as e:
+            return e.code, dict(e.headers), e.read()
+        except urllib.error.URLError as e:
+            timed_out = isinstance(e.reason, socket.timeout)
+            raise OriginError(504 if timed_out else 502, f"Origin unreachable: {e.reason}")
+        except socket.timeout as e:
+            raise OriginError(504, f"Origin timed out: {e}")
+        except (OSError, http.client.HTTPException) as e:
+            raise OriginError(502, f"Origin error: {type(e).__name__}: {e}")
+
+    def lookup_or_fill(self, key, fill):
+        """Collapses concurrent misses for the same key into one origin fill."""
+        with self._fills_lock:
+            event = self._fills.get(key)
+            leader = event is None
+            if leader:
+                event = threading.Event()
+                self._fills[key] = event
+        if not leader:
+            event.wait()
+            entry = self.cache.get(key)
+            if entry is not None:
+                return entry, "hit", 0
+        try:
+            result = fill()
+            return result
+        finally:
+            if leader:
+                with self._fills_lock:
+                    self._fills.pop(key, None)
+                event.set()
+
+
+class EmulatorHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    emulator = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, headers, body, head_only=False):
+        self.send_response(status)
+        for name, value in headers.items():
+            if name.lower() not in ("content-length", "transfer-encoding", "connection"):
+                self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if not head_only:
+            self.wfile.write(body)
+
+    def do_HEAD(self):
+        self.do_GET(head_only=True)
+
+    def do_GET(self, head_only=False):
+        emu = self.emulator
+        start = time.time()
+        parsed = urllib.parse.urlsplit(self.path)
+        path, query = parsed.path, parsed.query
+        if path == METRICS_PATH:
+            body = json.dumps(emu.metrics.snapshot(emu.cache), indent=2).encode()
+            return self._send(200, {"Content-Type": "application/json"}, body)
+
+        host = self.headers.get("Host", "localhost")
+        url = f"http://{host}{self.path}"
+        rule_info = emu.matcher.match(self.path, host, self.headers)
+        if rule_info is None:
+            emu.metrics.record("(no route)", "no_route", 404, 0, (time.time() - start) * 1000)
+            return self._send(404, {"Content-Type": "text/plain"}, b"No route rule matched", head_only)
+        rule = emu.rule_bodies[(rule_info["pathMatcher"], rule_info["index"])]
+        desc = rule_info["description"] or f"priority {rule_info['priority']}"
+        policy = rule.get("routeAction", {}).get("cdnPolicy", {})
+
+        allowed = rule.get("routeMethods", {}).get("allowedMethods", ["GET", "HEAD"])
+        if self.command not in allowed:
+            emu.metrics.record(desc, "method_denied", 405, 0, (time.time() - start) * 1000)
+            return self._send(405, {"Content-Type": "text/plain"}, b"Method not allowed", head_only)
+
+        ok, reason = emu.check_token(policy, url, query, dict(self.headers))
+        if not ok:
+            emu.metrics.record(desc, "token_denied", 403, 0, (time.time() - start) * 1000)
+            return self._send(403, {"Content-Type": "text/plain"}, reason.encode(), head_only)
+
+        origin = emu.origin_for(rule)
+        if origin is None:
+            return self._send(502, {"Content-Type": "text/plain"}, b"No local origin configured", head_only)
+
+        key = cache_key(host, path, query, policy, emu.token_params)
+        entry = emu.cache.get(key)
+        outcome, origin_bytes = "hit", 0
+        if entry is None:
+            def fill():
+                fwd_query = "&".join(p for p in query.split("&") if p and p.split("=", 1)[0] not in emu.token_params)
+                try:
+                    status, headers, body = emu.fetch_origin(origin, path, fwd_query, {"Host": host})
+                except OriginError as e:
+                    return CacheEntry(e.status, {"Content-Type": "text/plain"}, str(e).encode(), time.time()), "origin_error", 0
+                ttl = compute_cache_ttl(policy, status, headers)
+                new_entry = CacheEntry(status, headers, body, time.time() + ttl)
+                if ttl > 0:
+                    emu.cache.put(key, new_entry)
+                return new_entry, ("miss" if ttl > 0 else "bypass"), len(body)
+            entry, outcome, origin_bytes = emu.lookup_or_fill(key, fill)
+
+        body = entry.body
+        if path.lower().endswith(".m3u8") and entry.status == 200:
+            body = emu.rewrite_manifest(body, policy, url, query)
+
+        headers = dict(entry.headers)
+        age = int(time.time() - entry.stored_at)
+        headers["Age"] = str(age)
+        headers["X-Cache-Status"] = outcome
+        if "clientTtl" in policy and policy.get("cacheMode") != "BYPASS_CACHE":
+            headers["Cache-Control"] = f"public, max-age={int(parse_duration(policy['clientTtl']))}"
+        self._send(entry.status, headers, body, head_only)
+        emu.metrics.record(desc, outcome, entry.status, len(body), (time.time() - start) * 1000, origin_bytes)
+
+    def do_OPTIONS(self):
+        self._send(204, {"Access-Control-Allow-Origin": "*", "Access-Control-Allow-Methods": "GET, HEAD, OPTIONS"}, b"")
+
+
+class ThreadingEdgeServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+
+def parse_keys(specs):
+    """Parses KEYSET=ALGORITHM:BASE64 specs into {keyset: [(algorithm, key_bytes)]}."""
+    keys = {}
+    for spec in specs or []:
+        keyset, _, rest = spec.partition("=")
+        algorithm, _, value = rest.partition(":")
+        keys.setdefault(keyset, []).append((algorithm, decode_key(value)))
+    return keys
+
+
+def serve(emulator, host="127.0.0.1", port=8080):
+    handler = type("BoundEmulatorHandler", (EmulatorHandler,), {"emulator": emulator})
+    server = ThreadingEdgeServer((host, port), handler)
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Emulate a Media CDN service locally in front of a local origin.")
+    parser.add_argument("service", help="Service config JSON (API response or system bucket copy)")
+    parser.add_argument("--origin", help="Default origin base URL, e.g. http://127.0.0.1:8000")
+    parser.add_argument("--origin-map", action="append", default=[], metavar="NAME=URL", help="Map an edgeCacheOrigin name to a local URL")
+    parser.add_argument("--key", action="append", default=[], metavar="KEYSET=ALGORITHM:BASE64",
+                        help="Validation key for a keyset (HMAC secret or Ed25519 public key)")
+    parser.add_argument("--listen", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--cache-mb", type=int, default=DEFAULT_CACHE_BYTES // (1024 * 1024))
+    args = parser.parse_args(argv)
+
+    with open(args.service, "r") as f:
+        service_body = json.load(f)
+    origin_map = dict(item.split("=", 1) for item in args.origin_map)
+    emulator = EdgeEmulator(service_body, args.origin, origin_map, parse_keys(args.key), args.cache_mb * 1024 * 1024)
+    server = serve(emulator, args.listen, args.port)
+    print(f"Edge emulator on http://{args.listen}:{args.port} (metrics at {METRICS_PATH})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
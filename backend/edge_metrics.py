@@ -0,0 +1,200 @@
+import calendar
+import math
+import threading
+import time
+import urllib.parse
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from logging_setup import get_logger
+from media_cdn_api import list_all_resources
+
+log = get_logger("metrics")
+
+MONITORING_API = "https://monitoring.googleapis.com/v3"
+METRIC_PREFIX = "edgecache.googleapis.com/edge_cache_route_rule"
+SERVICE_LABEL = "resource.labels.service_name"
+HIT_RESULTS = ("HIT", "PARTIAL_HIT")
+
+DEFAULT_WINDOW = 6 * 3600
+MAX_WINDOW = 30 * 86400
+DEFAULT_POINTS = 120
+MAX_POINTS = 1000
+# Alignment periods offered; windows snap to these so viewers share cache entries
+PERIODS = (60, 120, 300, 600, 900, 1800, 3600, 7200, 10800, 21600, 43200, 86400)
+# Recent points keep changing while Monitoring ingests, so no entry lives longer than this
+MAX_CACHE_TTL = 60
+MAX_CACHE_ENTRIES = 256
+
+# series -> (metric, per-series aligner, cross-series reducer, group by)
+QUERIES = {
+    "requests": ("request_count", "ALIGN_DELTA", "REDUCE_SUM", ["metric.label.cache_result"]),
+    "egress_bytes": ("response_bytes_count", "ALIGN_DELTA", "REDUCE_SUM", []),
+    "latency_ms_p50": ("total_latencies", "ALIGN_DELTA", "REDUCE_PERCENTILE_50", []),
+    "latency_ms_p95": ("total_latencies", "ALIGN_DELTA", "REDUCE_PERCENTILE_95", []),
+    "latency_ms_p99": ("total_latencies", "ALIGN_DELTA", "REDUCE_PERCENTILE_99", []),
+}
+
+
+def parse_window(value, default=DEFAULT_WINDOW):
+    """'90m', '6h', '7d' or plain seconds."""
+    if not value:
+        return default
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+    value = str(value).strip().lower()
+    try:
+        seconds = int(float(value[:-1]) * units[value[-1]]) if value[-1] in units else int(value)
+    except (ValueError, KeyError):
+        raise Exception(f"Invalid window: {value}")
+    if not 0 < seconds <= MAX_WINDOW:
+        raise Exception(f"Window must be between 1s and {MAX_WINDOW // 86400}d")
+    return seconds
+
+
+def choose_period(window, points):
+    """Smallest offered alignment period that keeps the window within `points` points."""
+    wanted = window / max(1, min(int(points), MAX_POINTS))
+    return next((p for p in PERIODS if p >= wanted), PERIODS[-1])
+
+
+def _rfc3339(ts):
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(ts))
+
+
+def _epoch(value):
+    return calendar.timegm(time.strptime(value[:19], "%Y-%m-%dT%H:%M:%S"))
+
+
+def _point_value(value):
+    if "int64Value" in value:
+        return int(value["int64Value"])
+    if "doubleValue" in value:
+        return float(value["doubleValue"])
+    return None
+
+
+class _Fetch:
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+        self.done = threading.Event()
+        self.series = None
+        self.error = None
+        self.expires = None
+
+
+class EdgePerformance:
+    """Per-service traffic and latency from Cloud Monitoring, aligned and reduced server-side.
+
+    Fetches are cached per (project, service, period) and reused for any
+    window they cover, so overlapping requests (another viewer, a shorter
+    range at the same resolution) wait for or slice an existing fetch instead
+    of querying again.
+    """
+
+    def __init__(self, api_base=MONITORING_API, max_entries=MAX_CACHE_ENTRIES):
+        self.api_base = api_base.rstrip("/")
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"fetches": 0, "hits": 0, "coalesced": 0}
+
+    def query(self, project_id, token, service_id, window=DEFAULT_WINDOW, points=DEFAULT_POINTS, end=None):
+        period = choose_period(window, points)
+        end = int((end or time.time()) // period * period)
+        start = end - int(math.ceil(window / period)) * period
+        key = (project_id, service_id, period)
+        now = time.time()
+        with self._lock:
+            entries = [e for e in self._entries.get(key, [])
+                       if not e.done.is_set() or (e.error is None and e.expires > now)]
+            fetch = next((e for e in entries if e.start <= start and e.end >= end), None)
+            if fetch is None:
+                source, leader = "upstream", True
+                fetch = _Fetch(start, end)
+                entries.append(fetch)
+                self.stats["fetches"] += 1
+            else:
+                source, leader = ("cache" if fetch.done.is_set() else "coalesced"), False
+                self.stats["hits" if source == "cache" else "coalesced"] += 1
+            self._entries[key] = entries
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+        if leader:
+            try:
+                fetch.series = self._fetch(project_id, token, service_id, start, end, period)
+                fetch.expires = time.time() + min(period, MAX_CACHE_TTL)
+            except Exception as e:
+                fetch.error = e
+            finally:
+                fetch.done.set()
+        else:
+            fetch.done.wait()
+        if fetch.error is not None:
+            raise Exception(str(fetch.error))
+        return self._shape(service_id, project_id, fetch.series, start, end, period, source)
+
+    def _time_series(self, project_id, token, service_id, start, end, period, spec):
+        metric, aligner, reducer, group_by = spec
+        params = [
+            ("filter", f'metric.type="{METRIC_PREFIX}/{metric}" AND {SERVICE_LABEL}="{service_id}"'),
+            ("interval.startTime", _rfc3339(start)),
+            ("interval.endTime", _rfc3339(end)),
+            ("aggregation.alignmentPeriod", f"{period}s"),
+            ("aggregation.perSeriesAligner", aligner),
+            ("aggregation.crossSeriesReducer", reducer),
+        ]
+        params += [("aggregation.groupByFields", field) for field in group_by]
+        url = f"{self.api_base}/projects/{project_id}/timeSeries?{urllib.parse.urlencode(params)}"
+        series = {}
+        for ts in list_all_resources(url, "timeSeries", token):
+            label = (ts.get("metric", {}).get("labels") or {}).get("cache_result", "")
+            points = series.setdefault(label, {})
+            for point in ts.get("points", []):
+                value = _point_value(point.get("value", {}))
+                if value is not None:
+                    points[_epoch(point["interval"]["endTime"])] = value
+        return series
+
+    def _fetch(self, project_id, token, service_id, start, end, period):
+        started = time.time()
+        with ThreadPoolExecutor(max_workers=len(QUERIES)) as pool:
+            futures = {name: pool.submit(self._time_series, project_id, token, service_id, start, end, period, spec)
+                       for name, spec in QUERIES.items()}
+            series = {name: future.result() for name, future in futures.items()}
+        log.debug("Fetched %s performance for %ss-%ss in %.2fs", service_id, start, end, time.time() - started)
+        return series
+
+    def _shape(self, service_id, project_id, series, start, end, period, source):
+        grid = list(range(start + period, end + 1, period))
+        by_result = series["requests"]
+        requests = [sum(points.get(t, 0) for points in by_result.values()) for t in grid]
+        hits = [sum(by_result.get(r, {}).get(t, 0) for r in HIT_RESULTS) for t in grid]
+        egress = [series["egress_bytes"].get("", {}).get(t, 0) for t in grid]
+        total_requests, total_hits = sum(requests), sum(hits)
+        out = {
+            "service": service_id,
+            "project": project_id,
+            "start": _rfc3339(start),
+            "end": _rfc3339(end),
+            "period_seconds": period,
+            "source": source,
+            "timestamps": [_rfc3339(t) for t in grid],
+            "series": {
+                "requests": requests,
+                "requests_per_second": [round(r / period, 3) for r in requests],
+                "cache_hit_ratio": [round(h / r, 4) if r else None for h, r in zip(hits, requests)],
+                "egress_bytes": egress,
+            },
+            "totals": {
+                "requests": total_requests,
+                "egress_bytes": sum(egress),
+                "cache_hit_ratio": round(total_hits / total_requests, 4) if total_requests else None,
+                "by_cache_result": {r: sum(p.get(t, 0) for t in grid) for r, p in sorted(by_result.items()) if r},
+            },
+        }
+        for name in ("latency_ms_p50", "latency_ms_p95", "latency_ms_p99"):
+            out["series"][name] = [series[name].get("", {}).get(t) for t in grid]
+        return out
@@ -0,0 +1,580 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config_model import ServiceConfig, OriginConfig
+from config_validator import READ_ONLY_FIELDS, validate_service_config, validate_origin_config
+from logging_setup import get_logger
+from media_cdn_api import get_access_token, make_gcp_request, list_all_resources
+
+log = get_logger("fleet")
+
+API_BASE = "https://networkservices.googleapis.com/v1alpha1"
+DEFAULT_CONCURRENCY = 4
+MAX_CONCURRENCY = 16
+OPERATION_POLL_INTERVAL = 10
+OPERATION_TIMEOUT = 1800
+DEFINITION_EXTENSIONS = (".json", ".yaml", ".yml")
+
+# kind -> (collection, create ID parameter, list key)
+KINDS = {
+    "origin": ("edgeCacheOrigins", "edgeCacheOriginId", "edgeCacheOrigins"),
+    "service": ("edgeCacheServices", "edgeCacheServiceId", "edgeCacheServices"),
+}
+# Reference fields rewritten to the target project so definitions are portable
+_REF_COLLECTIONS = {"origin": "edgeCacheOrigins", "failoverOrigin": "edgeCacheOrigins",
+                    "signedRequestKeyset": "edgeCacheKeysets", "keyset": "edgeCacheKeysets"}
+
+
+# --- YAML subset ---------------------------------------------------------
+# Enough YAML for `gcloud edge-cache ... export` output: block mappings and
+# sequences, quoted/plain scalars, `|`/`>` block scalars and one-line flow
+# collections. Anchors, aliases and tags are rejected.
+
+def _strip_comment(line):
+    quote = None
+    for idx, ch in enumerate(line):
+        if quote:
+            if ch == quote:
+                quote = None
+        elif ch in ("'", '"'):
+            quote = ch
+        elif ch == "#" and (idx == 0 or line[idx - 1] in " \t"):
+            return line[:idx].rstrip()
+    return line.rstrip()
+
+
+def _split_flow(text):
+    items, depth, quote, current = [], 0, None, ""
+    for ch in text:
+        if quote:
+            quote = None if ch == quote else quote
+        elif ch in ("'", '"'):
+            quote = ch
+        elif ch in "[{":
+            depth += 1
+        elif ch in "]}":
+            depth -= 1
+        elif ch == "," and depth == 0:
+            items.append(current.strip())
+            current = ""
+            continue
+        current += ch
+    if current.strip():
+        items.append(current.strip())
+    return items
+
+
+def _split_key(text):
+    """Splits 'key: value' outside quotes; returns (key, value) or None."""
+    quote = None
+    for idx, ch in enumerate(text):
+        if quote:
+            quote = None if ch == quote else quote
+        elif ch in ("'", '"') and idx == 0:
+            quote = ch
+        elif ch == ":" and (idx + 1 == len(text) or text[idx + 1] == " "):
+            return _scalar(text[:idx].strip()), text[idx + 1:].strip()
+    return None
+
+
+def _scalar(text, lineno=None):
+    if text == "":
+        return None
+    if text[0] == "'" and text[-1] == "'" and len(text) > 1:
+        return text[1:-1].replace("''", "'")
+    if text[0] == '"' and text[-1] == '"' and len(text) > 1:
+        return json.loads(text)
+    if text[0] in "[{":
+        inner = _split_flow(text[1:-1])
+        if text[0] == "[":
+            return [_scalar(item, lineno) for item in inner]
+        result = {}
+        for item in inner:
+            key, value = _split_key(item) or (_scalar(item), "")
+            result[key] = _scalar(value, lineno)
+        return result
+    if text[0] in "&*!":
+        raise Exception(f"YAML line {lineno}: anchors, aliases and tags are not supported")
+    lowered = text.lower()
+    if lowered in ("true", "yes"):
+        return True
+    if lowered in ("false", "no"):
+        return False
+    if lowered in ("null", "~"):
+        return None
+    for cast in (int, float):
+        try:
+            return cast(text)
+        except ValueError:
+            pass
+    return text
+
+
+class _YamlParser:
+    def __init__(self, text):
+        self.lines = []
+        for lineno, raw in enumerate(text.splitlines(), 1):
+            if "\t" in raw[:len(raw) - len(raw.lstrip())]:
+                raise Exception(f"YAML line {lineno}: tabs are not allowed for indentation")
+            content = _strip_comment(raw)
+            if content.strip():
+                self.lines.append([len(content) - len(content.lstrip()), content.strip(), lineno, raw])
+        self.pos = 0
+
+    def parse(self):
+        if not self.lines:
+            return None
+        value = self._block(self.lines[0][0])
+        if self.pos < len(self.lines):
+            raise Exception(f"YAML line {self.lines[self.pos][2]}: unexpected indentation")
+        return value
+
+    def _block(self, indent):
+        if self.lines[self.pos][1] == "-" or self.lines[self.pos][1].startswith("- "):
+            return self._sequence(indent)
+        return self._mapping(indent)
+
+    def _nested(self, parent_indent, allow_sequence_at_parent=False):
+        """Parses the block under a 'key:' or '-' line, if any."""
+        if self.pos >= len(self.lines):
+            return None
+        indent, content = self.lines[self.pos][0], self.lines[self.pos][1]
+        if indent > parent_indent:
+            return self._block(indent)
+        if allow_sequence_at_parent and indent == parent_indent and (content == "-" or content.startswith("- ")):
+            return self._sequence(indent)
+        return None
+
+    def _block_scalar(self, style, parent_indent):
+        collected = []
+        while self.pos < len(self.lines) and self.lines[self.pos][0] > parent_indent:
+            collected.append(self.lines[self.pos][3])
+            self.pos += 1
+        if not collected:
+            return ""
+        strip = min(len(l) - len(l.lstrip()) for l in collected)
+        body = [l[strip:] for l in collected]
+        return ("\n".join(body) if style.startswith("|") else " ".join(body)) + ("" if style.endswith("-") else "\n")
+
+    def _value(self, text, indent, lineno, allow_sequence_at_parent):
+        if text in ("|", "|-", ">", ">-"):
+            return self._block_scalar(text, indent)
+        if text == "":
+            return self._nested(indent, allow_sequence_at_parent)
+        return _scalar(text, lineno)
+
+    def _mapping(self, indent):
+        result = {}
+        while self.pos < len(self.lines):
+            line_indent, content, lineno, _ = self.lines[self.pos]
+            if line_indent < indent or content.startswith("- ") or content == "-":
+                break
+            if line_indent > indent:
+                raise Exception(f"YAML line {lineno}: unexpected indentation")
+            pair = _split_key(content)
+            if pair is None:
+                raise Exception(f"YAML line {lineno}: expected 'key: value'")
+            self.pos += 1
+            result[pair[0]] = self._value(pair[1], indent, lineno, True)
+        return result
+
+    def _sequence(self, indent):
+        result = []
+        while self.pos < len(self.lines):
+            line_indent, content, lineno, _ = self.lines[self.pos]
+            if line_indent != indent or not (content == "-" or content.startswith("- ")):
+                break
+            item = content[1:].strip()
+            if not item:
+                self.pos += 1
+                result.append(self._nested(indent))
+            elif item == "-" or item.startswith("- ") or (item[0] not in "[{" and _split_key(item) is not None):
+                # '- key: value' (or '- - x') opens a block indented to the item's first character
+                item_indent = indent + len(content) - len(item)
+                self.lines[self.pos] = [item_indent, item, lineno, self.lines[self.pos][3]]
+                result.append(self._block(item_indent))
+            else:
+                self.pos += 1
+                result.append(self._value(item, indent, lineno, False))
+        return result
+
+
+def parse_yaml(text):
+    """Parses the YAML subset used by exported Media CDN configs; multi-document files return a list."""
+    documents, current = [], []
+    for line in text.splitlines():
+        if line.rstrip() == "---":
+            documents.append(current)
+            current = []
+        else:
+            current.append(line)
+    documents.append(current)
+    parsed = [_YamlParser("\n".join(doc)).parse() for doc in documents if any(l.strip() for l in doc)]
+    return parsed[0] if len(parsed) == 1 else parsed
+
+
+# --- Desired state -------------------------------------------------------
+
+def _short(name):
+    return str(name or "").rstrip("/").rsplit("/", 1)[-1]
+
+
+def _infer_kind(body):
+    kind = str(body.get("kind", "")).lower().replace("edgecache", "")
+    if kind in ("service", "services"):
+        return "service"
+    if kind in ("origin", "origins"):
+        return "origin"
+    if "routing" in body:
+        return "service"
+    if "originAddress" in body:
+        return "origin"
+    return None
+
+
+def normalize_refs(kind, body, project_id):
+    """Rewrites origin/keyset/certificate references to full names in project_id (in place)."""
+    def full(collection, ref):
+        return f"projects/{project_id}/locations/global/{collection}/{_short(ref)}"
+
+    def walk(node):
+        if isinstance(node, dict):
+            for key, value in node.items():
+                if key in _REF_COLLECTIONS and isinstance(value, str) and value:
+                    node[key] = full(_REF_COLLECTIONS[key], value)
+                else:
+                    walk(value)
+        elif isinstance(node, list):
+            for item in node:
+                walk(item)
+
+    walk(body)
+    if kind == "service" and body.get("edgeSslCertificates"):
+        body["edgeSslCertificates"] = [full("certificates", c) for c in body["edgeSslCertificates"]]
+    return body
+
+
+def _definition(body, source, project_id):
+    if not isinstance(body, dict):
+        raise Exception(f"{source}: expected a mapping, got {type(body).__name__}")
+    kind = _infer_kind(body)
+    if kind is None:
+        raise Exception(f"{source}: cannot tell whether this is a service or an origin (set 'kind')")
+    body = json.loads(json.dumps(body))
+    resource_id = body.pop("id", None) or _short(body.get("name")) or os.path.splitext(os.path.basename(source))[0]
+    body.pop("kind", None)
+    for field in READ_ONLY_FIELDS:
+        body.pop(field, None)
+    return {"kind": kind, "id": resource_id, "body": normalize_refs(kind, body, project_id), "source": source}
+
+
+def load_definitions(path, project_id):
+    """Reads desired services and origins from a file or directory of JSON/YAML files.
+
+    A file may hold one resource, a list, or {"services": [...], "origins": [...]}.
+    """
+    files = [path] if os.path.isfile(path) else sorted(
+        f for f in glob.glob(os.path.join(path, "**", "*"), recursive=True) if f.endswith(DEFINITION_EXTENSIONS))
+    if not files:
+        raise Exception(f"No .json/.yaml definitions found in {path}")
+    definitions = []
+    for file_path in files:
+        with open(file_path, "r") as f:
+            text = f.read()
+        data = json.loads(text) if file_path.endswith(".json") else parse_yaml(text)
+        definitions.extend(parse_definitions(data, file_path, project_id))
+    return definitions
+
+
+def parse_definitions(data, source, project_id):
+    """Turns parsed JSON/YAML (resource, list or grouped dict) into definitions."""
+    if isinstance(data, dict) and ("services" in data or "origins" in data) and not _infer_kind(data):
+        items = [dict(item, kind="service") for item in data.get("services", [])]
+        items += [dict(item, kind="origin") for item in data.get("origins", [])]
+    elif isinstance(data, list):
+        items = data
+    else:
+        items = [data]
+    return [_definition(item, source, project_id) for item in items if item]
+
+
+# --- Plan ----------------------------------------------------------------
+
+def _is_unset(value):
+    return value in (None, {}, [], "", False, 0)
+
+
+def _matches(desired, live):
+    """Desired-subset comparison: fields the definition leaves out (or sets to a default) are not diffed."""
+    if isinstance(desired, dict):
+        live = {} if live is None else live
+        return isinstance(live, dict) and all(_matches(value, live.get(key)) for key, value in desired.items())
+    if isinstance(desired, list):
+        live = [] if live is None else live
+        return isinstance(live, list) and len(desired) == len(live) and all(_matches(d, l) for d, l in zip(desired, live))
+    if _is_unset(desired) and _is_unset(live):
+        return True
+    if isinstance(desired, (int, float, str)) and isinstance(live, (int, float, str)) and not isinstance(desired, bool):
+        # The API returns int64 fields (e.g. priority) as strings
+        return desired == live or str(desired) == str(live)
+    return desired == live
+
+
+def update_mask(desired, live):
+    """Top-level fields whose desired value differs from the live resource."""
+    return sorted(field for field, value in desired.items() if not _matches(value, live.get(field)))
+
+
+def fetch_live(project_id, token, concurrency=DEFAULT_CONCURRENCY):
+    """Lists live origins and services concurrently; returns {kind: {id: body}}."""
+    def fetch(kind):
+        collection, _, items_key = KINDS[kind]
+        items = list_all_resources(f"{API_BASE}/projects/{project_id}/locations/global/{collection}", items_key, token)
+        return {_short(item["name"]): normalize_refs(kind, item, project_id) for item in items if item.get("name")}
+
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(KINDS)))) as pool:
+        return dict(zip(KINDS, pool.map(fetch, KINDS)))
+
+
+def _origin_depths(origins):
+    """Failover depth per origin ID: 0 for origins without a failover, otherwise 1 + depth of the failover."""
+    depths = {}
+
+    def depth(origin_id, seen=()):
+        if origin_id in depths:
+            return depths[origin_id]
+        if origin_id in seen:
+            raise Exception(f"Failover loop through origin '{origin_id}'")
+        failover = _short(origins.get(origin_id, {}).get("failoverOrigin"))
+        depths[origin_id] = 0 if not failover or failover not in origins else depth(failover, seen + (origin_id,)) + 1
+        return depths[origin_id]
+
+    for origin_id in origins:
+        depth(origin_id)
+    return depths
+
+
+def _service_refs(body):
+    refs = set()
+    for pm in body.get("routing", {}).get("pathMatchers", []):
+        for rule in pm.get("routeRules", []):
+            if rule.get("origin"):
+                refs.add(_short(rule["origin"]))
+    return refs
+
+
+def compute_plan(definitions, live, prune=False):
+    """Diffs definitions against live state.
+
+    Returns actions ordered into waves that are safe to run in parallel:
+    origins (failover targets first), then services, then service deletes,
+    then origin deletes (parents before their failovers).
+    """
+    desired = {"origin": {}, "service": {}}
+    errors = []
+    for d in definitions:
+        if d["id"] in desired[d["kind"]]:
+            errors.append({"resource": f"{d['kind']}/{d['id']}", "message": f"Defined twice (again in {d['source']})"})
+        desired[d["kind"]][d["id"]] = d
+
+    actions = []
+    for kind in ("origin", "service"):
+        for resource_id, d in sorted(desired[kind].items()):
+            current = live[kind].get(resource_id)
+            if current is None:
+                actions.append({"action": "create", "kind": kind, "id": resource_id, "source": d["source"]})
+                continue
+            mask = update_mask(d["body"], current)
+            actions.append({"action": "update" if mask else "noop", "kind": kind, "id": resource_id,
+                            "update_mask": mask, "source": d["source"]})
+        if prune:
+            for resource_id in sorted(set(live[kind]) - set(desired[kind])):
+                actions.append({"action": "delete", "kind": kind, "id": resource_id})
+
+    # Validate against the inventory as it will look after apply
+    final_origins = {oid: d["body"] for oid, d in desired["origin"].items()}
+    final_origins.update({oid: body for oid, body in live["origin"].items()
+                          if oid not in final_origins and not prune})
+    for kind, validate in (("origin", validate_origin_config), ("service", validate_service_config)):
+        for resource_id, d in desired[kind].items():
+            for error in validate(d["body"]):
+                errors.append({"resource": f"{kind}/{resource_id}", "message": f"{error['path']}: {error['message']}"})
+    for service_id, d in desired["service"].items():
+        for ref in sorted(_service_refs(d["body"]) - set(final_origins)):
+            errors.append({"resource": f"service/{service_id}", "message": f"Origin '{ref}' is neither defined nor live"})
+    for origin_id, d in desired["origin"].items():
+        failover = _short(d["body"].get("failoverOrigin"))
+        if failover and failover not in final_origins:
+            errors.append({"resource": f"origin/{origin_id}",
+                           "message": f"Failover origin '{failover}' is neither defined nor live"})
+
+    remaining_services = {sid: body for sid, body in live["service"].items() if sid in desired["service"] or not prune}
+    remaining_services.update({sid: d["body"] for sid, d in desired["service"].items()})
+    # Origins used by a remaining service or origin stay, and so does their failover chain
+    pending = [ref for body in remaining_services.values() for ref in _service_refs(body)]
+    pending += [_short(body["failoverOrigin"]) for body in final_origins.values() if body.get("failoverOrigin")]
+    referenced = set()
+    while pending:
+        origin_id = pending.pop()
+        if origin_id not in referenced:
+            referenced.add(origin_id)
+            if live["origin"].get(origin_id, {}).get("failoverOrigin"):
+                pending.append(_short(live["origin"][origin_id]["failoverOrigin"]))
+    for action in actions:
+        if action["action"] == "delete" and action["kind"] == "origin" and action["id"] in referenced:
+            action.update({"action": "skip", "reason": "Still referenced by a service or origin"})
+
+    try:
+        create_depths = _origin_depths(final_origins)
+        delete_depths = _origin_depths(live["origin"])
+    except Exception as e:
+        errors.append({"resource": "origins", "message": str(e)})
+        create_depths, delete_depths = {}, {}
+    max_depth = max(list(create_depths.values()) + list(delete_depths.values()) + [0])
+    for action in actions:
+        if action["kind"] == "origin" and action["action"] in ("create", "update"):
+            action["wave"] = create_depths.get(action["id"], 0)
+        elif action["kind"] == "service" and action["action"] in ("create", "update"):
+            action["wave"] = max_depth + 1
+        elif action["kind"] == "service" and action["action"] == "delete":
+            action["wave"] = max_depth + 2
+        elif action["kind"] == "origin" and action["action"] == "delete":
+            action["wave"] = max_depth + 3 + (max_depth - delete_depths.get(action["id"], 0))
+
+    summary = {name: sum(1 for a in actions if a["action"] == name) for name in ("create", "update", "delete", "noop", "skip")}
+    models = {"service": ServiceConfig, "origin": OriginConfig}
+    digests = {f"{d['kind']}/{d['id']}": models[d["kind"]].from_api(d["body"]).content_hash() for d in definitions}
+    fingerprint = hashlib.sha256(json.dumps(
+        [[a["action"], a["kind"], a["id"], a.get("update_mask"), digests.get(f"{a['kind']}/{a['id']}")] for a in actions]
+    ).encode()).hexdigest()[:16]
+    return {"actions": actions, "summary": summary, "errors": errors, "fingerprint": fingerprint}
+
+
+# --- Apply ---------------------------------------------------------------
+
+def wait_for_operation(operation_name, token, interval=OPERATION_POLL_INTERVAL, timeout=OPERATION_TIMEOUT):
+    started = time.time()
+    while True:
+        op = make_gcp_request(f"{API_BASE}/{operation_name}", token=token)
+        if op.get("done"):
+            if op.get("error"):
+                raise Exception(f"Operation failed: {op['error']}")
+            return op
+        if time.time() - started > timeout:
+            raise Exception(f"Operation {operation_name} did not finish within {timeout}s")
+        time.sleep(interval)
+
+
+def _execute(action, definitions, project_id, token, poll_interval):
+    collection, id_param, _ = KINDS[action["kind"]]
+    base = f"{API_BASE}/projects/{project_id}/locations/global/{collection}"
+    if action["action"] == "create":
+        resp = make_gcp_request(f"{base}?{id_param}={action['id']}", method="POST",
+                                data=definitions[(action["kind"], action["id"])]["body"], token=token)
+    elif action["action"] == "update":
+        resp = make_gcp_request(f"{base}/{action['id']}?updateMask={','.join(action['update_mask'])}", method="PATCH",
+                                data=definitions[(action["kind"], action["id"])]["body"], token=token)
+    else:
+        resp = make_gcp_request(f"{base}/{action['id']}", method="DELETE", token=token)
+    if resp.get("name"):
+        wait_for_operation(resp["name"], token, interval=poll_interval)
+
+
+def apply_plan(plan, definitions, project_id, token, concurrency=DEFAULT_CONCURRENCY, on_progress=None,
+               poll_interval=OPERATION_POLL_INTERVAL):
+    """Runs a plan wave by wave with at most `concurrency` operations in flight.
+
+    A wave with failures stops the apply; later waves may depend on it.
+    Returns a result per action.
+    """
+    if plan["errors"]:
+        raise Exception(f"Plan has {len(plan['errors'])} error(s); fix them before applying")
+    by_key = {(d["kind"], d["id"]): d for d in definitions}
+    pending = [a for a in plan["actions"] if a["action"] in ("create", "update", "delete")]
+    waves = sorted({a["wave"] for a in pending})
+    results, done = [], 0
+    on_progress = on_progress or (lambda done, total, result: None)
+
+    def run(action):
+        started = time.time()
+        try:
+            _execute(action, by_key, project_id, token, poll_interval)
+            return {"kind": action["kind"], "id": action["id"], "action": action["action"], "status": "done",
+                    "seconds": round(time.time() - started, 1)}
+        except Exception as e:
+            log.error("Fleet %s %s/%s failed: %s", action["action"], action["kind"], action["id"], e)
+            return {"kind": action["kind"], "id": action["id"], "action": action["action"], "status": "failed", "error": str(e)}
+
+    workers = max(1, min(int(concurrency or DEFAULT_CONCURRENCY), MAX_CONCURRENCY))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for wave in waves:
+            batch = [a for a in pending if a["wave"] == wave]
+            for result in pool.map(run, batch):
+                done += 1
+                results.append(result)
+                on_progress(done, len(pending), result)
+            if any(r["status"] == "failed" for r in results):
+                skipped = [a for a in pending if a["wave"] > wave]
+                results.extend({"kind": a["kind"], "id": a["id"], "action": a["action"], "status": "not_started"} for a in skipped)
+                break
+    return results
+
+
+def describe_plan(plan):
+    symbols = {"create": "+", "update": "~", "delete": "-", "noop": "=", "skip": "!"}
+    lines = []
+    for action in sorted(plan["actions"], key=lambda a: (a.get("wave", -1), a["kind"], a["id"])):
+        line = f"{symbols[action['action']]} {action['kind']} {action['id']}"
+        if action.get("update_mask"):
+            line += f" ({', '.join(action['update_mask'])})"
+        if action.get("reason"):
+            line += f" [{action['reason']}]"
+        lines.append(line)
+    for error in plan["errors"]:
+        lines.append(f"ERROR {error['resource']}: {error['message']}")
+    s = plan["summary"]
+    lines.append(f"Plan {plan['fingerprint']}: {s['create']} to create, {s['update']} to update, {s['delete']} to delete, "
+                 f"{s['noop']} unchanged")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Plan and apply Media CDN services and origins from JSON/YAML definitions.")
+    parser.add_argument("command", choices=["plan", "apply"])
+    parser.add_argument("path", help="Definition file or directory")
+    parser.add_argument("--key", default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "credentials", "key.json"),
+                        help="Service account key (its project is the target)")
+    parser.add_argument("--prune", action="store_true", help="Delete live resources that have no definition")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--yes", action="store_true", help="Apply without confirmation")
+    parser.add_argument("--json", action="store_true", help="Print the plan as JSON")
+    args = parser.parse_args(argv)
+
+    with open(args.key, "r") as f:
+        key_data = json.load(f)
+    project_id = key_data["project_id"]
+    token = get_access_token(key_data)
+    definitions = load_definitions(args.path, project_id)
+    plan = compute_plan(definitions, fetch_live(project_id, token, args.concurrency), prune=args.prune)
+    print(json.dumps(plan, indent=2) if args.json else describe_plan(plan))
+    if args.command == "plan" or plan["errors"]:
+        return 1 if plan["errors"] else 0
+    if not any(a["action"] in ("create", "update", "delete") for a in plan["actions"]):
+        return 0
+    if not args.yes and input(f"Apply to {project_id}? [y/N] ").strip().lower() != "y":
+        return 1
+    results = apply_plan(plan, definitions, project_id, token, args.concurrency,
+                         on_progress=lambda done, total, r: print(f"[{done}/{total}] {r['action']} {r['kind']} {r['id']}: {r['status']}"))
+    return 0 if all(r["status"] == "done" for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+import email.utils
+import gzip
+import hashlib
+import io
+import mimetypes
+import os
+import threading
+
+# Bodies smaller than this are sent as-is; gzip would not pay for its header
+MIN_GZIP_SIZE = 1024
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "image/svg+xml", "application/xml")
+# Idle keep-alive connections are dropped after this many seconds
+KEEP_ALIVE_TIMEOUT = 60
+
+_STATIC_CACHE = {}
+_STATIC_LOCK = threading.Lock()
+
+
+def _etag(body):
+    return hashlib.sha256(body).hexdigest()[:32]
+
+
+def _compressible(content_type):
+    return (content_type or "").startswith(COMPRESSIBLE_TYPES)
+
+
+def _etag_matches(header, etag):
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return etag in [tag.strip() for tag in header.split(",")]
+
+
+def load_static(fs_path):
+    """Returns the cached (raw, gzipped, etag, content type, mtime) entry for a file, reloading on change."""
+    stat = os.stat(fs_path)
+    with _STATIC_LOCK:
+        entry = _STATIC_CACHE.get(fs_path)
+        if entry and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+            return entry
+    with open(fs_path, "rb") as f:
+        raw = f.read()
+    content_type = mimetypes.guess_type(fs_path)[0] or "application/octet-stream"
+    entry = {
+        "raw": raw,
+        "gzip": gzip.compress(raw, 9) if _compressible(content_type) and len(raw) >= MIN_GZIP_SIZE else None,
+        "etag": _etag(raw),
+        "content_type": content_type,
+        "mtime": stat.st_mtime,
+        "size": stat.st_size
+    }
+    with _STATIC_LOCK:
+        _STATIC_CACHE[fs_path] = entry
+    return entry
+
+
+class BufferedResponseMixin:
+    """HTTP/1.1 keep-alive for handlers written against the send_response/end_headers/wfile API.
+
+    While a request is dispatched, status, headers and body are captured
+    instead of written. Once the handler returns, the response is sent with
+    an exact Content-Length, gzip when the client accepts it, and (for GET
+    200s) a strong ETag, answering a matching If-None-Match with 304.
+    """
+
+    protocol_version = "HTTP/1.1"
+    timeout = KEEP_ALIVE_TIMEOUT
+
+    _capture = None
+
+    def handle_one_request(self):
+        self._capture = None
+        try:
+            super().handle_one_request()
+        finally:
+            if self._capture is not None:
+                self._flush_capture()
+
+    def parse_request(self):
+        ok = super().parse_request()
+        if ok:
+            self._capture = {"code": None, "message": None, "headers": [], "raw_wfile": self.wfile}
+            self.wfile = io.BytesIO()
+        return ok
+
+    def send_response(self, code, message=None):
+        if self._capture is None:
+            return super().send_response(code, message)
+        self._capture.update({"code": code, "message": message, "headers": []})
+
+    def send_header(self, keyword, value):
+        if self._capture is None:
+            return super().send_header(keyword, value)
+        self._capture["headers"].append((keyword, str(value)))
+
+    def end_headers(self):
+        if self._capture is None:
+            return super().end_headers()
+
+    def _flush_capture(self):
+        capture, self._capture = self._capture, None
+        body = self.wfile.getvalue()
+        self.wfile = capture["raw_wfile"]
+        if capture["code"] is None:
+            # Nothing was sent (e.g. the handler crashed before responding)
+            self.close_connection = True
+            return
+
+        dropped = ("server", "date") if self.command == "HEAD" else ("content-length", "server", "date")
+        headers = [(k, v) for k, v in capture["headers"] if k.lower() not in dropped]
+        names = {k.lower() for k, _ in headers}
+        content_type = next((v for k, v in headers if k.lower() == "content-type"), "")
+        gz_body = None
+        if "content-encoding" not in names and _compressible(content_type) and len(body) >= MIN_GZIP_SIZE:
+            gz_body = gzip.compress(body, 6) if self._accepts_gzip() else None
+            headers.append(("Vary", "Accept-Encoding"))
+        etag = None
+        if self.command in ("GET", "HEAD") and capture["code"] == 200 and "etag" not in names:
+            etag = _etag(body)
+        self.write_response(capture["code"], headers, body, etag, gz_body, capture["message"])
+
+    def _accepts_gzip(self):
+        return "gzip" in (self.headers.get("Accept-Encoding") or "").lower()
+
+    def write_response(self, code, headers, body, etag=None, gz_body=None, message=None):
+        """Sends a complete response, picking the gzip variant and answering If-None-Match."""
+        if gz_body is not None and self._accepts_gzip():
+            body = gz_body
+            headers = headers + [("Content-Encoding", "gzip")]
+            if etag:
+                # Strong validators must differ between encodings of the same resource
+                etag = f"{etag}-gz"
+        if etag:
+            etag = f'"{etag}"'
+            headers = headers + [("ETag", etag)]
+            if _etag_matches(self.headers.get("If-None-Match"), etag):
+                code, body = 304, b""
+                headers = [(k, v) for k, v in headers if k.lower() not in ("content-encoding",)]
+
+        self.log_request(code)
+        self.send_response_only(code, message)
+        super().send_header("Server", self.version_string())
+        super().send_header("Date", self.date_time_string())
+        for keyword, value in headers:
+            super().send_header(keyword, value)
+        if code != 304 and not (self.command == "HEAD" and any(k.lower() == "content-length" for k, _ in headers)):
+            super().send_header("Content-Length", str(len(body)))
+        super().end_headers()
+        if self.command != "HEAD" and code != 304:
+            self.wfile.write(body)
+
+    def send_static(self, fs_path):
+        """Serves a file from the in-memory cache (raw and precompressed) with validators."""
+        entry = load_static(fs_path)
+        if self._capture is not None:
+            # Written directly; nothing else of this response was buffered
+            self.wfile = self._capture["raw_wfile"]
+            self._capture = None
+        headers = [
+            ("Content-Type", entry["content_type"]),
+            ("Last-Modified", email.utils.formatdate(entry["mtime"], usegmt=True)),
+            # Always revalidate; unchanged files come back as 304
+            ("Cache-Control", "no-cache")
+        ]
+        if entry["gzip"] is not None:
+            headers.append(("Vary", "Accept-Encoding"))
+        self.write_response(200, headers, entry["raw"], entry["etag"], entry["gzip"])
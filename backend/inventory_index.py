@@ -0,0 +1,192 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+KINDS = ("services", "origins", "keysets", "certificates")
+SORT_COLUMNS = {"id": "r.id", "name": "r.id", "updated": "r.update_time", "created": "r.create_time", "project": "r.project"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS resources (
+    project TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    id TEXT NOT NULL,
+    description TEXT,
+    create_time TEXT,
+    update_time TEXT,
+    digest TEXT NOT NULL,
+    body TEXT NOT NULL,
+    PRIMARY KEY (project, kind, id)
+);
+CREATE INDEX IF NOT EXISTS resources_kind ON resources (kind, id);
+CREATE INDEX IF NOT EXISTS resources_updated ON resources (kind, update_time);
+CREATE INDEX IF NOT EXISTS resources_created ON resources (kind, create_time);
+CREATE TABLE IF NOT EXISTS refs (
+    project TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    id TEXT NOT NULL,
+    ref_type TEXT NOT NULL,
+    value TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS refs_lookup ON refs (ref_type, value);
+CREATE INDEX IF NOT EXISTS refs_owner ON refs (project, kind, id);
+CREATE TABLE IF NOT EXISTS refreshes (
+    project TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    refreshed_at REAL NOT NULL,
+    PRIMARY KEY (project, kind)
+);
+"""
+
+
+def _short(name):
+    return (name or "").rsplit("/", 1)[-1]
+
+
+def extract_refs(kind, resource):
+    """Returns (ref_type, value) pairs a resource can be searched by."""
+    refs = set()
+    if kind == "services":
+        routing = resource.get("routing", {})
+        for hr in routing.get("hostRules", []):
+            for host in hr.get("hosts", []):
+                refs.add(("host", host.lower()))
+        for pm in routing.get("pathMatchers", []):
+            for rule in pm.get("routeRules", []):
+                if rule.get("origin"):
+                    refs.add(("origin", _short(rule["origin"])))
+                policy = rule.get("routeAction", {}).get("cdnPolicy", {})
+                for keyset in (policy.get("signedRequestKeyset"), policy.get("addSignatures", {}).get("keyset")):
+                    if keyset:
+                        refs.add(("keyset", _short(keyset)))
+        for cert in resource.get("edgeSslCertificates", []):
+            refs.add(("certificate", _short(cert)))
+        if resource.get("edgeSecurityPolicy"):
+            refs.add(("security_policy", _short(resource["edgeSecurityPolicy"])))
+    elif kind == "origins":
+        if resource.get("originAddress"):
+            refs.add(("address", resource["originAddress"].lower()))
+        if resource.get("failoverOrigin"):
+            refs.add(("origin", _short(resource["failoverOrigin"])))
+    elif kind == "certificates":
+        for domain in resource.get("sanDnsnames", []) or resource.get("managed", {}).get("domains", []):
+            refs.add(("host", domain.lower()))
+    return refs
+
+
+def host_candidates(host):
+    """The host itself plus every wildcard host rule that would cover it ('*.example.com', '*')."""
+    host = host.lower().split(":")[0]
+    labels = host.split(".")
+    return [host, "*"] + ["*." + ".".join(labels[i:]) for i in range(1, len(labels))]
+
+
+class InventoryIndex:
+    """SQLite index of Media CDN resources across projects.
+
+    Each list refresh is diffed against the stored digests, so only changed
+    rows and their references are rewritten.
+    """
+
+    def __init__(self, path=":memory:"):
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def refreshed_at(self, project, kind):
+        with self._lock:
+            row = self._db.execute("SELECT refreshed_at FROM refreshes WHERE project = ? AND kind = ?", (project, kind)).fetchone()
+        return row[0] if row else 0
+
+    def refresh(self, project, kind, items):
+        """Replaces the stored snapshot of one (project, kind) listing; returns change counts."""
+        incoming = {}
+        for item in items:
+            body = json.dumps(item, sort_keys=True)
+            incoming[_short(item.get("name"))] = (item, body, hashlib.sha1(body.encode()).hexdigest())
+
+        with self._lock, self._db:
+            existing = dict(self._db.execute(
+                "SELECT id, digest FROM resources WHERE project = ? AND kind = ?", (project, kind)
+            ).fetchall())
+            removed = [rid for rid in existing if rid not in incoming]
+            changed = [rid for rid, (_, _, digest) in incoming.items() if existing.get(rid) != digest]
+
+            for rid in removed + changed:
+                self._db.execute("DELETE FROM refs WHERE project = ? AND kind = ? AND id = ?", (project, kind, rid))
+            self._db.executemany(
+                "DELETE FROM resources WHERE project = ? AND kind = ? AND id = ?", [(project, kind, rid) for rid in removed]
+            )
+            for rid in changed:
+                item, body, digest = incoming[rid]
+                self._db.execute(
+                    "INSERT OR REPLACE INTO resources VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (project, kind, rid, item.get("description", ""), item.get("createTime"), item.get("updateTime"), digest, body)
+                )
+                self._db.executemany(
+                    "INSERT INTO refs VALUES (?, ?, ?, ?, ?)",
+                    [(project, kind, rid, ref_type, value) for ref_type, value in extract_refs(kind, item)]
+                )
+            self._db.execute("INSERT OR REPLACE INTO refreshes VALUES (?, ?, ?)", (project, kind, time.time()))
+        return {"added": len([r for r in changed if r not in existing]), "updated": len([r for r in changed if r in existing]),
+                "removed": len(removed), "unchanged": len(incoming) - len(changed)}
+
+    def search(self, kind="services", projects=None, q=None, host=None, origin=None, certificate=None, keyset=None,
+               address=None, sort="id", order="asc", page_size=DEFAULT_PAGE_SIZE, page_token=None, full=False):
+        """Filters, sorts and pages indexed resources. page_token is an opaque offset."""
+        if kind not in KINDS:
+            raise Exception(f"Unknown kind: {kind}. Expected one of {', '.join(KINDS)}")
+        where, params = ["r.kind = ?"], [kind]
+        if projects is not None:
+            where.append(f"r.project IN ({', '.join('?' * len(projects))})")
+            params.extend(projects)
+        if q:
+            where.append("(r.id LIKE ? ESCAPE '\\' OR r.description LIKE ? ESCAPE '\\')")
+            pattern = "%" + q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            params.extend([pattern, pattern])
+        filters = [("origin", [origin]), ("certificate", [certificate]), ("keyset", [keyset]), ("address", [address])]
+        if host:
+            filters.append(("host", host_candidates(host)))
+        for ref_type, values in filters:
+            values = [v.lower() if ref_type in ("address", "host") else _short(v) for v in values if v]
+            if values:
+                # Resolved through the (ref_type, value) index rather than scanning resources
+                where.append(f"(r.project, r.kind, r.id) IN (SELECT project, kind, id FROM refs WHERE ref_type = ? AND value IN ({', '.join('?' * len(values))}))")
+                params.extend([ref_type] + values)
+
+        column = SORT_COLUMNS.get(sort, "r.id")
+        direction = "DESC" if str(order).lower() == "desc" else "ASC"
+        page_size = max(1, min(int(page_size or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+        offset = int(page_token or 0)
+        clause = " AND ".join(where)
+
+        with self._lock:
+            total = self._db.execute(f"SELECT COUNT(*) FROM resources r WHERE {clause}", params).fetchone()[0]
+            rows = self._db.execute(
+                f"SELECT r.project, r.id, r.description, r.create_time, r.update_time, r.body FROM resources r "
+                f"WHERE {clause} ORDER BY {column} {direction}, r.project, r.id LIMIT ? OFFSET ?",
+                params + [page_size, offset]
+            ).fetchall()
+            refs = {}
+            for project, rid, *_ in rows:
+                for ref_type, value in self._db.execute(
+                    "SELECT ref_type, value FROM refs WHERE project = ? AND kind = ? AND id = ? ORDER BY value", (project, kind, rid)
+                ):
+                    refs.setdefault((project, rid), {}).setdefault(f"{ref_type}s", []).append(value)
+
+        items = []
+        for project, rid, description, create_time, update_time, body in rows:
+            item = {"project": project, "id": rid, "description": description, "createTime": create_time, "updateTime": update_time}
+            item.update(refs.get((project, rid), {}))
+            if full:
+                item["resource"] = json.loads(body)
+            items.append(item)
+        next_offset = offset + len(rows)
+        return {
+            "items": items,
+            "total": total,
+            "next_page_token": str(next_offset) if next_offset < total else None
+        }
@@ -0,0 +1,253 @@
+import argparse
+import gzip
+import io
+import json
+import re
+import sys
+import urllib.parse
+from collections import Counter
+
+from route_matcher import RouteMatcher
+
+# Bounds that keep memory constant regardless of log volume
+MAX_PATTERNS = 2000
+MAX_QUERY_PARAMS = 200
+MIN_REQUESTS_FOR_SUGGESTION = 100
+WORST_RULES = 5
+
+HIT_STATUSES = {"hit", "revalidated_hit", "stale_hit", "partial_hit"}
+_ID_SEGMENT_RE = re.compile(r"^(?:\d+|[0-9a-fA-F]{8,}|[0-9a-fA-F-]{32,36})$")
+
+
+def path_pattern(path):
+    """Collapses a request path into a coarse pattern such as '/vod/{id}/*.ts'."""
+    segments = path.split("/")[1:]
+    out = []
+    for idx, seg in enumerate(segments):
+        if idx == len(segments) - 1 and "." in seg:
+            out.append("*." + seg.rsplit(".", 1)[-1].lower())
+        elif _ID_SEGMENT_RE.match(seg):
+            out.append("{id}")
+        else:
+            out.append(seg)
+    return "/" + "/".join(out)
+
+
+def _new_bucket():
+    return {"requests": 0, "hits": 0, "origin_fetches": 0, "bytes": 0, "fill_bytes": 0}
+
+
+def _add(bucket, is_hit, is_fill, size, fill_bytes):
+    bucket["requests"] += 1
+    bucket["bytes"] += size
+    bucket["fill_bytes"] += fill_bytes
+    if is_hit:
+        bucket["hits"] += 1
+    if is_fill:
+        bucket["origin_fetches"] += 1
+
+
+def _finish(bucket):
+    requests = bucket["requests"] or 1
+    bucket["hit_ratio"] = round(bucket["hits"] / requests, 4)
+    bucket["origin_fetch_rate"] = round(bucket["origin_fetches"] / requests, 4)
+    return bucket
+
+
+def parse_entry(entry):
+    """Extracts (url, status, size, is_hit, is_fill, fill_bytes) from a Media CDN log entry."""
+    http = entry.get("httpRequest", {})
+    payload = entry.get("jsonPayload", {})
+    url = http.get("requestUrl", "")
+    status = int(http.get("status", 0) or 0)
+    size = int(http.get("responseSize", 0) or 0)
+    fill_bytes = int(http.get("cacheFillBytes", 0) or 0)
+
+    cache_status = str(payload.get("cacheStatus", "")).lower()
+    if cache_status:
+        is_hit = cache_status in HIT_STATUSES
+    else:
+        is_hit = bool(http.get("cacheHit"))
+    is_fill = fill_bytes > 0 or (bool(http.get("cacheLookup", True)) and not is_hit)
+    return url, status, size, is_hit, is_fill, fill_bytes
+
+
+class LogAnalyzer:
+    """Streaming aggregator for Media CDN edge logs with bounded memory."""
+
+    def __init__(self, service_body=None, host=None):
+        self.matcher = RouteMatcher(service_body) if service_body else None
+        self.host = host
+        self.total = _new_bucket()
+        self.by_status = Counter()
+        self.bytes_by_status = Counter()
+        self.by_rule = {}
+        self.by_pattern = {}
+        self.query_params = {}
+        self.bad_lines = 0
+
+    def add_line(self, line):
+        line = line.strip()
+        if not line:
+            return
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            self.bad_lines += 1
+            return
+        self.add_entry(entry)
+
+    def add_entry(self, entry):
+        url, status, size, is_hit, is_fill, fill_bytes = parse_entry(entry)
+        parsed = urllib.parse.urlsplit(url)
+        path = parsed.path or "/"
+
+        _add(self.total, is_hit, is_fill, size, fill_bytes)
+        self.by_status[status] += 1
+        self.bytes_by_status[status] += size
+
+        pattern = path_pattern(path)
+        if pattern not in self.by_pattern and len(self.by_pattern) >= MAX_PATTERNS:
+            pattern = "(other)"
+        _add(self.by_pattern.setdefault(pattern, _new_bucket()), is_hit, is_fill, size, fill_bytes)
+
+        rule_key = "(unrouted)"
+        if self.matcher:
+            rule = self.matcher.match(f"{path}?{parsed.query}" if parsed.query else path, self.host or parsed.hostname)
+            if rule is not None:
+                rule_key = rule["id"]
+        _add(self.by_rule.setdefault(rule_key, _new_bucket()), is_hit, is_fill, size, fill_bytes)
+
+        if parsed.query:
+            params = self.query_params.setdefault(rule_key, Counter())
+            for name in urllib.parse.parse_qs(parsed.query, keep_blank_values=True):
+                if name in params or len(params) < MAX_QUERY_PARAMS:
+                    params[name] += 1
+
+    def add_stream(self, stream):
+        for line in stream:
+            self.add_line(line)
+
+    def _suggest(self, rule, stats, params):
+        suggestions = []
+        if stats["requests"] < MIN_REQUESTS_FOR_SUGGESTION or stats["hit_ratio"] >= 0.95:
+            return suggestions
+        policy_key = rule.get("cacheKeyPolicy") or {}
+        noisy = [name for name, count in params.most_common(10) if count >= stats["requests"] * 0.5]
+        if noisy and not policy_key.get("excludeQueryString") and not policy_key.get("includedQueryParameters"):
+            suggestions.append({
+                "field": "cdnPolicy.cacheKeyPolicy.excludedQueryParameters",
+                "value": noisy,
+                "reason": f"Query parameters {', '.join(noisy)} appear on most requests and fragment the cache key"
+            })
+        if rule["cacheMode"] == "USE_ORIGIN_HEADERS":
+            suggestions.append({
+                "field": "cdnPolicy.cacheMode",
+                "value": "FORCE_CACHE_ALL",
+                "reason": "Origin cache headers are honored as-is; forcing caching with an explicit TTL usually raises hit ratio for media"
+            })
+        elif rule["cacheMode"] == "BYPASS_CACHE":
+            suggestions.append({
+                "field": "cdnPolicy.cacheMode",
+                "value": "CACHE_ALL_STATIC",
+                "reason": "Every request to this rule bypasses the cache"
+            })
+        else:
+            try:
+                ttl = float(str(rule["defaultTtl"]).rstrip("s"))
+            except ValueError:
+                ttl = None
+            if ttl is not None and ttl < 3600 and not any(p and (p.endswith(".m3u8") or p.endswith(".mpd")) for p in rule["patterns"]):
+                suggestions.append({
+                    "field": "cdnPolicy.defaultTtl",
+                    "value": "86400s",
+                    "reason": f"defaultTtl {rule['defaultTtl']} is short for immutable media objects"
+                })
+        return suggestions
+
+    def report(self):
+        rules = []
+        if self.matcher:
+            for rule in self.matcher.rules:
+                stats = self.by_rule.get(rule["id"])
+                if not stats:
+                    continue
+                entry = {
+                    "id": rule["id"],
+                    "priority": rule["priority"],
+                    "description": rule["description"],
+                    "patterns": rule["patterns"],
+                    "cacheMode": rule["cacheMode"],
+                    "defaultTtl": rule["defaultTtl"]
+                }
+                entry.update(_finish(dict(stats)))
+                entry["top_query_params"] = dict(self.query_params.get(rule["id"], Counter()).most_common(10))
+                rules.append(entry)
+
+        worst = sorted(
+            [r for r in rules if r["requests"] >= MIN_REQUESTS_FOR_SUGGESTION],
+            key=lambda r: r["hit_ratio"]
+        )[:WORST_RULES]
+        suggestions = []
+        for r in worst:
+            rule = self.matcher.rules[r["id"]]
+            rule_suggestions = self._suggest(rule, r, self.query_params.get(r["id"], Counter()))
+            if rule_suggestions:
+                suggestions.append({"rule": r["id"], "description": r["description"], "hit_ratio": r["hit_ratio"], "suggestions": rule_suggestions})
+
+        patterns = sorted(
+            ({"pattern": p, **_finish(dict(s))} for p, s in self.by_pattern.items()),
+            key=lambda x: x["requests"], reverse=True
+        )
+        return {
+            "summary": _finish(dict(self.total)),
+            "requests_by_status": {str(k): v for k, v in sorted(self.by_status.items())},
+            "bytes_by_status": {str(k): v for k, v in sorted(self.bytes_by_status.items())},
+            "rules": rules,
+            "unrouted": _finish(dict(self.by_rule["(unrouted)"])) if "(unrouted)" in self.by_rule else None,
+            "patterns": patterns[:100],
+            "suggestions": suggestions,
+            "bad_lines": self.bad_lines
+        }
+
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+def open_log_stream(fileobj, gzipped=None):
+    """Wraps a binary file object as a line iterator, decompressing gzip on the fly.
+
+    With gzipped=None the stream is sniffed for the gzip magic bytes: GCS
+    serves objects stored with Content-Encoding: gzip already decompressed
+    unless the client asks for gzip, so names and metadata are not reliable.
+    """
+    if gzipped is None:
+        if not hasattr(fileobj, "peek"):
+            fileobj = io.BufferedReader(fileobj)
+        gzipped = fileobj.peek(2)[:2] == GZIP_MAGIC
+    if gzipped:
+        fileobj = gzip.GzipFile(fileobj=fileobj)
+    return io.TextIOWrapper(fileobj, encoding="utf-8", errors="replace")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze exported Media CDN edge logs (JSONL, optionally gzipped).")
+    parser.add_argument("logs", nargs="+", help="Log files (.json/.jsonl, .gz supported)")
+    parser.add_argument("--service", help="Service config JSON used to attribute requests to route rules")
+    parser.add_argument("--host", help="Host to route with when log URLs have no host")
+    args = parser.parse_args(argv)
+
+    service_body = None
+    if args.service:
+        with open(args.service, "r") as f:
+            service_body = json.load(f)
+    analyzer = LogAnalyzer(service_body, host=args.host)
+    for filename in args.logs:
+        with open(filename, "rb") as f:
+            analyzer.add_stream(open_log_stream(f))
+    json.dump(analyzer.report(), sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+
+LOG_QUEUE_SIZE = 10000
+# Messages and extra fields longer than this are cut before formatting
+MAX_FIELD_CHARS = 2000
+
+_request_id = contextvars.ContextVar("request_id", default=None)
+_job_id = contextvars.ContextVar("job_id", default=None)
+_listener = None
+_dropped = {"count": 0}
+_sample_counters = {}
+
+# Attributes every LogRecord has; anything else came in through extra={...}
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id", "job_id"}
+
+
+def truncate(value, limit=MAX_FIELD_CHARS):
+    text = value if isinstance(value, str) else json.dumps(value, default=str)
+    if len(text) <= limit:
+        return value
+    return f"{text[:limit]}...(+{len(text) - limit} chars)"
+
+
+def set_request_id(request_id):
+    _request_id.set(request_id)
+
+
+def set_job_id(job_id):
+    """Tags log records emitted from the current thread with job_id."""
+    _job_id.set(job_id)
+
+
+def should_sample(key, every):
+    """True for the first and then every `every`-th call with this key."""
+    count = _sample_counters.get(key, 0)
+    _sample_counters[key] = count + 1
+    return count % every == 0
+
+
+class _ContextFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = _request_id.get()
+        record.job_id = _job_id.get()
+        return True
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Never blocks the caller: records are dropped (and counted) when the queue is full."""
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _dropped["count"] += 1
+
+    def prepare(self, record):
+        # Keep the record cheap to enqueue; rendering happens on the listener thread
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": truncate(record.getMessage())
+        }
+        for key in ("request_id", "job_id"):
+            if getattr(record, key, None):
+                entry[key] = getattr(record, key)
+        for key, value in vars(record).items():
+            if key not in _RESERVED:
+                entry[key] = truncate(value)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        context = " ".join(f"{key}={getattr(record, key)}" for key in ("request_id", "job_id") if getattr(record, key, None))
+        line = f"{self.formatTime(record)} {record.levelname:<7} {record.name}: {truncate(record.getMessage())}"
+        if context:
+            line += f" [{context}]"
+        if record.exc_text:
+            line += "\n" + record.exc_text
+        return line
+
+
+def configure_logging(level=None, fmt=None, stream=None):
+    """Routes the 'mediacdn' loggers through a bounded queue to a background writer thread.
+
+    LOG_LEVEL (default INFO) and LOG_FORMAT ('json' or 'text', default text)
+    are read from the environment when not passed explicitly.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    level = level or os.environ.get("LOG_LEVEL", "INFO")
+    fmt = fmt or os.environ.get("LOG_FORMAT", "text")
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    handler = _DroppingQueueHandler(log_queue)
+    handler.addFilter(_ContextFilter())
+
+    root = logging.getLogger("mediacdn")
+    root.setLevel(level.upper())
+    root.handlers = [handler]
+    root.propagate = False
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging():
+    """Flushes queued records; call before exit."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def dropped_records():
+    return _dropped["count"]
+
+
+def get_logger(name):
+    return logging.getLogger(f"mediacdn.{name}")
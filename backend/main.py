@@ -1,6 +1,6 @@
 import os
 import sys
-import traceback
+import contextvars
 import secrets
 import base64
 import threading
@@ -15,17 +15,285 @@ import urllib.parse
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from urllib.parse import urlparse, parse_qs
+from concurrent.futures import ThreadPoolExecutor
 from media_cdn_api import (
     get_access_token, make_gcp_request, get_project_number, 
     check_bucket_iam, grant_bucket_iam, create_gcs_bucket,
-    upload_gcs_object, list_gcs_object_versions, get_gcs_object_content
+    upload_gcs_object, list_gcs_object_versions, get_gcs_object_content,
+    list_all_resources, list_gcs_objects, open_gcs_object, access_secret_version, get_request_metrics,
+    configure_disk_cache, get_disk_cached, set_disk_cached
 )
+from config_validator import validate_service_config, validate_origin_config, validate_failover_chain, format_errors
+from route_matcher import simulate
+from log_analyzer import LogAnalyzer, open_log_stream
+from token_signer import sign_urls, decode_key, TokenSigner
+from prewarm import Prewarmer
+from cache_invalidator import plan_invalidations, RateLimiter, InvalidationCoalescer
+from project_registry import ProjectRegistry, ALL_PROJECTS
+from http_response import BufferedResponseMixin
+from inventory_index import InventoryIndex
+from origin_probe import probe_origins, MAX_SAMPLES, MAX_TIMEOUT, MAX_ORIGINS
+from config_model import ServiceConfig
+from drift_detector import DriftDetector, DEFAULT_INTERVAL as DRIFT_DEFAULT_INTERVAL, CONTENT_HASH_KEY, drift_hash
+from fleet import load_definitions, parse_definitions, fetch_live, compute_plan, apply_plan, describe_plan
+from edge_metrics import EdgePerformance, MONITORING_API, DEFAULT_POINTS, parse_window
+from snapshot import SNAPSHOT_PREFIX, snapshot_name, export_snapshot, restore_snapshot, list_snapshots
+from logging_setup import configure_logging, get_logger, set_request_id, set_job_id, should_sample, dropped_records, shutdown_logging
 
 # In-memory job storage
 jobs = {}
 
-def get_system_bucket(project_number):
-    """Resolves the system bucket name, favoring custom settings if available."""
+# Inventory of existing origins/keysets/certificates used for pre-flight validation
+INVENTORY_TTL = 60
+_INVENTORY_CACHE = {}
+_INVENTORY_LOCK = threading.Lock()
+
+# Version descriptions are stored as object metadata (GCS allows 8 KiB of custom metadata)
+MAX_METADATA_DESCRIPTION = 1024
+
+# Largest batch /api/sign handles; bigger batches belong to the token_signer.py CLI
+MAX_SIGN_PATHS = int(os.environ.get('MAX_SIGN_PATHS', '20000'))
+
+# Invalidation quota: calls per minute across all services
+INVALIDATION_RATE_PER_MINUTE = int(os.environ.get('INVALIDATION_RATE_PER_MINUTE', '10'))
+_INVALIDATION_LIMITER = RateLimiter(INVALIDATION_RATE_PER_MINUTE)
+
+log = get_logger("server")
+
+# List endpoints that accept ?project=* to aggregate across every registered project
+FLEET_LISTINGS = {
+    '/api/services': ("https://networkservices.googleapis.com/v1alpha1/projects/{project_id}/locations/global/edgeCacheServices", "edgeCacheServices"),
+    '/api/origins': ("https://networkservices.googleapis.com/v1alpha1/projects/{project_id}/locations/global/edgeCacheOrigins", "edgeCacheOrigins"),
+    '/api/keysets': ("https://networkservices.googleapis.com/v1alpha1/projects/{project_id}/locations/global/edgeCacheKeysets", "edgeCacheKeysets"),
+    '/api/certificates': ("https://certificatemanager.googleapis.com/v1/projects/{project_id}/locations/global/certificates", "certificates"),
+    '/api/secrets': ("https://secretmanager.googleapis.com/v1/projects/{project_id}/secrets", "secrets"),
+}
+
+# Searchable index of services/origins/keysets/certificates; refreshed when older than INDEX_TTL seconds
+INDEX_TTL = int(os.environ.get('INDEX_TTL', '60'))
+inventory_index = InventoryIndex(os.environ.get('INVENTORY_DB', ':memory:'))
+INDEX_SOURCES = {
+    "services": ("https://networkservices.googleapis.com/v1alpha1/projects/{project_id}/locations/global/edgeCacheServices", "edgeCacheServices"),
+    "origins": ("https://networkservices.googleapis.com/v1alpha1/projects/{project_id}/locations/global/edgeCacheOrigins", "edgeCacheOrigins"),
+    "keysets": ("https://networkservices.googleapis.com/v1alpha1/projects/{project_id}/locations/global/edgeCacheKeysets", "edgeCacheKeysets"),
+    "certificates": ("https://certificatemanager.googleapis.com/v1/projects/{project_id}/locations/global/certificates", "certificates"),
+}
+
+# Background comparison of live services with their staged configs (0 disables the schedule)
+DRIFT_INTERVAL = int(os.environ.get('DRIFT_INTERVAL', str(DRIFT_DEFAULT_INTERVAL)))
+drift_detector = DriftDetector(
+    concurrency=int(os.environ.get('DRIFT_CONCURRENCY', '4')),
+    rate_per_minute=int(os.environ.get('DRIFT_RATE_PER_MINUTE', '60'))
+)
+
+# Cloud Monitoring endpoint for /api/service/{id}/performance (overridable for a local stand-in)
+edge_performance = EdgePerformance(api_base=os.environ.get('MONITORING_API_BASE', MONITORING_API))
+
+registry = ProjectRegistry(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'credentials'))
+
+def load_key_data(project_id=None):
+    """Returns the service account key for project_id (default: credentials/key.json)."""
+    return registry.get(project_id).key_data
+
+def get_inventory(project_id, token, refresh=False):
+    """Returns short IDs of existing origins, keysets and certificates, cached for INVENTORY_TTL seconds."""
+    with _INVENTORY_LOCK:
+        cached = _INVENTORY_CACHE.get(project_id)
+        if cached and not refresh and time.time() - cached["fetched_at"] < INVENTORY_TTL:
+            return cached["inventory"]
+
+    base = f"https://networkservices.googleapis.com/v1alpha1/projects/{project_id}/locations/global"
+    sources = {
+        "origins": (f"{base}/edgeCacheOrigins", "edgeCacheOrigins"),
+        "keysets": (f"{base}/edgeCacheKeysets", "edgeCacheKeysets"),
+        "certificates": (f"https://certificatemanager.googleapis.com/v1/projects/{project_id}/locations/global/certificates", "certificates"),
+    }
+    def fetch(source):
+        url, items_key = source
+        items = list_all_resources(url, items_key, token)
+        return {item["name"].rsplit("/", 1)[-1] for item in items if item.get("name")}
+
+    # The three listings are independent; run them on the project's upstream pool
+    try:
+        run = registry.get(project_id).map
+    except Exception:
+        # Key supplied by the client rather than the registry
+        run = lambda fn, items: [fn(item) for item in items]
+    inventory = dict(zip(sources, run(fetch, sources.values())))
+
+    with _INVENTORY_LOCK:
+        _INVENTORY_CACHE[project_id] = {"inventory": inventory, "fetched_at": time.time()}
+    return inventory
+
+def refresh_inventory_index(ctx, kinds=None, force=False):
+    """Re-lists stale kinds for a project and applies the diff to the search index."""
+    now = time.time()
+    stale = [kind for kind in (kinds or INDEX_SOURCES)
+             if force or now - inventory_index.refreshed_at(ctx.project_id, kind) >= INDEX_TTL]
+    if not stale:
+        return {}
+    token = ctx.token()
+
+    def fetch(kind):
+        url_template, items_key = INDEX_SOURCES[kind]
+        return list_all_resources(url_template.format(project_id=ctx.project_id), items_key, token)
+
+    return {kind: inventory_index.refresh(ctx.project_id, kind, items) for kind, items in zip(stale, ctx.map(fetch, stale))}
+
+def resolve_signing_key(payload, project_id=None, token=None):
+    """Returns (key_bytes, algorithm) from an explicit key or an HMAC keyset's Secret Manager secret."""
+    algorithm = payload.get('algorithm', 'HMAC_SHA_256')
+    if payload.get('key'):
+        return decode_key(payload['key']), algorithm
+    keyset = payload.get('keyset')
+    if not keyset:
+        raise Exception("Either key or keyset is required")
+    if algorithm != 'HMAC_SHA_256':
+        raise Exception("Ed25519 private keys are not stored in GCP; pass the key explicitly")
+    url = f"https://networkservices.googleapis.com/v1alpha1/projects/{project_id}/locations/global/edgeCacheKeysets/{keyset.split('/')[-1]}"
+    keyset_body = make_gcp_request(url, token=token)
+    shared_keys = keyset_body.get("validationSharedKeys", [])
+    if not shared_keys:
+        raise Exception(f"Keyset {keyset} has no HMAC validation keys")
+    return access_secret_version(shared_keys[0]["secretVersion"], token), algorithm
+
+def preflight_validate(job_id, service_body, project_id, token):
+    """Validates a service body locally and raises before any mutation is submitted."""
+    try:
+        inventory = get_inventory(project_id, token)
+    except Exception as e:
+        jobs[job_id]["logs"].append(f"Inventory unavailable, validating structure only: {e}")
+        inventory = None
+    errors = validate_service_config(service_body, inventory)
+    if errors:
+        for line in format_errors(errors):
+            jobs[job_id]["logs"].append(f"Validation: {line}")
+        raise Exception(f"Pre-flight validation failed with {len(errors)} error(s)")
+    jobs[job_id]["logs"].append("Pre-flight validation passed.")
+
+# Media CDN uses the mediaedgefill service account to fetch content from origins (like GCS).
+# Best practice: objectViewer is for objects, legacyBucketReader is often needed for bucket traversal
+FILL_GRANT_ROLES = ["roles/storage.objectViewer", "roles/storage.legacyBucketReader"]
+# Include broader roles that also grant the necessary permissions
+FILL_CHECK_ROLES = FILL_GRANT_ROLES + ["roles/storage.admin", "roles/viewer", "roles/editor", "roles/owner"]
+
+def fill_service_accounts(project_id, token):
+    project_number = get_project_number(project_id, token)
+    return [f"service-{project_number}@gcp-sa-mediaedgefill.iam.gserviceaccount.com"]
+
+def ensure_fill_service_accounts(project_id, token):
+    """Makes sure the Media CDN service identities exist before they are granted anything."""
+    for svc in ["mediaedgefill.googleapis.com", "mediaedge.googleapis.com"]:
+        try:
+            url_identity = f"https://serviceusage.googleapis.com/v1/projects/{project_id}/services/{svc}:generateServiceIdentity"
+            make_gcp_request(url_identity, method="POST", token=token)
+        except:
+            pass # Ignore if already exists or fails
+    return fill_service_accounts(project_id, token)
+
+def list_config_versions(ctx, service_id, token):
+    """Returns the saved config generations of a service (newest first).
+
+    Descriptions come from object metadata in the versions listing; only
+    generations stored before staging wrote metadata are downloaded.
+    """
+    project_number = get_project_number(ctx.project_id, token)
+    bucket_name = get_system_bucket(project_number, ctx.project_id)
+    object_name = f"{service_id}.json"
+
+    def describe(v):
+        description = (v.get("metadata") or {}).get("description")
+        try:
+            if description is None:
+                content = get_gcs_object_content(bucket_name, object_name, v["generation"], token)
+                description = json.loads(content).get("description")
+            return {
+                "generation": v["generation"],
+                "updated": v["updated"],
+                "description": description or "No description provided"
+            }
+        except Exception as e:
+            log.warning("Could not read version %s of %s: %s", v.get("generation"), service_id, e)
+            return None
+
+    try:
+        raw_versions = list_gcs_object_versions(bucket_name, object_name, token)
+    except Exception as e:
+        log.warning("Error listing versions of %s: %s", service_id, e)
+        return []
+    versions = [v for v in ctx.map(describe, raw_versions) if v]
+    versions.sort(key=lambda x: int(x["generation"]), reverse=True)
+    return versions
+
+def get_service_overview(ctx, service_id):
+    """Fetches everything the service detail view needs in one concurrent pass."""
+    token = ctx.token()
+    base = f"https://networkservices.googleapis.com/v1alpha1/projects/{ctx.project_id}/locations/global"
+
+    def get_optional(url):
+        try:
+            return make_gcp_request(url, token=token)
+        except Exception as e:
+            if "404" in str(e):
+                return None
+            raise
+
+    calls = {
+        "service": lambda: make_gcp_request(f"{base}/edgeCacheServices/{service_id}", token=token),
+        "staging": lambda: get_optional(f"{base}/edgeCacheServices/{service_id}-staging"),
+        "versions": lambda: list_config_versions(ctx, service_id, token),
+        "origins": lambda: list_all_resources(f"{base}/edgeCacheOrigins", "edgeCacheOrigins", token),
+        "certificates": lambda: list_all_resources(f"https://certificatemanager.googleapis.com/v1/projects/{ctx.project_id}/locations/global/certificates", "certificates", token),
+    }
+    # Top-level calls get their own threads; the project pool is left for the version reads they spawn
+    with ThreadPoolExecutor(max_workers=len(calls)) as pool:
+        futures = {name: pool.submit(fn) for name, fn in calls.items()}
+        overview, errors = {}, {}
+        for name, future in futures.items():
+            try:
+                overview[name] = future.result()
+            except Exception as e:
+                overview[name] = None
+                errors[name] = str(e)
+    if overview["service"] is None:
+        raise Exception(errors.get("service", f"Service {service_id} not found"))
+
+    # Resolve references (including failover chains) against the listings fetched above
+    origins_by_id = {o["name"].rsplit("/", 1)[-1]: o for o in overview.pop("origins") or []}
+    certs_by_id = {c["name"].rsplit("/", 1)[-1]: c for c in overview.pop("certificates") or []}
+    referenced = {}
+    for svc in (overview["service"], overview["staging"] or {}):
+        for pm in svc.get("routing", {}).get("pathMatchers", []):
+            for rule in pm.get("routeRules", []):
+                origin_id = (rule.get("origin") or "").rsplit("/", 1)[-1]
+                while origin_id and origin_id not in referenced:
+                    origin = origins_by_id.get(origin_id)
+                    referenced[origin_id] = origin
+                    origin_id = ((origin or {}).get("failoverOrigin") or "").rsplit("/", 1)[-1]
+    overview["origins"] = referenced
+    overview["certificates"] = {
+        cert.rsplit("/", 1)[-1]: certs_by_id.get(cert.rsplit("/", 1)[-1])
+        for cert in overview["service"].get("edgeSslCertificates", [])
+    }
+    overview["errors"] = errors
+    return overview
+
+def scan_drift(ctx):
+    token = ctx.token()
+    return drift_detector.scan(ctx.project_id, token, get_system_bucket(get_project_number(ctx.project_id, token), ctx.project_id))
+
+def scan_drift_all():
+    _, errors = registry.fan_out(scan_drift)
+    for project_id, error in errors.items():
+        log.warning("Drift scan skipped for %s: %s", project_id, error)
+
+def get_system_bucket(project_number, project_id):
+    """Resolves a project's system bucket name, favoring custom settings if available.
+
+    settings.json may map project IDs or numbers to buckets under 'buckets'; the
+    legacy single 'bucket_name' written by install.sh applies to the default
+    project only, so other registered projects never share its bucket.
+    """
     try:
         backend_dir = os.path.dirname(os.path.abspath(__file__))
         root_dir = os.path.dirname(backend_dir)
@@ -33,15 +301,63 @@ def get_system_bucket(project_number):
         if os.path.exists(settings_path):
             with open(settings_path, 'r') as f:
                 settings = json.load(f)
-                if settings.get('bucket_name'):
-                    return settings['bucket_name']
+            buckets = settings.get('buckets') or {}
+            custom = buckets.get(project_id) or buckets.get(str(project_number))
+            if not custom and settings.get('bucket_name') and registry.get().project_id == project_id:
+                custom = settings['bucket_name']
+            if custom:
+                set_disk_cached("system_buckets", str(project_number), custom)
+                return custom
     except Exception as e:
-        print(f"Error reading settings.json: {e}")
+        log.warning("Error reading settings.json: %s", e)
+        cached = get_disk_cached("system_buckets", str(project_number))
+        if cached:
+            return cached
     
     # Default fallback
-    return f"{project_number}-mediacdn-do-not-delete"
+    bucket_name = f"{project_number}-mediacdn-do-not-delete"
+    set_disk_cached("system_buckets", str(project_number), bucket_name)
+    return bucket_name
+
+class RequestHandler(BufferedResponseMixin, http.server.SimpleHTTPRequestHandler):
+    def parse_request(self):
+        ok = super().parse_request()
+        if ok:
+            self.request_id = self.headers.get('X-Request-Id') or secrets.token_hex(8)
+            set_request_id(self.request_id)
+        return ok
+
+    def end_headers(self):
+        if getattr(self, 'request_id', None):
+            self.send_header('X-Request-Id', self.request_id)
+        super().end_headers()
+
+    def log_message(self, format, *args):
+        # Access log goes through the logging queue instead of writing stderr on the request thread
+        message = format % args
+        if '/api/status/' in message and not should_sample('status-poll', 20):
+            return
+        log.info("%s %s", self.address_string(), message)
+
+    def log_error(self, format, *args):
+        log.warning("%s %s", self.address_string(), format % args)
+
+    def project_selector(self, payload=None):
+        """Project ID from ?project=, the X-Project-Id header or the JSON body; None means the default."""
+        query = parse_qs(urlparse(self.path).query)
+        project = query.get('project', [None])[0] or self.headers.get('X-Project-Id')
+        if not project and isinstance(payload, dict):
+            project = payload.get('project')
+        return project or None
+
+    def apply_project_selector(self, payload):
+        """Fills key_data/project_id for job payloads that name a registered project instead of sending a key."""
+        project = self.project_selector(payload)
+        if project or 'key_data' not in payload:
+            key_data = load_key_data(project)
+            payload['key_data'] = key_data
+            payload['project_id'] = key_data['project_id']
 
-class RequestHandler(http.server.SimpleHTTPRequestHandler):
     def do_POST(self):
         # Normalize path: remove query params and trailing slash
         path = self.path.split('?')[0].rstrip('/')
@@ -52,6 +368,7 @@ class RequestHandler(http.server.SimpleHTTPRequestHandler):
             content_length = int(self.headers['Content-Length'])
             post_data = self.rfile.read(content_length)
             payload = json.loads(post_data.decode('utf-8'))
+            self.apply_project_selector(payload)
             
             job_id = f"job_{int(time.time())}"
             jobs[job_id] = {
@@ -61,8 +378,7 @@ class RequestHandler(http.server.SimpleHTTPRequestHandler):
             }
             
             # Start deployment in a background thread
-            thread = threading.Thread(target=run_deployment_task, args=(job_id, payload))
-            thread.start()
+            start_job_thread(run_deployment_task, job_id, payload)
             
             self.send_response(200)
             self.send_header('Content-Type', 'application/json')
@@ -72,6 +388,7 @@ class RequestHandler(http.server.SimpleHTTPRequestHandler):
             content_length = int(self.headers['Content-Length'])
             post_data = self.rfile.read(content_length)
             payload = json.loads(post_data.decode('utf-8'))
+            self.apply_project_selector(payload)
             
             job_id = f"origin_{int(time.time())}"
             jobs[job_id] = {
@@ -80,47 +397,102 @@ class RequestHandler(http.server.SimpleHTTPRequestHandler):
                 "logs": ["Origin creation initiated..."]
             }
             
-            thread = threading.Thread(target=run_origin_task, args=(job_id, payload))
-            thread.start()
+            start_job_thread(run_origin_task, job_id, payload)
             
             self.send_response(200)
             self.send_header('Content-Type', 'application/json')
             self.end_headers()
             self.wfile.write(json.dumps({"job_id": job_id}).encode())
+        elif path in ['/api/fleet/plan', '/api/fleet/apply']:
+            try:
+                content_length = int(self.headers['Content-Length'])
+                post_data = self.rfile.read(content_length)
+                payload = json.loads(post_data.decode('utf-8'))
+                self.apply_project_selector(payload)
+
+                action = path.split('/')[-1]
+                job_id = f"fleet_{action}_{int(time.time() * 1000)}"
+                jobs[job_id] = {
+                    "status": "Starting",
+                    "progress": 0,
+                    "logs": [f"Fleet {action} initiated..."]
+                }
+                start_job_thread(run_fleet_plan_task if action == 'plan' else run_fleet_apply_task, job_id, payload)
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps({"job_id": job_id}).encode())
+            except Exception as e:
+                self.send_response(500)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps({"error": str(e)}).encode())
+        elif path in ['/api/snapshots', '/api/snapshots/restore']:
+            try:
+                content_length = int(self.headers.get('Content-Length') or 0)
+                payload = json.loads(self.rfile.read(content_length).decode('utf-8') or '{}')
+                self.apply_project_selector(payload)
+
+                action = 'restore' if path.endswith('/restore') else 'export'
+                job_id = f"snapshot_{action}_{int(time.time() * 1000)}"
+                jobs[job_id] = {
+                    "status": "Starting",
+                    "progress": 0,
+                    "logs": [f"Snapshot {action} initiated for {payload['project_id']}..."]
+                }
+                start_job_thread(run_snapshot_restore_task if action == 'restore' else run_snapshot_export_task, job_id, payload)
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps({"job_id": job_id}).encode())
+            except Exception as e:
+                self.send_response(500)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps({"error": str(e)}).encode())
+        elif path == '/api/origins/probe':
+            try:
+                content_length = int(self.headers['Content-Length'])
+                post_data = self.rfile.read(content_length)
+                payload = json.loads(post_data.decode('utf-8'))
+                origins = payload.get('origins') or [payload]
+                if len(origins) > MAX_ORIGINS:
+                    raise Exception(f"At most {MAX_ORIGINS} origins can be probed per request")
+                samples = max(1, min(int(payload.get('samples', 5)), MAX_SAMPLES))
+                timeout = max(0.1, min(float(payload.get('timeout', 5)), MAX_TIMEOUT))
+
+                report = probe_origins(
+                    origins,
+                    samples=samples,
+                    timeout=timeout,
+                    verify_tls=not payload.get('insecure', False)
+                )
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps(report).encode())
+            except Exception as e:
+                self.send_response(500)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps({"error": str(e)}).encode())
         elif path == '/api/iam/grant-bucket':
             try:
                 content_length = int(self.headers['Content-Length'])
                 post_data = self.rfile.read(content_length)
                 payload = json.loads(post_data.decode('utf-8'))
                 bucket_name = payload.get('bucket')
-                print(f"GRANT IAM REQUEST: bucket={bucket_name}")
+                log.info("Granting bucket IAM on %s", bucket_name)
                 
-                backend_dir = os.path.dirname(os.path.abspath(__file__))
-                root_dir = os.path.dirname(backend_dir)
-                creds_path = os.path.join(root_dir, 'credentials', 'key.json')
-                with open(creds_path, 'r') as f:
-                    key_data = json.load(f)
+                key_data = load_key_data(self.project_selector(payload))
                 
                 project_id = key_data['project_id']
                 token = get_access_token(key_data)
                 
-                # 1. Ensure service identities exist
-                for svc in ["mediaedgefill.googleapis.com", "mediaedge.googleapis.com"]:
-                    try:
-                        url_identity = f"https://serviceusage.googleapis.com/v1/projects/{project_id}/services/{svc}:generateServiceIdentity"
-                        make_gcp_request(url_identity, method="POST", token=token)
-                    except:
-                        pass # Ignore if already exists or fails
-
-                project_number = get_project_number(project_id, token)
-                # Media CDN uses this service account to fetch content from origins (like GCS)
-                service_accounts = [
-                    f"service-{project_number}@gcp-sa-mediaedgefill.iam.gserviceaccount.com"
-                ]
-                # Best practice: objectViewer is for objects, legacyBucketReader is often needed for bucket traversal
-                roles = ["roles/storage.objectViewer", "roles/storage.legacyBucketReader"]
-                
-                grant_bucket_iam(bucket_name, service_accounts, roles, token)
+                service_accounts = ensure_fill_service_accounts(project_id, token)
+                grant_bucket_iam(bucket_name, service_accounts, FILL_GRANT_ROLES, token)
                 
                 self.send_response(200)
                 self.send_header('Content-Type', 'application/json')
@@ -131,11 +503,49 @@ class RequestHandler(http.server.SimpleHTTPRequestHandler):
                 self.send_header('Content-Type', 'application/json')
                 self.end_headers()
                 self.wfile.write(json.dumps({"error": str(e)}).encode())
+        elif path in ['/api/iam/check-buckets', '/api/iam/grant-buckets']:
+            try:
+                content_length = int(self.headers['Content-Length'])
+                post_data = self.rfile.read(content_length)
+                payload = json.loads(post_data.decode('utf-8'))
+                buckets = sorted(set(payload.get('buckets', [])))
+                if not buckets:
+                    raise Exception("At least one bucket is required")
+
+                ctx = registry.get(self.project_selector(payload))
+                token = ctx.token()
+                grant = path.endswith('grant-buckets')
+                if grant:
+                    service_accounts = ensure_fill_service_accounts(ctx.project_id, token)
+                else:
+                    service_accounts = fill_service_accounts(ctx.project_id, token)
+
+                def process(bucket_name):
+                    try:
+                        if grant:
+                            grant_bucket_iam(bucket_name, service_accounts, FILL_GRANT_ROLES, token)
+                            return {"bucket": bucket_name, "status": "Success"}
+                        has_access = check_bucket_iam(bucket_name, service_accounts, FILL_CHECK_ROLES, token, refresh=payload.get('refresh', False))
+                        return {"bucket": bucket_name, "has_access": has_access}
+                    except Exception as e:
+                        return {"bucket": bucket_name, "error": str(e)}
+
+                results = ctx.map(process, buckets)
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps({"results": results, "service_accounts": service_accounts}).encode())
+            except Exception as e:
+                self.send_response(500)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps({"error": str(e)}).encode())
         elif path == '/api/staging/create':
             try:
                 content_length = int(self.headers['Content-Length'])
                 post_data = self.rfile.read(content_length)
                 payload = json.loads(post_data.decode('utf-8'))
+                payload['project'] = self.project_selector(payload)
                 
                 job_id = f"staging_{int(time.time())}"
                 jobs[job_id] = {
@@ -144,8 +554,7 @@ class RequestHandler(http.server.SimpleHTTPRequestHandler):
                     "logs": ["Staging creation initiated..."]
                 }
                 
-                thread = threading.Thread(target=run_staging_task, args=(job_id, payload))
-                thread.start()
+                start_job_thread(run_staging_task, job_id, payload)
                 
                 self.send_response(200)
                 self.send_header('Content-Type', 'application/json')
@@ -156,11 +565,175 @@ class RequestHandler(http.server.SimpleHTTPRequestHandler):
                 self.send_header('Content-Type', 'application/json')
                 self.end_headers()
                 self.wfile.write(json.dumps({"error": str(e)}).encode())
+        elif path == '/api/validate':
+            try:
+                content_length = int(self.headers['Content-Length'])
+                post_data = self.rfile.read(content_length)
+                payload = json.loads(post_data.decode('utf-8'))
+                service_body = payload.get('service', payload)
+
+                inventory = None
+                if payload.get('check_inventory', True):
+                    key_data = load_key_data(self.project_selector(payload))
+                    token = get_access_token(key_data)
+                    inventory = get_inventory(key_data['project_id'], token, refresh=payload.get('refresh', False))
+
+                errors = validate_service_config(service_body, inventory)
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps({"valid": not errors, "errors": errors}).encode())
+            except Exception as e:
+                self.send_response(500)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps({"error": str(e)}).encode())
+        elif path == '/api/simulate':
+            try:
+                content_length = int(self.headers['Content-Length'])
+                post_data = self.rfile.read(content_length)
+                payload = json.loads(post_data.decode('utf-8'))
+
+                # Either an explicit service body or a deploy payload to build the template from
+                service_body = payload.get('service')
+                if service_body is None:
+                    deploy_payload = dict(payload)
+                    deploy_payload.setdefault('project_id', 'simulation')
+                    deploy_payload.setdefault('origin_name', 'simulation-origin')
+                    deploy_payload.setdefault('domain', '*')
+                    service_body = build_service_body(deploy_payload)
+
+                report = simulate(service_body, payload.get('paths', []), host=payload.get('host'), headers=payload.get('headers'))
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps(report).encode())
+            except Exception as e:
+                self.send_response(500)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps({"error": str(e)}).encode())
+        elif path == '/api/analytics':
+            try:
+                content_length = int(self.headers['Content-Length'])
+                post_data = self.rfile.read(content_length)
+                payload = json.loads(post_data.decode('utf-8'))
+                payload['project'] = self.project_selector(payload)
+                if not payload.get('bucket'):
+                    raise Exception("Log bucket is required")
+
+                job_id = f"analytics_{int(time.time())}"
+                jobs[job_id] = {
+                    "status": "Starting",
+                    "progress": 0,
+                    "logs": ["Log analysis initiated..."]
+                }
+
+                start_job_thread(run_analytics_task, job_id, payload)
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps({"job_id": job_id}).encode())
+            except Exception as e:
+                self.send_response(500)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps({"error": str(e)}).encode())
+        elif path == '/api/sign':
+            try:
+                content_length = int(self.headers['Content-Length'])
+                post_data = self.rfile.read(content_length)
+                payload = json.loads(post_data.decode('utf-8'))
+                if not payload.get('base_url') or not payload.get('paths'):
+                    raise Exception("base_url and paths are required")
+                if len(payload['paths']) > MAX_SIGN_PATHS:
+                    raise Exception(f"At most {MAX_SIGN_PATHS} paths per request; use token_signer.py for larger batches")
+
+                project_id = token = None
+                if not payload.get('key'):
+                    key_data = load_key_data(self.project_selector(payload))
+                    project_id = key_data['project_id']
+                    token = get_access_token(key_data)
+                key, algorithm = resolve_signing_key(payload, project_id, token)
+
+                start = time.time()
+                urls = sign_urls(
+                    key, algorithm, payload['base_url'], payload['paths'],
+                    expires_in=payload.get('expires_in', 3600),
+                    expires=payload.get('expires'),
+                    # Signed in this request thread: forking worker processes from the threaded server is unsafe
+                    workers=1,
+                    url_prefix=payload.get('url_prefix'),
+                    path_globs=payload.get('path_globs'),
+                    param=payload.get('param', 'hdnts')
+                )
+                elapsed = time.time() - start
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps({
+                    "urls": urls,
+                    "elapsed_seconds": round(elapsed, 3),
+                    "tokens_per_second": int(len(urls) / elapsed) if elapsed > 0 else len(urls)
+                }).encode())
+            except Exception as e:
+                self.send_response(500)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps({"error": str(e)}).encode())
+        elif path == '/api/prewarm':
+            try:
+                content_length = int(self.headers['Content-Length'])
+                post_data = self.rfile.read(content_length)
+                payload = json.loads(post_data.decode('utf-8'))
+                if not payload.get('base_url') or not payload.get('paths'):
+                    raise Exception("base_url and paths are required")
+
+                payload['project'] = self.project_selector(payload)
+                job_id = start_prewarm_job(payload)
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps({"job_id": job_id}).encode())
+            except Exception as e:
+                self.send_response(500)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps({"error": str(e)}).encode())
+        elif path.startswith('/api/service/') and path.endswith('/invalidate'):
+            try:
+                service_id = path.split('/')[-2]
+                content_length = int(self.headers['Content-Length'])
+                post_data = self.rfile.read(content_length)
+                payload = json.loads(post_data.decode('utf-8'))
+                paths = payload.get('paths', [])
+                hosts = payload.get('hosts', [])
+                tags = payload.get('tags', [])
+                if not (paths or hosts or tags):
+                    raise Exception("At least one of paths, hosts or tags is required")
+
+                project_id = load_key_data(self.project_selector(payload))['project_id']
+                job_id, coalesced = invalidation_coalescer.submit(
+                    (project_id, service_id), paths, hosts, tags, new_batch_id=lambda: new_invalidation_job(service_id)
+                )
+                jobs[job_id]["logs"].append(f"Queued {len(paths)} path(s), {len(hosts)} host(s), {len(tags)} tag(s).")
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps({"job_id": job_id, "coalesced": coalesced}).encode())
+            except Exception as e:
+                self.send_response(500)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps({"error": str(e)}).encode())
         elif path == '/api/staging/promote':
             try:
                 content_length = int(self.headers['Content-Length'])
                 post_data = self.rfile.read(content_length)
                 payload = json.loads(post_data.decode('utf-8'))
+                payload['project'] = self.project_selector(payload)
                 
                 job_id = f"promote_{int(time.time())}"
                 jobs[job_id] = {
@@ -169,8 +742,7 @@ class RequestHandler(http.server.SimpleHTTPRequestHandler):
                     "logs": ["Promotion to production initiated..."]
                 }
                 
-                thread = threading.Thread(target=run_promotion_task, args=(job_id, payload))
-                thread.start()
+                start_job_thread(run_promotion_task, job_id, payload)
                 
                 self.send_response(200)
                 self.send_header('Content-Type', 'application/json')
@@ -182,7 +754,7 @@ class RequestHandler(http.server.SimpleHTTPRequestHandler):
                 self.end_headers()
                 self.wfile.write(json.dumps({"error": str(e)}).encode())
         else:
-            print(f"Unknown POST path: {path}")
+            log.warning("Unknown POST path: %s", path)
             self.send_error(404)
 
     def do_DELETE(self):
@@ -190,11 +762,7 @@ class RequestHandler(http.server.SimpleHTTPRequestHandler):
             # Normalize path
             path = self.path.split('?')[0].rstrip('/')
             
-            backend_dir = os.path.dirname(os.path.abspath(__file__))
-            root_dir = os.path.dirname(backend_dir)
-            creds_path = os.path.join(root_dir, 'credentials', 'key.json')
-            with open(creds_path, 'r') as f:
-                key_data = json.load(f)
+            key_data = load_key_data(self.project_selector())
             project_id = key_data['project_id']
             token = get_access_token(key_data)
 
@@ -219,8 +787,7 @@ class RequestHandler(http.server.SimpleHTTPRequestHandler):
             else:
                 self.send_error(404)
         except Exception as e:
-            traceback.print_exc()
-            print(f"Delete Error: {str(e)}")
+            log.exception("DELETE %s failed", path)
             self.send_response(500)
             self.send_header('Content-Type', 'application/json')
             self.end_headers()
@@ -235,11 +802,7 @@ class RequestHandler(http.server.SimpleHTTPRequestHandler):
 
         if path == '/api/config':
             try:
-                backend_dir = os.path.dirname(os.path.abspath(__file__))
-                root_dir = os.path.dirname(backend_dir)
-                creds_path = os.path.join(root_dir, 'credentials', 'key.json')
-                with open(creds_path, 'r') as f:
-                    config_data = json.load(f)
+                config_data = load_key_data(self.project_selector())
                 
                 self.send_response(200)
                 self.send_header('Content-Type', 'application/json')
@@ -250,13 +813,126 @@ class RequestHandler(http.server.SimpleHTTPRequestHandler):
                 self.send_header('Content-Type', 'application/json')
                 self.end_headers()
                 self.wfile.write(json.dumps({"error": str(e)}).encode())
+        elif path == '/api/search':
+            try:
+                query = parse_qs(urlparse(self.path).query)
+                arg = lambda name, default=None: query.get(name, [default])[0]
+                kind = arg('kind', 'services')
+                selector = self.project_selector()
+                if selector in ALL_PROJECTS:
+                    contexts = registry.projects()
+                else:
+                    contexts = [registry.get(selector)]
+
+                force = arg('refresh') == '1'
+                kinds = [kind] if kind in INDEX_SOURCES else None
+                if len(contexts) == 1:
+                    refresh_errors = {}
+                    refresh_inventory_index(contexts[0], kinds, force)
+                else:
+                    _, refresh_errors = registry.fan_out(lambda ctx: refresh_inventory_index(ctx, kinds, force))
+
+                start = time.time()
+                result = inventory_index.search(
+                    kind=kind,
+                    projects=[ctx.project_id for ctx in contexts],
+                    q=arg('q'), host=arg('host'), origin=arg('origin'), certificate=arg('certificate'),
+                    keyset=arg('keyset'), address=arg('address'),
+                    sort=arg('sort', 'id'), order=arg('order', 'asc'),
+                    page_size=arg('page_size'), page_token=arg('page_token'),
+                    full=arg('full') == '1'
+                )
+                result["elapsed_ms"] = round((time.time() - start) * 1000, 2)
+                result["errors"] = refresh_errors
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps(result).encode())
+            except Exception as e:
+                log.exception("GET %s failed", path)
+                self.send_response(500)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps({"error": str(e)}).encode())
+        elif path == '/api/metrics':
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.end_headers()
+            self.wfile.write(json.dumps({"gcp_requests": get_request_metrics(), "log_records_dropped": dropped_records()}).encode())
+        elif path == '/api/drift':
+            try:
+                query = parse_qs(urlparse(self.path).query)
+                selector = self.project_selector()
+                contexts = registry.projects() if selector in ALL_PROJECTS else [registry.get(selector)]
+                reports, errors = {}, {}
+                for ctx in contexts:
+                    report = drift_detector.report(ctx.project_id)
+                    if report is None or query.get('refresh', ['0'])[0] == '1':
+                        try:
+                            report = scan_drift(ctx)
+                        except Exception as e:
+                            errors[ctx.project_id] = str(e)
+                            continue
+                    service_id = query.get('service', [None])[0]
+                    if service_id:
+                        report = dict(report, services={k: v for k, v in report["services"].items() if k == service_id})
+                    reports[ctx.project_id] = report
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps({"reports": reports, "errors": errors, "interval_seconds": DRIFT_INTERVAL}).encode())
+            except Exception as e:
+                log.exception("GET %s failed", path)
+                self.send_response(500)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps({"error": str(e)}).encode())
+        elif path == '/api/snapshots':
+            try:
+                ctx = registry.get(self.project_selector())
+                token = ctx.token()
+                bucket_name = get_system_bucket(get_project_number(ctx.project_id, token), ctx.project_id)
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps({"project": ctx.project_id, "bucket": bucket_name,
+                                             "snapshots": list_snapshots(bucket_name, token)}).encode())
+            except Exception as e:
+                log.exception("GET %s failed", path)
+                self.send_response(500)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps({"error": str(e)}).encode())
+        elif path == '/api/projects':
+            default_project = registry.get().project_id if registry.projects() else None
+            projects = [{
+                "project_id": ctx.project_id,
+                "client_email": ctx.key_data.get("client_email"),
+                "default": ctx.project_id == default_project
+            } for ctx in registry.projects()]
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.end_headers()
+            self.wfile.write(json.dumps({"projects": projects}).encode())
+        elif path in FLEET_LISTINGS and self.project_selector() in ALL_PROJECTS:
+            # Cross-project listing: every registered project is queried concurrently
+            url_template, items_key = FLEET_LISTINGS[path]
+
+            def list_project(ctx):
+                items = list_all_resources(url_template.format(project_id=ctx.project_id), items_key, ctx.token())
+                for item in items:
+                    item["project"] = ctx.project_id
+                return items
+
+            results, errors = registry.fan_out(list_project)
+            items = [item for project_id in sorted(results) for item in results[project_id]]
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.end_headers()
+            self.wfile.write(json.dumps({items_key: items, "errors": errors}).encode())
         elif path == '/api/origins':
             try:
-                backend_dir = os.path.dirname(os.path.abspath(__file__))
-                root_dir = os.path.dirname(backend_dir)
-                creds_path = os.path.join(root_dir, 'credentials', 'key.json')
-                with open(creds_path, 'r') as f:
-                    key_data = json.load(f)
+                key_data = load_key_data(self.project_selector())
                 
                 project_id = key_data['project_id']
                 token = get_access_token(key_data)
@@ -268,18 +944,14 @@ class RequestHandler(http.server.SimpleHTTPRequestHandler):
                 self.end_headers()
                 self.wfile.write(json.dumps(resp).encode())
             except Exception as e:
-                traceback.print_exc()
+                log.exception("GET %s failed", path)
                 self.send_response(500)
                 self.send_header('Content-Type', 'application/json')
                 self.end_headers()
                 self.wfile.write(json.dumps({"error": str(e)}).encode())
         elif path == '/api/services':
             try:
-                backend_dir = os.path.dirname(os.path.abspath(__file__))
-                root_dir = os.path.dirname(backend_dir)
-                creds_path = os.path.join(root_dir, 'credentials', 'key.json')
-                with open(creds_path, 'r') as f:
-                    key_data = json.load(f)
+                key_data = load_key_data(self.project_selector())
                 
                 project_id = key_data['project_id']
                 token = get_access_token(key_data)
@@ -291,19 +963,57 @@ class RequestHandler(http.server.SimpleHTTPRequestHandler):
                 self.end_headers()
                 self.wfile.write(json.dumps(resp).encode())
             except Exception as e:
-                traceback.print_exc()
+                log.exception("GET %s failed", path)
                 self.send_response(500)
                 self.send_header('Content-Type', 'application/json')
                 self.end_headers()
                 self.wfile.write(json.dumps({"error": str(e)}).encode())
+        elif path.startswith('/api/service/') and path.endswith('/performance'):
+            try:
+                service_id = path.split('/')[-2]
+                query = parse_qs(urlparse(self.path).query)
+                ctx = registry.get(self.project_selector())
+                end = query.get('end', [None])[0]
+                result = edge_performance.query(
+                    ctx.project_id, ctx.token(), service_id,
+                    window=parse_window(query.get('window', [None])[0]),
+                    points=int(query.get('points', [DEFAULT_POINTS])[0]),
+                    end=int(end) if end else None
+                )
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps(result).encode())
+            except Exception as e:
+                log.exception("GET %s failed", path)
+                status = 500
+                if "404" in str(e):
+                    status = 404
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps({"error": str(e)}).encode())
+        elif path.startswith('/api/service/') and path.endswith('/overview'):
+            try:
+                service_id = path.split('/')[-2]
+                overview = get_service_overview(registry.get(self.project_selector()), service_id)
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps(overview).encode())
+            except Exception as e:
+                log.exception("GET %s failed", path)
+                status = 500
+                if "404" in str(e):
+                    status = 404
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps({"error": str(e)}).encode())
         elif path.startswith('/api/service/'):
             try:
                 service_id = path.split('/')[-1]
-                backend_dir = os.path.dirname(os.path.abspath(__file__))
-                root_dir = os.path.dirname(backend_dir)
-                creds_path = os.path.join(root_dir, 'credentials', 'key.json')
-                with open(creds_path, 'r') as f:
-                    key_data = json.load(f)
+                key_data = load_key_data(self.project_selector())
                 
                 project_id = key_data['project_id']
                 token = get_access_token(key_data)
@@ -315,7 +1025,7 @@ class RequestHandler(http.server.SimpleHTTPRequestHandler):
                 self.end_headers()
                 self.wfile.write(json.dumps(resp).encode())
             except Exception as e:
-                traceback.print_exc()
+                log.exception("GET %s failed", path)
                 status = 500
                 if "404" in str(e):
                     status = 404
@@ -326,11 +1036,7 @@ class RequestHandler(http.server.SimpleHTTPRequestHandler):
         elif path.startswith('/api/origin/'):
             try:
                 origin_id = path.split('/')[-1]
-                backend_dir = os.path.dirname(os.path.abspath(__file__))
-                root_dir = os.path.dirname(backend_dir)
-                creds_path = os.path.join(root_dir, 'credentials', 'key.json')
-                with open(creds_path, 'r') as f:
-                    key_data = json.load(f)
+                key_data = load_key_data(self.project_selector())
                 
                 project_id = key_data['project_id']
                 token = get_access_token(key_data)
@@ -342,18 +1048,14 @@ class RequestHandler(http.server.SimpleHTTPRequestHandler):
                 self.end_headers()
                 self.wfile.write(json.dumps(resp).encode())
             except Exception as e:
-                traceback.print_exc()
+                log.exception("GET %s failed", path)
                 self.send_response(500)
                 self.send_header('Content-Type', 'application/json')
                 self.end_headers()
                 self.wfile.write(json.dumps({"error": str(e)}).encode())
         elif path == '/api/buckets':
             try:
-                backend_dir = os.path.dirname(os.path.abspath(__file__))
-                root_dir = os.path.dirname(backend_dir)
-                creds_path = os.path.join(root_dir, 'credentials', 'key.json')
-                with open(creds_path, 'r') as f:
-                    key_data = json.load(f)
+                key_data = load_key_data(self.project_selector())
                 
                 project_id = key_data['project_id']
                 token = get_access_token(key_data)
@@ -365,18 +1067,14 @@ class RequestHandler(http.server.SimpleHTTPRequestHandler):
                 self.end_headers()
                 self.wfile.write(json.dumps({"buckets": buckets}).encode())
             except Exception as e:
-                traceback.print_exc()
+                log.exception("GET %s failed", path)
                 self.send_response(500)
                 self.send_header('Content-Type', 'application/json')
                 self.end_headers()
                 self.wfile.write(json.dumps({"error": str(e)}).encode())
         elif path == '/api/secrets':
             try:
-                backend_dir = os.path.dirname(os.path.abspath(__file__))
-                root_dir = os.path.dirname(backend_dir)
-                creds_path = os.path.join(root_dir, 'credentials', 'key.json')
-                with open(creds_path, 'r') as f:
-                    key_data = json.load(f)
+                key_data = load_key_data(self.project_selector())
                 project_id = key_data['project_id']
                 token = get_access_token(key_data)
                 url = f"https://secretmanager.googleapis.com/v1/projects/{project_id}/secrets"
@@ -392,11 +1090,7 @@ class RequestHandler(http.server.SimpleHTTPRequestHandler):
                 self.wfile.write(json.dumps({"error": str(e)}).encode())
         elif path == '/api/keysets':
             try:
-                backend_dir = os.path.dirname(os.path.abspath(__file__))
-                root_dir = os.path.dirname(backend_dir)
-                creds_path = os.path.join(root_dir, 'credentials', 'key.json')
-                with open(creds_path, 'r') as f:
-                    key_data = json.load(f)
+                key_data = load_key_data(self.project_selector())
                 project_id = key_data['project_id']
                 token = get_access_token(key_data)
                 url = f"https://networkservices.googleapis.com/v1alpha1/projects/{project_id}/locations/global/edgeCacheKeysets"
@@ -412,16 +1106,12 @@ class RequestHandler(http.server.SimpleHTTPRequestHandler):
                 self.wfile.write(json.dumps({"error": str(e)}).encode())
         elif path == '/api/certificates':
             try:
-                backend_dir = os.path.dirname(os.path.abspath(__file__))
-                root_dir = os.path.dirname(backend_dir)
-                creds_path = os.path.join(root_dir, 'credentials', 'key.json')
-                with open(creds_path, 'r') as f:
-                    key_data = json.load(f)
+                key_data = load_key_data(self.project_selector())
                 project_id = key_data['project_id']
                 token = get_access_token(key_data)
                 url = f"https://certificatemanager.googleapis.com/v1/projects/{project_id}/locations/global/certificates"
                 resp = make_gcp_request(url, token=token)
-                print(f"Listing SSL Certs Resp: {resp}")
+                log.debug("Listed %d certificate(s)", len(resp.get("certificates", [])))
                 self.send_response(200)
                 self.send_header('Content-Type', 'application/json')
                 self.end_headers()
@@ -447,23 +1137,14 @@ class RequestHandler(http.server.SimpleHTTPRequestHandler):
                 if not bucket_name:
                     raise Exception("Bucket name is required")
                 
-                backend_dir = os.path.dirname(os.path.abspath(__file__))
-                root_dir = os.path.dirname(backend_dir)
-                creds_path = os.path.join(root_dir, 'credentials', 'key.json')
-                with open(creds_path, 'r') as f:
-                    key_data = json.load(f)
+                key_data = load_key_data(self.project_selector())
                 
                 project_id = key_data['project_id']
                 token = get_access_token(key_data)
                 
-                project_number = get_project_number(project_id, token)
-                service_accounts = [
-                    f"service-{project_number}@gcp-sa-mediaedgefill.iam.gserviceaccount.com"
-                ]
-                # Include broader roles that also grant the necessary permissions
-                roles = ["roles/storage.objectViewer", "roles/storage.legacyBucketReader", "roles/storage.admin", "roles/viewer", "roles/editor", "roles/owner"]
-                
-                has_access = check_bucket_iam(bucket_name, service_accounts, roles, token)
+                service_accounts = fill_service_accounts(project_id, token)
+                refresh = query.get('refresh', ['0'])[0] == '1'
+                has_access = check_bucket_iam(bucket_name, service_accounts, FILL_CHECK_ROLES, token, refresh=refresh)
                 
                 self.send_response(200)
                 self.send_header('Content-Type', 'application/json')
@@ -471,13 +1152,29 @@ class RequestHandler(http.server.SimpleHTTPRequestHandler):
                 self.wfile.write(json.dumps({
                     "has_access": has_access,
                     "service_accounts": service_accounts,
-                    "roles_checked": roles
+                    "roles_checked": FILL_CHECK_ROLES
                 }).encode())
             except Exception as e:
                 self.send_response(500)
                 self.send_header('Content-Type', 'application/json')
                 self.end_headers()
                 self.wfile.write(json.dumps({"error": str(e)}).encode())
+        elif path == '/api/analytics':
+            query = parse_qs(urlparse(self.path).query)
+            job_id = query.get('job_id', [None])[0]
+            job = jobs.get(job_id)
+            if job and "result" in job:
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps(job["result"]).encode())
+            elif job:
+                self.send_response(202)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps({"status": job["status"], "progress": job["progress"]}).encode())
+            else:
+                self.send_error(404)
         elif path == '/api/staging/versions':
             try:
                 query = parse_qs(urlparse(self.path).query)
@@ -485,34 +1182,11 @@ class RequestHandler(http.server.SimpleHTTPRequestHandler):
                 if not service_id:
                     raise Exception("Service ID is required")
                 
-                backend_dir = os.path.dirname(os.path.abspath(__file__))
-                root_dir = os.path.dirname(backend_dir)
-                creds_path = os.path.join(root_dir, 'credentials', 'key.json')
-                with open(creds_path, 'r') as f:
-                    key_data = json.load(f)
+                key_data = load_key_data(self.project_selector())
                 
                 project_id = key_data['project_id']
                 token = get_access_token(key_data)
-                project_number = get_project_number(project_id, token)
-                bucket_name = get_system_bucket(project_number)
-                
-                versions = []
-                try:
-                    raw_versions = list_gcs_object_versions(bucket_name, f"{service_id}.json", token)
-                    for v in raw_versions:
-                        try:
-                            content = get_gcs_object_content(bucket_name, f"{service_id}.json", v["generation"], token)
-                            config = json.loads(content)
-                            versions.append({
-                                "generation": v["generation"],
-                                "updated": v["updated"],
-                                "description": config.get("description", "No description provided")
-                            })
-                        except:
-                            pass
-                    versions.sort(key=lambda x: int(x["generation"]), reverse=True)
-                except Exception as e:
-                    print(f"Error listing versions: {e}")
+                versions = list_config_versions(registry.get(project_id), service_id, token)
                 
                 self.send_response(200)
                 self.send_header('Content-Type', 'application/json')
@@ -525,274 +1199,497 @@ class RequestHandler(http.server.SimpleHTTPRequestHandler):
                 self.wfile.write(json.dumps({"error": str(e)}).encode())
         else:
             if path.startswith('/api/'):
-                print(f"Unknown API path: {path}")
-            super().do_GET()
+                log.warning("Unknown API path: %s", path)
+            fs_path = self.translate_path(self.path)
+            if os.path.isdir(fs_path) and self.path.split('?')[0].endswith('/'):
+                fs_path = os.path.join(fs_path, 'index.html')
+            if os.path.isfile(fs_path):
+                self.send_static(fs_path)
+            else:
+                super().do_GET()
+
 
+def start_job_thread(target, *args):
+    """Runs a job in a background thread that keeps the request's log context (request ID)."""
+    thread = threading.Thread(target=contextvars.copy_context().run, args=(target,) + args)
+    thread.start()
+    return thread
+
+def _duration(value):
+    """Accepts seconds as a number or an API duration string and returns the API form."""
+    if isinstance(value, (int, float)) or str(value).replace('.', '', 1).isdigit():
+        return f"{float(value):g}s"
+    return str(value)
+
+def build_origin_body(spec):
+    """Builds an edgeCacheOrigin body from origin modal fields (without failoverOrigin)."""
+    origin_body = {
+        "originAddress": spec['origin_dns'],
+        "protocol": spec.get('protocol', 'HTTPS'),
+        "port": int(spec.get('port', 443)),
+        "description": spec.get('description', '')
+    }
+    if spec.get('host_header'):
+        origin_body["commonOverride"] = {
+            "hostHeader": spec['host_header']
+        }
+    if spec.get('max_attempts'):
+        origin_body["maxAttempts"] = int(spec['max_attempts'])
+    if spec.get('retry_conditions'):
+        origin_body["retryConditions"] = list(spec['retry_conditions'])
+    timeout = {}
+    for field, api_field in (('connect_timeout', 'connectTimeout'), ('max_attempts_timeout', 'maxAttemptsTimeout'),
+                             ('response_timeout', 'responseTimeout'), ('read_timeout', 'readTimeout')):
+        value = (spec.get('timeout') or {}).get(field)
+        if value not in (None, ''):
+            timeout[api_field] = _duration(value)
+    if timeout:
+        origin_body["timeout"] = timeout
+    return origin_body
+
+def resolve_origin_chain(payload, project_id, token):
+    """Returns (to_create, chain): new origins primary-first, and the full (id, body) failover chain.
+
+    `failover` may nest a new origin spec (created before the origin that points at it);
+    `failover_origin` names an existing origin, whose own chain is fetched for validation.
+    """
+    base = f"https://networkservices.googleapis.com/v1alpha1/projects/{project_id}/locations/global/edgeCacheOrigins"
+    to_create, chain = [], []
+    spec = payload
+    while spec:
+        origin_id = spec['origin_name']
+        body = build_origin_body(spec)
+        to_create.append((origin_id, body))
+        chain.append((origin_id, body))
+        failover = spec.get('failover')
+        if failover:
+            failover = dict(failover)
+            # Unset protocol and port fall back to the parent origin's; the Host header
+            # is not inherited, since the failover is usually a different host
+            for field in ('protocol', 'port'):
+                if field not in failover and field in spec:
+                    failover[field] = spec[field]
+            body["failoverOrigin"] = f"projects/{project_id}/locations/global/edgeCacheOrigins/{failover['origin_name']}"
+            spec = failover
+            continue
+        existing_id = spec.get('failover_origin')
+        if existing_id:
+            existing_id = existing_id.rsplit('/', 1)[-1]
+            body["failoverOrigin"] = f"projects/{project_id}/locations/global/edgeCacheOrigins/{existing_id}"
+            seen = {origin_id for origin_id, _ in chain}
+            while existing_id and existing_id not in seen:
+                existing = make_gcp_request(f"{base}/{existing_id}", token=token)
+                chain.append((existing_id, existing))
+                seen.add(existing_id)
+                existing_id = (existing.get("failoverOrigin") or "").rsplit('/', 1)[-1]
+            if existing_id:
+                chain.append((existing_id, {}))
+        spec = None
+    return to_create, chain
 
 def run_origin_task(job_id, payload):
+    set_job_id(job_id)
     try:
         key_data = payload['key_data']
         project_id = payload['project_id']
-        origin_name = payload['origin_name']
-        origin_dns = payload['origin_dns']
-        
-        # Additional fields
-        description = payload.get('description', '')
-        protocol = payload.get('protocol', 'HTTPS')
-        port = int(payload.get('port', 443))
-        host_header = payload.get('host_header', '')
         
         jobs[job_id]["logs"].append("Authenticating...")
         token = get_access_token(key_data)
         jobs[job_id]["progress"] = 10
-        
-        jobs[job_id]["logs"].append(f"Creating Edge Cache Origin: {origin_name}...")
-        url = f"https://networkservices.googleapis.com/v1alpha1/projects/{project_id}/locations/global/edgeCacheOrigins?edgeCacheOriginId={origin_name}"
-        origin_body = {
-            "originAddress": origin_dns,
-            "protocol": protocol,
-            "port": port,
-            "description": description
-        }
-        
-        if host_header:
-            origin_body["commonOverride"] = {
-                "hostHeader": host_header
-            }
-        
-        resp = make_gcp_request(url, method="POST", data=origin_body, token=token)
-        operation_name = resp["name"]
-        jobs[job_id]["logs"].append(f"Origin creation started. Operation: {operation_name}")
-        
-        start_time = time.time()
-        while True:
-            # Polling always uses the name returned, but we prefix with the version requested
-            op_url = f"https://networkservices.googleapis.com/v1alpha1/{operation_name}"
-            print(f"Polling operation: {op_url}")
-            op_resp = make_gcp_request(op_url, token=token)
-            if op_resp.get("done"):
-                if op_resp.get("error"):
-                    raise Exception(f"Origin creation failed: {op_resp['error']}")
-                jobs[job_id]["logs"].append("Origin created successfully.")
-                jobs[job_id]["progress"] = 100
-                jobs[job_id]["status"] = "Success"
-                break
+
+        to_create, chain = resolve_origin_chain(payload, project_id, token)
+        errors = validate_failover_chain(chain)
+        for origin_id, body in to_create:
+            errors.extend(validate_origin_config(body, origin_id))
+        if errors:
+            for line in format_errors(errors):
+                jobs[job_id]["logs"].append(f"Validation error: {line}")
+            raise Exception(f"Origin validation failed with {len(errors)} error(s)")
+        if len(chain) > 1:
+            jobs[job_id]["logs"].append(f"Failover chain: {' -> '.join(origin_id for origin_id, _ in chain)}")
+
+        # Failover targets must exist before the origin that references them
+        for step, (origin_name, origin_body) in enumerate(reversed(to_create)):
+            jobs[job_id]["logs"].append(f"Creating Edge Cache Origin: {origin_name}...")
+            url = f"https://networkservices.googleapis.com/v1alpha1/projects/{project_id}/locations/global/edgeCacheOrigins?edgeCacheOriginId={origin_name}"
+            resp = make_gcp_request(url, method="POST", data=origin_body, token=token)
+            operation_name = resp["name"]
+            jobs[job_id]["logs"].append(f"Origin creation started. Operation: {operation_name}")
             
-            elapsed = int(time.time() - start_time)
-            p = min(95, 10 + int((elapsed / 300) * 85))
-            jobs[job_id].update({"progress": p, "status": f"Creating Origin ({elapsed}s)"})
-            time.sleep(20)
+            start_time = time.time()
+            while True:
+                # Polling always uses the name returned, but we prefix with the version requested
+                op_url = f"https://networkservices.googleapis.com/v1alpha1/{operation_name}"
+                log.debug("Polling operation: %s", op_url)
+                op_resp = make_gcp_request(op_url, token=token)
+                if op_resp.get("done"):
+                    if op_resp.get("error"):
+                        raise Exception(f"Origin creation failed: {op_resp['error']}")
+                    jobs[job_id]["logs"].append(f"Origin {origin_name} created successfully.")
+                    break
+                
+                elapsed = int(time.time() - start_time)
+                share = 85 / len(to_create)
+                p = min(95, 10 + int(step * share + min(1, elapsed / 300) * share))
+                jobs[job_id].update({"progress": p, "status": f"Creating Origin {origin_name} ({elapsed}s)"})
+                time.sleep(20)
+
+        jobs[job_id]["progress"] = 100
+        jobs[job_id]["status"] = "Success"
             
     except Exception as e:
         jobs[job_id]["status"] = "Failed"
         jobs[job_id]["logs"].append(f"Error: {str(e)}")
+        log.error("Job failed: %s", e)
+
+# Cache tuning per template and route class. Player/session query parameters
+# fragment the cache, so manifests and segments are keyed on the path only
+# (signed token parameters are checked by the edge and never part of the key).
+# Negative caching absorbs repeated 404s; live edges keep them very short so a
+# segment that is about to be published is not hidden for long.
+CACHE_TUNING_DEFAULTS = {
+    "VOD": {
+        "master": {"exclude_query_string": True, "negative_caching": {"404": "60s", "410": "300s"}, "compression": "AUTOMATIC"},
+        "playlist": {"exclude_query_string": True, "negative_caching": {"404": "60s", "410": "300s"}, "compression": "AUTOMATIC"},
+        "segment": {"exclude_query_string": True, "negative_caching": {"404": "60s", "410": "300s"}},
+        "other": {"negative_caching": {"404": "60s"}, "compression": "AUTOMATIC"}
+    },
+    "Live": {
+        "master": {"exclude_query_string": True, "negative_caching": {"404": "2s"}, "compression": "AUTOMATIC"},
+        "playlist": {"exclude_query_string": True, "negative_caching": {"404": "1s"}, "compression": "AUTOMATIC"},
+        "segment": {"exclude_query_string": True, "negative_caching": {"404": "1s", "410": "60s"}},
+        "other": {"negative_caching": {"404": "2s"}, "compression": "AUTOMATIC"}
+    },
+    # Blocking playlist reloads are keyed on their _HLS_* parameters so every
+    # (msn, part) response is its own cache object; parts and CMAF chunks are
+    # not negatively cached because players request them just before they exist.
+    "LowLatency": {
+        "master": {"exclude_query_string": True, "negative_caching": {"404": "2s"}, "compression": "AUTOMATIC"},
+        "blocking": {"included_query_parameters": ["_HLS_msn", "_HLS_part", "_HLS_skip"], "negative_caching": {"400": "1s"},
+                     "compression": "AUTOMATIC"},
+        "playlist": {"included_query_parameters": ["_HLS_skip"], "negative_caching": {"404": "1s"}, "compression": "AUTOMATIC"},
+        "part": {"exclude_query_string": True},
+        "segment": {"exclude_query_string": True, "negative_caching": {"410": "60s"}},
+        "other": {"negative_caching": {"404": "2s"}, "compression": "AUTOMATIC"}
+    }
+}
+# Partial segment names differ per packager; override with ll_part_patterns in the deploy payload
+LL_PART_PATTERNS = ["/**.part.m4s", "/**.part.mp4", "/**.part.ts"]
+LL_BLOCKING_PARAMETER = "_HLS_msn"
+CACHE_TUNING_FIELDS = ("exclude_query_string", "included_query_parameters", "excluded_query_parameters",
+                       "included_header_names", "negative_caching", "compression")
+
+def route_class(rule, part_patterns=None):
+    """Classifies a route rule as master, blocking, playlist, part, segment or other from its match rules.
+
+    A rule is a part rule when it matches one of `part_patterns` (the deploy's ll_part_patterns).
+    """
+    patterns = [mr.get("pathTemplateMatch") or mr.get("fullPathMatch") or mr.get("prefixMatch") or ""
+                for mr in rule.get("matchRules", [])]
+    if any(q.get("name") == LL_BLOCKING_PARAMETER for mr in rule.get("matchRules", []) for q in mr.get("queryParameterMatches", [])):
+        return "blocking"
+    if set(patterns) & set(part_patterns or LL_PART_PATTERNS):
+        return "part"
+    if any(p.endswith(("/manifest.m3u8", "/manifest.mpd")) for p in patterns):
+        return "master"
+    if any(p.endswith((".m3u8", ".mpd")) for p in patterns):
+        return "playlist"
+    if any(p.endswith((".ts", ".m4s", ".mp4", ".aac", ".vtt")) for p in patterns):
+        return "segment"
+    return "other"
+
+def resolve_cache_tuning(setup_type, overrides=None):
+    """Merges payload cache_tuning overrides (per class, or '*' for all) over the template defaults."""
+    defaults = CACHE_TUNING_DEFAULTS.get(setup_type, CACHE_TUNING_DEFAULTS["Live"])
+    overrides = overrides or {}
+    tuning = {}
+    for cls, base in defaults.items():
+        merged = dict(base)
+        for source in (overrides.get("*"), overrides.get(cls)):
+            if not source:
+                continue
+            unknown = set(source) - set(CACHE_TUNING_FIELDS)
+            if unknown:
+                raise Exception(f"Unknown cache_tuning field(s) for '{cls}': {', '.join(sorted(unknown))}")
+            if ("included_query_parameters" in source or "excluded_query_parameters" in source) and "exclude_query_string" not in source:
+                # An explicit parameter list replaces the template's drop-everything default
+                merged["exclude_query_string"] = False
+            merged.update(source)
+        tuning[cls] = merged
+    return tuning
+
+def apply_cache_tuning(rule, tuning):
+    """Writes cacheKeyPolicy, negativeCaching and compressionMode for one route rule."""
+    route_action = rule.setdefault("routeAction", {})
+    policy = route_action.setdefault("cdnPolicy", {})
+    key_policy = {}
+    if tuning.get("exclude_query_string"):
+        key_policy["excludeQueryString"] = True
+    if tuning.get("included_query_parameters"):
+        key_policy["includedQueryParameters"] = list(tuning["included_query_parameters"])
+    if tuning.get("excluded_query_parameters"):
+        key_policy["excludedQueryParameters"] = list(tuning["excluded_query_parameters"])
+    if tuning.get("included_header_names"):
+        key_policy["includedHeaderNames"] = [h.lower() for h in tuning["included_header_names"]]
+    policy["cacheKeyPolicy"] = key_policy
+
+    negative = tuning.get("negative_caching")
+    if negative:
+        policy["negativeCaching"] = True
+        policy["negativeCachingPolicy"] = {str(code): _duration(ttl) for code, ttl in negative.items()}
+    else:
+        policy.pop("negativeCaching", None)
+        policy.pop("negativeCachingPolicy", None)
+
+    if tuning.get("compression"):
+        route_action["compressionMode"] = tuning["compression"].upper()
+    else:
+        route_action.pop("compressionMode", None)
+    return rule
+
+def build_service_body(payload, log=None):
+    """Builds the edgeCacheService body for a deploy payload (template or clone mode)."""
+    if log is None:
+        log = lambda msg: None
+    project_id = payload['project_id']
+    origin_name = payload['origin_name']
+    original_json = payload.get('original_json')
+    origin_path = f"projects/{project_id}/locations/global/edgeCacheOrigins/{origin_name}"
+
+    if original_json:
+        log("High-fidelity clone mode: Preserving original configuration rules and headers.")
+        # A fresh copy without read-only fields; the payload's original_json is left untouched
+        service_body = ServiceConfig.from_api(original_json).to_dict()
+        
+        # 1. Robust Domain Update
+        if "routing" in service_body and "hostRules" in service_body["routing"]:
+            for hr in service_body["routing"]["hostRules"]:
+                hr["hosts"] = [payload['domain']]
+        
+        # 2. SSL Certificate 
+        if payload.get('ssl_certificate'):
+            service_body["edgeSslCertificates"] = [payload['ssl_certificate']]
+        else:
+            service_body.pop("edgeSslCertificates", None)
+        
+        # 3. Comprehensive Origin & Dual Token Sync
+        dual_token = payload.get('dual_token_config', {})
+        enable_dt = dual_token.get('enabled', False)
+        
+        if "routing" in service_body and "pathMatchers" in service_body["routing"]:
+            for pm in service_body["routing"]["pathMatchers"]:
+                for rule in pm.get("routeRules", []):
+                    # Force Origin Update for ALL rules in cloned setup
+                    rule["origin"] = origin_path
+                    
+                    # Sync Dual Token settings from UI to cloned rules
+                    if "routeAction" in rule and "cdnPolicy" in rule["routeAction"]:
+                        policy = rule["routeAction"]["cdnPolicy"]
+                        if enable_dt:
+                            # Apply the keysets from UI to the rules
+                            s_keyset = f"projects/{project_id}/locations/global/edgeCacheKeysets/{dual_token['short_keyset']}"
+                            l_keyset = f"projects/{project_id}/locations/global/edgeCacheKeysets/{dual_token['long_keyset']}"
+                            sig_algo = dual_token.get('signature_algorithm', 'HMAC_SHA_256')
+
+                            # Heuristic: If it looks like a manifest, it's a "Master"
+                            match_rules = rule.get("matchRules", [])
+                            is_master = any(mr.get("pathTemplateMatch", "").endswith(".m3u8") or mr.get("pathTemplateMatch", "").endswith(".mpd") for mr in match_rules)
+                            
+                            if is_master:
+                                policy["signedRequestMode"] = "REQUIRE_TOKENS"
+                                policy["signedRequestKeyset"] = s_keyset
+                                policy["addSignatures"] = {
+                                    "actions": ["GENERATE_TOKEN_HLS_COOKIELESS"],
+                                    "keyset": l_keyset,
+                                    "tokenQueryParameter": "hdntl",
+                                    "tokenTtl": "86400s",
+                                    "copiedParameters": ["data", "Data", "Headers", "PathGlobs", "SessionID", "URLPrefix"]
+                                }
+                                policy["signedTokenOptions"] = {
+                                    "tokenQueryParameter": "hdnts",
+                                    "allowedSignatureAlgorithms": [sig_algo]
+                                }
+                            else:
+                                # Everything else gets child protection
+                                use_short = dual_token.get('child_use_short_token', False)
+                                ks = s_keyset if use_short else l_keyset
+                                policy["signedRequestMode"] = "REQUIRE_TOKENS"
+                                policy["signedRequestKeyset"] = ks
+                                policy["addSignatures"] = {
+                                    "actions": ["PROPAGATE_TOKEN_HLS_COOKIELESS"],
+                                    "tokenQueryParameter": "hdntl"
+                                }
+                        else:
+                            # Explicitly disable if unchecked in UI
+                            policy["signedRequestMode"] = "DISABLED"
+                            policy.pop("addSignatures", None)
+                            policy.pop("signedRequestKeyset", None)
+
+        # 4. Cache tuning only when asked for; cloned rules otherwise keep their own
+        if payload.get('cache_tuning'):
+            tuning = resolve_cache_tuning(payload.get('setup_type'), payload['cache_tuning'])
+            for pm in service_body.get("routing", {}).get("pathMatchers", []):
+                for rule in pm.get("routeRules", []):
+                    cls = route_class(rule, payload.get('ll_part_patterns'))
+                    if cls in tuning and (cls in payload['cache_tuning'] or "*" in payload['cache_tuning']):
+                        apply_cache_tuning(rule, tuning[cls])
+    else:
+        # Helper for Dual Token logic
+        dual_token = payload.get('dual_token_config', {})
+        enable_dual_token = dual_token.get('enabled', False)
+        
+        short_keyset = dual_token.get('short_keyset')
+        long_keyset = dual_token.get('long_keyset')
+
+        if enable_dual_token:
+            log(f"Applying Dual Token Protection (Short: {short_keyset}, Long: {long_keyset})...")
+        tuning = resolve_cache_tuning(payload['setup_type'], payload.get('cache_tuning'))
+        part_patterns = payload.get('ll_part_patterns') or LL_PART_PATTERNS
+
+        def get_route(desc, pattern, default_ttl, priority, mode="FORCE_CACHE_ALL", client_ttl="1s", security_type=None, query_match=None):
+            cdn_policy = {
+                "cacheMode": mode,
+                "defaultTtl": default_ttl,
+                "clientTtl": client_ttl,
+                "signedRequestMode": "DISABLED"
+            }
+
+            if enable_dual_token:
+                sig_algo = dual_token.get('signature_algorithm', 'HMAC_SHA_256')
+                is_hmac = sig_algo.startswith('HMAC')
+
+                if security_type == "MASTER":
+                    cdn_policy.update({
+                        "signedRequestMode": "REQUIRE_TOKENS",
+                        "signedRequestKeyset": f"projects/{project_id}/locations/global/edgeCacheKeysets/{short_keyset}",
+                        "signedRequestMaximumExpirationTtl": "3600s",
+                        "addSignatures": {
+                            "actions": ["GENERATE_TOKEN_HLS_COOKIELESS"],
+                            "keyset": f"projects/{project_id}/locations/global/edgeCacheKeysets/{long_keyset}",
+                            "tokenQueryParameter": "hdntl",
+                            "tokenTtl": "86400s",
+                            "copiedParameters": ["data", "Data", "Headers", "PathGlobs", "SessionID", "URLPrefix"]
+                        },
+                        "signedTokenOptions": {
+                            "tokenQueryParameter": "hdnts",
+                            "allowedSignatureAlgorithms": [sig_algo]
+                        }
+                    })
+                elif security_type == "CHILD":
+                    use_short = dual_token.get('child_use_short_token', False)
+                    ks_to_use = short_keyset if use_short else long_keyset
+                    token_param = "hdnts" if use_short else "hdntl"
+                    
+                    sto = {"tokenQueryParameter": token_param}
+                    if not is_hmac:
+                        sto["allowedSignatureAlgorithms"] = [sig_algo]
+                        
+                    cdn_policy.update({
+                        "signedRequestMode": "REQUIRE_TOKENS",
+                        "signedRequestKeyset": f"projects/{project_id}/locations/global/edgeCacheKeysets/{ks_to_use}",
+                        "addSignatures": {
+                            "actions": ["PROPAGATE_TOKEN_HLS_COOKIELESS"],
+                            "tokenQueryParameter": "hdntl"
+                        },
+                        "signedTokenOptions": sto
+                    })
+                elif security_type == "SEGMENT":
+                    sto = {"tokenQueryParameter": "hdntl"}
+                    if not is_hmac:
+                        sto["allowedSignatureAlgorithms"] = [sig_algo]
+                        
+                    cdn_policy.update({
+                        "signedRequestMode": "REQUIRE_TOKENS",
+                        "signedRequestKeyset": f"projects/{project_id}/locations/global/edgeCacheKeysets/{long_keyset}",
+                        "signedTokenOptions": sto
+                    })
+                
+            rule = {
+                "description": desc,
+                "priority": priority,
+                "origin": origin_path,
+                "matchRules": [{"pathTemplateMatch": p, "ignoreCase": True} for p in ([pattern] if isinstance(pattern, str) else pattern)],
+                "routeAction": {
+                    "cdnPolicy": cdn_policy,
+                    "corsPolicy": {
+                        "allowOrigins": ["*"], 
+                        "allowMethods": ["*"], 
+                        "allowHeaders": ["*"],
+                        "exposeHeaders": ["*"], 
+                        "maxAge": "600s", 
+                        "allowCredentials": True
+                    }
+                },
+                "routeMethods": {
+                    "allowedMethods": ["GET", "HEAD", "OPTIONS"]
+                }
+            }
+            if query_match:
+                for mr in rule["matchRules"]:
+                    mr["queryParameterMatches"] = [{"name": query_match, "presentMatch": True}]
+            return apply_cache_tuning(rule, tuning[route_class(rule, part_patterns)])
+
+        route_rules = []
+        if payload['setup_type'] == "VOD":
+            vod_ttl = "31536000s"
+            route_rules.append(get_route("Master Manifest", "/**/manifest.m3u8", vod_ttl, "1", security_type="MASTER"))
+            route_rules.append(get_route("Child Playlist", "/**.m3u8", vod_ttl, "2", security_type="CHILD"))
+            route_rules.append(get_route("TS Chunks", "/**.ts", vod_ttl, "3", security_type="SEGMENT"))
+            route_rules.append(get_route("DASH Manifest", "/**/manifest.mpd", vod_ttl, "47"))
+            route_rules.append(get_route("DASH Segments (m4s)", "/**.m4s", vod_ttl, "48"))
+            route_rules.append(get_route("DASH Segments (mp4)", "/**.mp4", vod_ttl, "49"))
+            route_rules.append(get_route("All Other", "/**", vod_ttl, "100"))
+        elif payload['setup_type'] == "LowLatency":
+            # LL-HLS blocking reloads (?_HLS_msn=&_HLS_part=) are answered by the origin once the
+            # part exists, so each response can be cached for a few part durations; the plain
+            # playlist is only served to players joining or recovering and stays at 1s.
+            route_rules.append(get_route("LL Master Manifest", "/**/manifest.m3u8", "86400s", "1", security_type="MASTER"))
+            route_rules.append(get_route("LL-HLS Blocking Playlist Reload", "/**.m3u8", "6s", "2", security_type="CHILD",
+                                         query_match=LL_BLOCKING_PARAMETER))
+            route_rules.append(get_route("LL-HLS Media Playlist", "/**.m3u8", "1s", "3", security_type="CHILD"))
+            route_rules.append(get_route("LL-HLS Partial Segments", part_patterns, "600s", "4", security_type="SEGMENT"))
+            route_rules.append(get_route("LL Media Segments (ts)", "/**.ts", "31536000s", "5", security_type="SEGMENT"))
+            route_rules.append(get_route("LL DASH Manifest", "/**.mpd", "2s", "47"))
+            route_rules.append(get_route("LL CMAF Chunks (m4s)", "/**.m4s", "31536000s", "48"))
+            route_rules.append(get_route("LL CMAF Chunks (mp4)", "/**.mp4", "31536000s", "49"))
+        else:
+            route_rules.append(get_route("Live Master Manifest", "/**/manifest.m3u8", "86400s", "1", security_type="MASTER"))
+            route_rules.append(get_route("Live Child Playlist", "/**.m3u8", "2s", "2", security_type="CHILD"))
+            route_rules.append(get_route("Live Media Chunks", "/**.ts", "31536000s", "3", security_type="SEGMENT"))
+            route_rules.append(get_route("Live DASH Manifest", "/**/manifest.mpd", "2s", "47"))
+            route_rules.append(get_route("Live DASH Segments (m4s)", "/**.m4s", "31536000s", "48"))
+            route_rules.append(get_route("Live DASH Segments (mp4)", "/**.mp4", "31536000s", "49"))
+
+        service_body = {
+            "routing": {
+                "hostRules": [{"hosts": [payload['domain']], "pathMatcher": "path-matcher-0"}],
+                "pathMatchers": [{"name": "path-matcher-0", "routeRules": route_rules}]
+            },
+            "logConfig": {"enable": True, "sampleRate": 1.0}
+        }
+
+        if payload.get('ssl_certificate'):
+            service_body["edgeSslCertificates"] = [payload['ssl_certificate']]
+
+    return service_body
 
 def run_deployment_task(job_id, payload):
+    set_job_id(job_id)
     try:
         key_data = payload['key_data']
         project_id = payload['project_id']
-        origin_name = payload['origin_name']
         setup_name = payload['setup_name']
-        original_json = payload.get('original_json')
         
         jobs[job_id]["logs"].append("Authenticating with Google Cloud...")
         token = get_access_token(key_data)
         jobs[job_id]["progress"] = 10
         
-        origin_path = f"projects/{project_id}/locations/global/edgeCacheOrigins/{origin_name}"
-        
         jobs[job_id]["logs"].append(f"Preparing Media CDN Service: {setup_name}...")
         url = f"https://networkservices.googleapis.com/v1alpha1/projects/{project_id}/locations/global/edgeCacheServices?edgeCacheServiceId={setup_name}"
         
-        if original_json:
-            jobs[job_id]["logs"].append("High-fidelity clone mode: Preserving original configuration rules and headers.")
-            service_body = original_json
-            # Strip read-only or project-specific fields to avoid conflicts
-            for field in ["updateTime", "createTime", "etag", "ipv4Addresses", "ipv6Addresses", "name"]:
-                service_body.pop(field, None)
-            
-            # 1. Robust Domain Update
-            if "routing" in service_body and "hostRules" in service_body["routing"]:
-                for hr in service_body["routing"]["hostRules"]:
-                    hr["hosts"] = [payload['domain']]
-            
-            # 2. SSL Certificate 
-            if payload.get('ssl_certificate'):
-                service_body["edgeSslCertificates"] = [payload['ssl_certificate']]
-            else:
-                service_body.pop("edgeSslCertificates", None)
-            
-            # 3. Comprehensive Origin & Dual Token Sync
-            dual_token = payload.get('dual_token_config', {})
-            enable_dt = dual_token.get('enabled', False)
-            
-            if "routing" in service_body and "pathMatchers" in service_body["routing"]:
-                for pm in service_body["routing"]["pathMatchers"]:
-                    for rule in pm.get("routeRules", []):
-                        # Force Origin Update for ALL rules in cloned setup
-                        rule["origin"] = origin_path
-                        
-                        # Sync Dual Token settings from UI to cloned rules
-                        if "routeAction" in rule and "cdnPolicy" in rule["routeAction"]:
-                            policy = rule["routeAction"]["cdnPolicy"]
-                            if enable_dt:
-                                # Apply the keysets from UI to the rules
-                                s_keyset = f"projects/{project_id}/locations/global/edgeCacheKeysets/{dual_token['short_keyset']}"
-                                l_keyset = f"projects/{project_id}/locations/global/edgeCacheKeysets/{dual_token['long_keyset']}"
-                                sig_algo = dual_token.get('signature_algorithm', 'HMAC_SHA_256')
-
-                                # Heuristic: If it looks like a manifest, it's a "Master"
-                                match_rules = rule.get("matchRules", [])
-                                is_master = any(mr.get("pathTemplateMatch", "").endswith(".m3u8") or mr.get("pathTemplateMatch", "").endswith(".mpd") for mr in match_rules)
-                                
-                                if is_master:
-                                    policy["signedRequestMode"] = "REQUIRE_TOKENS"
-                                    policy["signedRequestKeyset"] = s_keyset
-                                    policy["addSignatures"] = {
-                                        "actions": ["GENERATE_TOKEN_HLS_COOKIELESS"],
-                                        "keyset": l_keyset,
-                                        "tokenQueryParameter": "hdntl",
-                                        "tokenTtl": "86400s",
-                                        "copiedParameters": ["data", "Data", "Headers", "PathGlobs", "SessionID", "URLPrefix"]
-                                    }
-                                    policy["signedTokenOptions"] = {
-                                        "tokenQueryParameter": "hdnts",
-                                        "allowedSignatureAlgorithms": [sig_algo]
-                                    }
-                                else:
-                                    # Everything else gets child protection
-                                    use_short = dual_token.get('child_use_short_token', False)
-                                    ks = s_keyset if use_short else l_keyset
-                                    policy["signedRequestMode"] = "REQUIRE_TOKENS"
-                                    policy["signedRequestKeyset"] = ks
-                                    policy["addSignatures"] = {
-                                        "actions": ["PROPAGATE_TOKEN_HLS_COOKIELESS"],
-                                        "tokenQueryParameter": "hdntl"
-                                    }
-                            else:
-                                # Explicitly disable if unchecked in UI
-                                policy["signedRequestMode"] = "DISABLED"
-                                policy.pop("addSignatures", None)
-                                policy.pop("signedRequestKeyset", None)
-        else:
-            # Helper for Dual Token logic
-            dual_token = payload.get('dual_token_config', {})
-            enable_dual_token = dual_token.get('enabled', False)
-            
-            short_keyset = dual_token.get('short_keyset')
-            long_keyset = dual_token.get('long_keyset')
-
-            if enable_dual_token:
-                jobs[job_id]["logs"].append(f"Applying Dual Token Protection (Short: {short_keyset}, Long: {long_keyset})...")
-
-            def get_route(desc, pattern, default_ttl, priority, mode="FORCE_CACHE_ALL", client_ttl="1s", security_type=None):
-                cdn_policy = {
-                    "cacheMode": mode,
-                    "defaultTtl": default_ttl,
-                    "clientTtl": client_ttl,
-                    "cacheKeyPolicy": {},
-                    "signedRequestMode": "DISABLED"
-                }
+        service_body = build_service_body(payload, log=jobs[job_id]["logs"].append)
 
-                if enable_dual_token:
-                    sig_algo = dual_token.get('signature_algorithm', 'HMAC_SHA_256')
-                    is_hmac = sig_algo.startswith('HMAC')
-
-                    if security_type == "MASTER":
-                        cdn_policy.update({
-                            "signedRequestMode": "REQUIRE_TOKENS",
-                            "signedRequestKeyset": f"projects/{project_id}/locations/global/edgeCacheKeysets/{short_keyset}",
-                            "signedRequestMaximumExpirationTtl": "3600s",
-                            "addSignatures": {
-                                "actions": ["GENERATE_TOKEN_HLS_COOKIELESS"],
-                                "keyset": f"projects/{project_id}/locations/global/edgeCacheKeysets/{long_keyset}",
-                                "tokenQueryParameter": "hdntl",
-                                "tokenTtl": "86400s",
-                                "copiedParameters": ["data", "Data", "Headers", "PathGlobs", "SessionID", "URLPrefix"]
-                            },
-                            "signedTokenOptions": {
-                                "tokenQueryParameter": "hdnts",
-                                "allowedSignatureAlgorithms": [sig_algo]
-                            }
-                        })
-                    elif security_type == "CHILD":
-                        use_short = dual_token.get('child_use_short_token', False)
-                        ks_to_use = short_keyset if use_short else long_keyset
-                        token_param = "hdnts" if use_short else "hdntl"
-                        
-                        sto = {"tokenQueryParameter": token_param}
-                        if not is_hmac:
-                            sto["allowedSignatureAlgorithms"] = [sig_algo]
-                            
-                        cdn_policy.update({
-                            "signedRequestMode": "REQUIRE_TOKENS",
-                            "signedRequestKeyset": f"projects/{project_id}/locations/global/edgeCacheKeysets/{ks_to_use}",
-                            "addSignatures": {
-                                "actions": ["PROPAGATE_TOKEN_HLS_COOKIELESS"],
-                                "tokenQueryParameter": "hdntl"
-                            },
-                            "signedTokenOptions": sto
-                        })
-                    elif security_type == "SEGMENT":
-                        sto = {"tokenQueryParameter": "hdntl"}
-                        if not is_hmac:
-                            sto["allowedSignatureAlgorithms"] = [sig_algo]
-                            
-                        cdn_policy.update({
-                            "signedRequestMode": "REQUIRE_TOKENS",
-                            "signedRequestKeyset": f"projects/{project_id}/locations/global/edgeCacheKeysets/{long_keyset}",
-                            "signedTokenOptions": sto
-                        })
-                    
-                return {
-                    "description": desc,
-                    "priority": priority,
-                    "origin": origin_path,
-                    "matchRules": [{"pathTemplateMatch": pattern, "ignoreCase": True}],
-                    "routeAction": {
-                        "cdnPolicy": cdn_policy,
-                        "corsPolicy": {
-                            "allowOrigins": ["*"], 
-                            "allowMethods": ["*"], 
-                            "allowHeaders": ["*"],
-                            "exposeHeaders": ["*"], 
-                            "maxAge": "600s", 
-                            "allowCredentials": True
-                        }
-                    },
-                    "routeMethods": {
-                        "allowedMethods": ["GET", "HEAD", "OPTIONS"]
-                    }
-                }
-
-            route_rules = []
-            if payload['setup_type'] == "VOD":
-                vod_ttl = "31536000s"
-                route_rules.append(get_route("Master Manifest", "/**/manifest.m3u8", vod_ttl, "1", security_type="MASTER"))
-                route_rules.append(get_route("Child Playlist", "/**.m3u8", vod_ttl, "2", security_type="CHILD"))
-                route_rules.append(get_route("TS Chunks", "/**.ts", vod_ttl, "3", security_type="SEGMENT"))
-                route_rules.append(get_route("DASH Manifest", "/**/manifest.mpd", vod_ttl, "47"))
-                route_rules.append(get_route("DASH Segments (m4s)", "/**.m4s", vod_ttl, "48"))
-                route_rules.append(get_route("DASH Segments (mp4)", "/**.mp4", vod_ttl, "49"))
-                route_rules.append(get_route("All Other", "/**", vod_ttl, "100"))
-            else:
-                route_rules.append(get_route("Live Master Manifest", "/**/manifest.m3u8", "86400s", "1", security_type="MASTER"))
-                route_rules.append(get_route("Live Child Playlist", "/**.m3u8", "2s", "2", security_type="CHILD"))
-                route_rules.append(get_route("Live Media Chunks", "/**.ts", "31536000s", "3", security_type="SEGMENT"))
-                route_rules.append(get_route("Live DASH Manifest", "/**/manifest.mpd", "2s", "47"))
-                route_rules.append(get_route("Live DASH Segments (m4s)", "/**.m4s", "31536000s", "48"))
-                route_rules.append(get_route("Live DASH Segments (mp4)", "/**.mp4", "31536000s", "49"))
-
-            service_body = {
-                "routing": {
-                    "hostRules": [{"hosts": [payload['domain']], "pathMatcher": "path-matcher-0"}],
-                    "pathMatchers": [{"name": "path-matcher-0", "routeRules": route_rules}]
-                },
-                "logConfig": {"enable": True, "sampleRate": 1.0}
-            }
-
-            if payload.get('ssl_certificate'):
-                service_body["edgeSslCertificates"] = [payload['ssl_certificate']]
+        preflight_validate(job_id, service_body, project_id, token)
 
         jobs[job_id]["progress"] = 50
         resp = make_gcp_request(url, method="POST", data=service_body, token=token)
@@ -802,12 +1699,17 @@ def run_deployment_task(job_id, payload):
         start_time = time.time()
         while True:
             op_url = f"https://networkservices.googleapis.com/v1alpha1/{operation_name}"
-            print(f"Polling operation: {op_url}")
+            log.debug("Polling operation: %s", op_url)
             op_resp = make_gcp_request(op_url, token=token)
             if op_resp.get("done"):
                 if op_resp.get("error"):
                     raise Exception(f"Service deployment failed: {op_resp['error']}")
                 jobs[job_id]["logs"].append("Media CDN deployed successfully!")
+                if payload.get('prewarm'):
+                    prewarm_payload = dict(payload['prewarm'])
+                    prewarm_payload.setdefault('base_url', f"https://{payload['domain']}")
+                    prewarm_payload['project'] = project_id
+                    jobs[job_id]["logs"].append(f"Cache prewarm job started: {start_prewarm_job(prewarm_payload)}")
                 jobs[job_id]["progress"] = 100
                 jobs[job_id]["status"] = "Success"
                 break
@@ -820,14 +1722,12 @@ def run_deployment_task(job_id, payload):
     except Exception as e:
         jobs[job_id]["status"] = "Failed"
         jobs[job_id]["logs"].append(f"Error: {str(e)}")
+        log.error("Job failed: %s", e)
 
 def run_staging_task(job_id, payload):
+    set_job_id(job_id)
     try:
-        backend_dir = os.path.dirname(os.path.abspath(__file__))
-        root_dir = os.path.dirname(backend_dir)
-        creds_path = os.path.join(root_dir, 'credentials', 'key.json')
-        with open(creds_path, 'r') as f:
-            key_data = json.load(f)
+        key_data = load_key_data(payload.get('project'))
         
         project_id = key_data['project_id']
         service_id = payload['service_id']
@@ -837,7 +1737,7 @@ def run_staging_task(job_id, payload):
         jobs[job_id]["logs"].append(f"Starting cloning process for {service_id}...")
         token = get_access_token(key_data)
         project_number = get_project_number(project_id, token)
-        bucket_name = get_system_bucket(project_number)
+        bucket_name = get_system_bucket(project_number, project_id)
         
         # 0. Ensure GCS bucket exists early so user sees it
         jobs[job_id]["logs"].append(f"Ensuring GCS bucket {bucket_name} exists in {bucket_region}...")
@@ -850,12 +1750,12 @@ def run_staging_task(job_id, payload):
         
         # 2. Prepare staging config
         jobs[job_id]["logs"].append(f"Preparing staging config: {staging_service_id}...")
-        staging_body = original_service.copy()
-        for field in ["updateTime", "createTime", "etag", "ipv4Addresses", "ipv6Addresses", "name"]:
-            staging_body.pop(field, None)
+        staging_config = ServiceConfig.from_api(original_service)
         
         # Update description if needed (user might want version notes)
-        staging_body["description"] = payload.get("description", f"Staging for {service_id}")
+        staging_config.description = payload.get("description", f"Staging for {service_id}")
+        staging_body = staging_config.to_dict()
+        preflight_validate(job_id, staging_body, project_id, token)
         
         # 3. Deploy staging
         jobs[job_id]["logs"].append(f"Deploying staging service...")
@@ -891,12 +1791,26 @@ def run_staging_task(job_id, payload):
 
         # 4. Sync YAML to GCS
         jobs[job_id]["logs"].append(f"Syncing configuration to GCS with versioning...")
-        upload_gcs_object(bucket_name, f"{service_id}.json", staging_body, token)
+        versions = list_gcs_object_versions(bucket_name, f"{service_id}.json", token)
+        latest = max(versions, key=lambda v: int(v["generation"])) if versions else None
+        latest_config = None
+        if latest:
+            try:
+                latest_config = ServiceConfig.from_api(json.loads(get_gcs_object_content(bucket_name, f"{service_id}.json", latest["generation"], token)))
+            except Exception as e:
+                log.warning("Could not read stored version %s of %s: %s", latest["generation"], service_id, e)
+        if latest_config is not None and latest_config == staging_config:
+            # Same canonical content: a new generation would only clutter the version history
+            jobs[job_id]["logs"].append(f"Configuration unchanged since version {latest['generation']}; no new version stored.")
+        else:
+            metadata = {"description": (staging_config.description or "")[:MAX_METADATA_DESCRIPTION],
+                        CONTENT_HASH_KEY: drift_hash(staging_config)}
+            upload_gcs_object(bucket_name, f"{service_id}.json", staging_body, token, metadata=metadata)
         
         # Also sync other YAMLs in sample-configs if requested?
         # "Sync all the yaml in this directory"
         # Let's assume this means the sample-configs for now as a baseline
-        sample_dir = os.path.join(root_dir, "sample-configs")
+        sample_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sample-configs")
         if os.path.exists(sample_dir):
             for filename in os.listdir(sample_dir):
                 if filename.endswith(".yaml"):
@@ -904,8 +1818,8 @@ def run_staging_task(job_id, payload):
                         with open(os.path.join(sample_dir, filename), "r") as f:
                             content = f.read()
                         upload_gcs_object(bucket_name, filename, content, token, content_type="text/plain")
-                    except:
-                        pass
+                    except Exception as e:
+                        log.warning("Could not sync sample config %s: %s", filename, e)
 
         jobs[job_id]["progress"] = 100
         jobs[job_id]["status"] = "Success"
@@ -914,14 +1828,12 @@ def run_staging_task(job_id, payload):
     except Exception as e:
         jobs[job_id]["status"] = "Failed"
         jobs[job_id]["logs"].append(f"Error: {str(e)}")
+        log.error("Job failed: %s", e)
 
 def run_promotion_task(job_id, payload):
+    set_job_id(job_id)
     try:
-        backend_dir = os.path.dirname(os.path.abspath(__file__))
-        root_dir = os.path.dirname(backend_dir)
-        creds_path = os.path.join(root_dir, 'credentials', 'key.json')
-        with open(creds_path, 'r') as f:
-            key_data = json.load(f)
+        key_data = load_key_data(payload.get('project'))
         
         project_id = key_data['project_id']
         service_id = payload['service_id'] # target production service
@@ -934,16 +1846,16 @@ def run_promotion_task(job_id, payload):
         if generation:
             jobs[job_id]["logs"].append(f"Promoting version {generation} to production...")
             project_number = get_project_number(project_id, token)
-            bucket_name = get_system_bucket(project_number)
-            promote_config = json.loads(get_gcs_object_content(bucket_name, f"{service_id}.json", generation, token))
+            bucket_name = get_system_bucket(project_number, project_id)
+            promote_source = json.loads(get_gcs_object_content(bucket_name, f"{service_id}.json", generation, token))
         else:
             jobs[job_id]["logs"].append(f"Promoting current staging config to production...")
             url_fetch = f"https://networkservices.googleapis.com/v1alpha1/projects/{project_id}/locations/global/edgeCacheServices/{staging_service_id}"
-            promote_config = make_gcp_request(url_fetch, token=token)
+            promote_source = make_gcp_request(url_fetch, token=token)
         
-        # 2. Prepare production config (strip fields)
-        for field in ["updateTime", "createTime", "etag", "ipv4Addresses", "ipv6Addresses", "name"]:
-            promote_config.pop(field, None)
+        # 2. Prepare production config (read-only fields are dropped while parsing)
+        promote_config = ServiceConfig.from_api(promote_source).to_dict()
+        preflight_validate(job_id, promote_config, project_id, token)
             
         # 3. Deploy to production
         jobs[job_id]["logs"].append(f"Updating production service {service_id}...")
@@ -969,17 +1881,347 @@ def run_promotion_task(job_id, payload):
         jobs[job_id]["progress"] = 100
         jobs[job_id]["status"] = "Success"
         jobs[job_id]["logs"].append("Production environment updated successfully!")
+        if payload.get('prewarm'):
+            prewarm_payload = dict(payload['prewarm'])
+            hosts = [h for rule in promote_config.get('routing', {}).get('hostRules', [])
+                     for h in rule.get('hosts', []) if '*' not in h]
+            if hosts:
+                prewarm_payload.setdefault('base_url', f"https://{hosts[0]}")
+            prewarm_payload['project'] = project_id
+            if prewarm_payload.get('base_url'):
+                jobs[job_id]["logs"].append(f"Cache prewarm job started: {start_prewarm_job(prewarm_payload)}")
+            else:
+                jobs[job_id]["logs"].append("Cache prewarm skipped: the service has no concrete host to prewarm")
         
     except Exception as e:
         jobs[job_id]["status"] = "Failed"
         jobs[job_id]["logs"].append(f"Error: {str(e)}")
+        log.error("Job failed: %s", e)
+
+
+def run_analytics_task(job_id, payload):
+    set_job_id(job_id)
+    try:
+        key_data = load_key_data(payload.get('project'))
+        project_id = key_data['project_id']
+        bucket_name = payload['bucket']
+        prefix = payload.get('prefix', '')
+        service_id = payload.get('service_id')
+
+        jobs[job_id]["logs"].append("Authenticating...")
+        token = get_access_token(key_data)
+
+        service_body = None
+        if service_id:
+            jobs[job_id]["logs"].append(f"Loading route rules from service {service_id}...")
+            url = f"https://networkservices.googleapis.com/v1alpha1/projects/{project_id}/locations/global/edgeCacheServices/{service_id}"
+            service_body = make_gcp_request(url, token=token)
+
+        objects = [o for o in list_gcs_objects(bucket_name, prefix, token) if o["name"].endswith((".json", ".jsonl", ".gz"))]
+        jobs[job_id]["logs"].append(f"Found {len(objects)} log file(s) in gs://{bucket_name}/{prefix}")
+        analyzer = LogAnalyzer(service_body, host=payload.get('host'))
+
+        for idx, obj in enumerate(objects):
+            jobs[job_id]["status"] = f"Analyzing {obj['name']}"
+            resp = open_gcs_object(bucket_name, obj["name"], token)
+            try:
+                analyzer.add_stream(open_log_stream(resp))
+            finally:
+                resp.close()
+            jobs[job_id]["progress"] = int((idx + 1) / len(objects) * 100)
+
+        jobs[job_id]["result"] = analyzer.report()
+        jobs[job_id]["progress"] = 100
+        jobs[job_id]["status"] = "Success"
+        jobs[job_id]["logs"].append(f"Analyzed {analyzer.total['requests']} log entries.")
+
+    except Exception as e:
+        jobs[job_id]["status"] = "Failed"
+        jobs[job_id]["logs"].append(f"Error: {str(e)}")
+        log.error("Job failed: %s", e)
+
+
+def start_prewarm_job(payload):
+    job_id = f"prewarm_{int(time.time() * 1000)}"
+    jobs[job_id] = {
+        "status": "Starting",
+        "progress": 0,
+        "logs": ["Cache prewarm initiated..."]
+    }
+    start_job_thread(run_prewarm_task, job_id, payload)
+    return job_id
+
+def run_prewarm_task(job_id, payload):
+    set_job_id(job_id)
+    try:
+        base_url = payload['base_url'].rstrip('/')
+        paths = payload['paths']
+        concurrency = int(payload.get('concurrency', 16))
+        budget_mb = payload.get('byte_budget_mb')
+        byte_budget = int(float(budget_mb) * 1024 * 1024) if budget_mb else None
+
+        # Master manifests need an hdnts token when dual-token protection is enabled
+        if payload.get('keyset') or payload.get('key'):
+            jobs[job_id]["logs"].append("Signing master manifest URLs...")
+            key_data = None if payload.get('key') else load_key_data(payload.get('project'))
+            token = get_access_token(key_data) if key_data else None
+            key, algorithm = resolve_signing_key(payload, key_data and key_data['project_id'], token)
+            signer = TokenSigner(key, algorithm)
+            expires = time.time() + int(payload.get('expires_in', 3600))
+            manifest_urls = [signer.sign_url(base_url, p, expires, url_prefix=True) for p in paths]
+        else:
+            manifest_urls = [f"{base_url}/{p.lstrip('/')}" for p in paths]
+
+        jobs[job_id]["logs"].append(f"Crawling {len(manifest_urls)} manifest(s) with concurrency {concurrency}...")
+
+        def report(stats):
+            done = stats["manifests"] + stats["segments"] + stats["errors"]
+            p = int(done / stats["queued"] * 100) if stats["queued"] else 0
+            if stats["budget_exhausted"]:
+                p = 100
+            jobs[job_id].update({
+                "progress": min(99, p),
+                "status": f"Prewarming ({done}/{stats['queued']} objects, {stats['bytes'] // (1024 * 1024)} MB)",
+                "stats": stats
+            })
+
+        stats = Prewarmer(concurrency, byte_budget, report).run(manifest_urls)
+        jobs[job_id]["stats"] = stats
+        if stats.get("last_error"):
+            jobs[job_id]["logs"].append(f"{stats['errors']} request(s) failed, last: {stats['last_error']}")
+        if stats["budget_exhausted"]:
+            jobs[job_id]["logs"].append("Byte budget reached; remaining objects were skipped.")
+        jobs[job_id]["logs"].append(f"Prewarmed {stats['manifests']} manifest(s) and {stats['segments']} segment(s), {stats['bytes']} bytes.")
+        jobs[job_id]["progress"] = 100
+        jobs[job_id]["status"] = "Success"
+
+    except Exception as e:
+        jobs[job_id]["status"] = "Failed"
+        jobs[job_id]["logs"].append(f"Error: {str(e)}")
+        log.error("Job failed: %s", e)
 
+def load_fleet_definitions(payload, project_id):
+    """Definitions sent inline ('definitions') or read from a directory inside the manager root."""
+    if payload.get('definitions'):
+        return parse_definitions(payload['definitions'], "<request>", project_id)
+    root_dir = os.path.realpath(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    directory = os.path.realpath(os.path.join(root_dir, payload.get('directory') or 'fleet'))
+    if not directory.startswith(root_dir + os.sep):
+        raise Exception("Fleet directory must be inside the manager directory")
+    return load_definitions(directory, project_id)
+
+def build_fleet_plan(job_id, payload):
+    key_data = payload['key_data']
+    project_id = payload['project_id']
+    token = get_access_token(key_data)
+    definitions = load_fleet_definitions(payload, project_id)
+    jobs[job_id]["logs"].append(f"Loaded {len(definitions)} definition(s); fetching live state of {project_id}...")
+    jobs[job_id]["progress"] = 20
+    plan = compute_plan(definitions, fetch_live(project_id, token), prune=payload.get('prune', False))
+    jobs[job_id]["logs"].extend(describe_plan(plan).splitlines())
+    return plan, definitions, token
+
+def run_fleet_plan_task(job_id, payload):
+    set_job_id(job_id)
+    try:
+        plan, _, _ = build_fleet_plan(job_id, payload)
+        jobs[job_id]["result"] = plan
+        jobs[job_id]["progress"] = 100
+        jobs[job_id]["status"] = "Failed" if plan["errors"] else "Success"
+    except Exception as e:
+        jobs[job_id]["status"] = "Failed"
+        jobs[job_id]["logs"].append(f"Error: {str(e)}")
+        log.error("Job failed: %s", e)
+
+def run_fleet_apply_task(job_id, payload):
+    set_job_id(job_id)
+    try:
+        plan, definitions, token = build_fleet_plan(job_id, payload)
+        jobs[job_id]["result"] = {"plan": plan, "results": []}
+        reviewed = jobs.get(payload.get('plan_id') or '', {}).get("result")
+        if payload.get('plan_id') and (not reviewed or reviewed.get("fingerprint") != plan["fingerprint"]):
+            raise Exception(f"Live state or definitions changed since plan {payload['plan_id']}; re-run the plan")
+
+        def on_progress(done, total, result):
+            jobs[job_id]["result"]["results"].append(result)
+            jobs[job_id]["logs"].append(f"[{done}/{total}] {result['action']} {result['kind']} {result['id']}: {result['status']}"
+                                        + (f" ({result['error']})" if result.get('error') else ""))
+            jobs[job_id].update({"progress": 20 + int(done / total * 80), "status": f"Applying ({done}/{total})"})
+
+        results = apply_plan(plan, definitions, payload['project_id'], token,
+                             concurrency=int(payload.get('concurrency', 4)), on_progress=on_progress)
+        jobs[job_id]["result"]["results"] = results
+        failed = [r for r in results if r["status"] != "done"]
+        jobs[job_id]["progress"] = 100
+        jobs[job_id]["status"] = "Failed" if failed else "Success"
+        jobs[job_id]["logs"].append(f"Fleet apply finished: {len(results) - len(failed)} done, {len(failed)} failed or not started.")
+    except Exception as e:
+        jobs[job_id]["status"] = "Failed"
+        jobs[job_id]["logs"].append(f"Error: {str(e)}")
+        log.error("Job failed: %s", e)
+
+def run_snapshot_export_task(job_id, payload):
+    set_job_id(job_id)
+    try:
+        key_data = payload['key_data']
+        project_id = key_data['project_id']
+        token = get_access_token(key_data)
+        bucket_name = get_system_bucket(get_project_number(project_id, token), project_id)
+        jobs[job_id]["logs"].append(f"Ensuring GCS bucket {bucket_name} exists...")
+        create_gcs_bucket(bucket_name, project_id, payload.get('region', 'asia-south1'), token)
+
+        def on_progress(kind, count):
+            jobs[job_id]["logs"].append(f"Exported {count} {kind}(s)")
+            jobs[job_id]["progress"] = min(jobs[job_id]["progress"] + 15, 70)
+
+        object_name = snapshot_name(project_id)
+        jobs[job_id].update({"progress": 10, "status": "Exporting"})
+        result = export_snapshot(project_id, token, bucket_name, object_name,
+                                 concurrency=int(payload.get('concurrency', 4)), on_progress=on_progress)
+        jobs[job_id]["result"] = dict(result, bucket=bucket_name)
+        jobs[job_id]["logs"].append(f"Snapshot written to gs://{bucket_name}/{object_name} "
+                                    f"(generation {result['generation']}, {result['size']} bytes).")
+        jobs[job_id]["progress"] = 100
+        jobs[job_id]["status"] = "Success"
+    except Exception as e:
+        jobs[job_id]["status"] = "Failed"
+        jobs[job_id]["logs"].append(f"Error: {str(e)}")
+        log.error("Job failed: %s", e)
+
+def run_snapshot_restore_task(job_id, payload):
+    set_job_id(job_id)
+    try:
+        key_data = payload['key_data']
+        project_id = key_data['project_id']
+        object_name = payload.get('object') or ''
+        if not object_name.startswith(SNAPSHOT_PREFIX):
+            raise Exception(f"Snapshot object must be under {SNAPSHOT_PREFIX}")
+        token = get_access_token(key_data)
+        bucket_name = get_system_bucket(get_project_number(project_id, token), project_id)
+        dry_run = bool(payload.get('dry_run'))
+        jobs[job_id]["result"] = {"results": []}
+        jobs[job_id].update({"progress": 10, "status": "Planning" if dry_run else "Restoring"})
+
+        def on_result(result):
+            jobs[job_id]["result"]["results"].append(result)
+            jobs[job_id]["logs"].append(f"{result['action']} {result['kind']} {result['id']}: {result['status']}"
+                                        + (f" ({result['error']})" if result.get('error') else ""))
+
+        report = restore_snapshot(project_id, token, bucket_name, object_name, generation=payload.get('generation'),
+                                  concurrency=int(payload.get('concurrency', 4)), dry_run=dry_run, on_result=on_result)
+        jobs[job_id]["result"] = report
+        for reference in report["missing_references"]:
+            jobs[job_id]["logs"].append(f"Warning: {reference} is referenced by the snapshot but missing in {project_id}")
+        jobs[job_id]["logs"].append("Restore finished: " + ", ".join(f"{n} {status}" for status, n in sorted(report["summary"].items())))
+        jobs[job_id]["progress"] = 100
+        jobs[job_id]["status"] = "Failed" if report["summary"].get("failed") or report["summary"].get("not_started") else "Success"
+    except Exception as e:
+        jobs[job_id]["status"] = "Failed"
+        jobs[job_id]["logs"].append(f"Error: {str(e)}")
+        log.error("Job failed: %s", e)
+
+def new_invalidation_job(service_id):
+    job_id = f"invalidate_{service_id}_{int(time.time() * 1000)}"
+    jobs[job_id] = {
+        "status": "Starting",
+        "progress": 0,
+        "logs": [f"Cache invalidation for {service_id} initiated (collecting requests)..."]
+    }
+    return job_id
+
+def run_invalidation_task(target, batch):
+    project_id, service_id = target
+    job_id = batch["id"]
+    set_job_id(job_id)
+    try:
+        key_data = load_key_data(project_id)
+        project_id = key_data['project_id']
+        token = get_access_token(key_data)
+
+        bodies = plan_invalidations(tags=batch["tags"], targets=batch["targets"])
+        target_count = sum(len(paths) for paths in batch["targets"].values())
+        jobs[job_id]["logs"].append(
+            f"Coalesced {batch['requests']} request(s) ({target_count} host/path target(s), {len(batch['tags'])} tag(s)) into {len(bodies)} invalidation(s)."
+        )
+        jobs[job_id]["invalidations"] = bodies
+
+        url = f"https://networkservices.googleapis.com/v1alpha1/projects/{project_id}/locations/global/edgeCacheServices/{service_id}:invalidateCache"
+        operations = []
+        for idx, body in enumerate(bodies):
+            _INVALIDATION_LIMITER.acquire()
+            resp = make_gcp_request(url, method="POST", data=body, token=token)
+            operations.append(resp["name"])
+            jobs[job_id]["logs"].append(f"Invalidation {idx + 1}/{len(bodies)} submitted: {json.dumps(body)}")
+            jobs[job_id].update({"progress": int((idx + 1) / len(bodies) * 50), "status": f"Submitting ({idx + 1}/{len(bodies)})"})
+
+        pending = list(operations)
+        start_time = time.time()
+        while pending:
+            still_pending = []
+            for operation_name in pending:
+                op_resp = make_gcp_request(f"https://networkservices.googleapis.com/v1alpha1/{operation_name}", token=token)
+                if not op_resp.get("done"):
+                    still_pending.append(operation_name)
+                elif op_resp.get("error"):
+                    raise Exception(f"Invalidation failed: {op_resp['error']}")
+            pending = still_pending
+            if pending:
+                elapsed = int(time.time() - start_time)
+                done = len(operations) - len(pending)
+                jobs[job_id].update({"progress": 50 + int(done / len(operations) * 50), "status": f"Invalidating ({elapsed}s)"})
+                time.sleep(5)
+
+        jobs[job_id]["logs"].append("Cache invalidation completed.")
+        jobs[job_id]["progress"] = 100
+        jobs[job_id]["status"] = "Success"
+
+    except Exception as e:
+        jobs[job_id]["status"] = "Failed"
+        jobs[job_id]["logs"].append(f"Error: {str(e)}")
+        log.error("Job failed: %s", e)
+
+invalidation_coalescer = InvalidationCoalescer(run_invalidation_task)
+
+def warmup():
+    """Pre-loads token, project number, system bucket and inventory for every registered project."""
+    started = time.time()
+
+    def warm(ctx):
+        token = ctx.token()
+        project_number = get_project_number(ctx.project_id, token)
+        bucket_name = get_system_bucket(project_number, ctx.project_id)
+        get_inventory(ctx.project_id, token)
+        refresh_inventory_index(ctx)
+        return bucket_name
+
+    results, errors = registry.fan_out(warm)
+    for project_id, bucket_name in results.items():
+        log.info("Warmed up %s (bucket %s)", project_id, bucket_name)
+    for project_id, error in errors.items():
+        log.warning("Warmup skipped for %s: %s", project_id, error)
+    log.info("Warmup complete in %.2fs", time.time() - started)
+
+def run_server(port=6001, warmup_enabled=None):
+    configure_logging()
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    root_dir = os.path.dirname(backend_dir)
+    configure_disk_cache(os.path.join(root_dir, 'credentials', 'cache.json'))
 
-def run_server(port=6001):
     server_address = ('', port)
-    httpd = http.server.HTTPServer(server_address, RequestHandler)
-    print(f"Starting server on port {port}...")
-    httpd.serve_forever()
+    # Threaded so concurrent dashboard requests overlap (and can share upstream GETs)
+    httpd = http.server.ThreadingHTTPServer(server_address, RequestHandler)
+    log.info("Starting server on port %d...", port)
+
+    if warmup_enabled is None:
+        warmup_enabled = os.environ.get('WARMUP', '1') != '0'
+    if warmup_enabled:
+        # The socket is already listening; requests are accepted while warmup runs
+        threading.Thread(target=warmup, daemon=True).start()
+    drift_detector.start(DRIFT_INTERVAL, scan_drift_all)
+    try:
+        httpd.serve_forever()
+    finally:
+        shutdown_logging()
 
 if __name__ == '__main__':
     run_server()
@@ -6,11 +6,69 @@ import urllib.request
 import urllib.parse
 import subprocess
 import tempfile
+import threading
+import random
 import os
 
+from logging_setup import get_logger
+
+log = get_logger("gcp")
+
 # Project Number Cache
 _PROJECT_NUMBER_CACHE = {}
 
+# Access tokens keyed by service account email; refreshed this many seconds before expiry
+_TOKEN_CACHE = {}
+_TOKEN_LOCK = threading.Lock()
+TOKEN_REFRESH_MARGIN = 300
+
+# Bucket IAM policies, reused by checks for a short while
+_IAM_POLICY_CACHE = {}
+IAM_POLICY_TTL = 30
+IAM_MAX_RETRIES = 5
+
+# Identical concurrent GETs share one upstream call (see _singleflight_get)
+_INFLIGHT = {}
+_INFLIGHT_LOCK = threading.Lock()
+_SINGLEFLIGHT_STATS = {"upstream_gets": 0, "coalesced_gets": 0}
+_COALESCED_BY_URL = {}
+SINGLEFLIGHT_METRIC_KEYS = 500
+
+# Optional on-disk cache so values survive restarts (see configure_disk_cache)
+_DISK_CACHE_PATH = None
+_DISK_CACHE = {}
+_DISK_CACHE_LOCK = threading.Lock()
+
+def configure_disk_cache(path):
+    """Enables persistence of project numbers and other small values to a JSON file."""
+    global _DISK_CACHE_PATH, _DISK_CACHE
+    _DISK_CACHE_PATH = path
+    try:
+        with open(path, 'r') as f:
+            _DISK_CACHE = json.load(f)
+    except (OSError, ValueError):
+        _DISK_CACHE = {}
+    _PROJECT_NUMBER_CACHE.update(_DISK_CACHE.get("project_numbers", {}))
+
+def get_disk_cached(section, key):
+    return _DISK_CACHE.get(section, {}).get(key)
+
+def set_disk_cached(section, key, value):
+    """Stores a value and rewrites the cache file atomically."""
+    with _DISK_CACHE_LOCK:
+        if _DISK_CACHE.get(section, {}).get(key) == value:
+            return
+        _DISK_CACHE.setdefault(section, {})[key] = value
+        if not _DISK_CACHE_PATH:
+            return
+        tmp_path = f"{_DISK_CACHE_PATH}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(_DISK_CACHE, f, indent=2)
+            os.replace(tmp_path, _DISK_CACHE_PATH)
+        except OSError as e:
+            log.warning("Could not persist cache to %s: %s", _DISK_CACHE_PATH, e)
+
 def b64_encode(data):
     if isinstance(data, dict):
         data = json.dumps(data).encode()
@@ -19,6 +77,21 @@ def b64_encode(data):
     return base64.urlsafe_b64encode(data).decode().rstrip("=")
 
 def get_access_token(service_account_info):
+    """Returns a cached access token, minting a new one shortly before expiry."""
+    cache_key = service_account_info["client_email"]
+    cached = _TOKEN_CACHE.get(cache_key)
+    if cached and cached["expires_at"] - TOKEN_REFRESH_MARGIN > time.time():
+        return cached["token"]
+    with _TOKEN_LOCK:
+        # Another thread may have refreshed it while we waited
+        cached = _TOKEN_CACHE.get(cache_key)
+        if cached and cached["expires_at"] - TOKEN_REFRESH_MARGIN > time.time():
+            return cached["token"]
+        token, expires_in = _mint_access_token(service_account_info)
+        _TOKEN_CACHE[cache_key] = {"token": token, "expires_at": time.time() + expires_in}
+        return token
+
+def _mint_access_token(service_account_info):
     """Generates an access token using openssl CLI for signing."""
     now = int(time.time())
     header = {"alg": "RS256", "typ": "JWT"}
@@ -63,12 +136,13 @@ def get_access_token(service_account_info):
         req = urllib.request.Request("https://oauth2.googleapis.com/token", data=data)
         with urllib.request.urlopen(req, timeout=10) as f_req:
             resp = json.loads(f_req.read().decode())
-            return resp["access_token"]
+            return resp["access_token"], int(resp.get("expires_in", 3600))
     finally:
         if os.path.exists(key_path):
             os.remove(key_path)
 
-def make_gcp_request(url, method="GET", data=None, token=None):
+def _send_gcp_request(url, method, data, token):
+    """Performs one upstream call and returns the raw response text."""
     headers = {
         "Authorization": f"Bearer {token}",
         "Content-Type": "application/json"
@@ -79,10 +153,7 @@ def make_gcp_request(url, method="GET", data=None, token=None):
     
     try:
         with urllib.request.urlopen(req, timeout=30) as f:
-            content = f.read().decode()
-            if not content:
-                return {}
-            return json.loads(content)
+            return f.read().decode()
     except urllib.error.HTTPError as e:
         error_msg = e.read().decode()
         if e.code == 409:
@@ -91,6 +162,68 @@ def make_gcp_request(url, method="GET", data=None, token=None):
     except (urllib.error.URLError, socket.timeout) as e:
         raise Exception(f"Network Error (Timeout/Connection): {str(e)}")
 
+class _InflightCall:
+    def __init__(self):
+        self.done = threading.Event()
+        self.content = None
+        self.error = None
+        self.waiters = 0
+
+def _singleflight_get(url, token):
+    """Shares one upstream GET between concurrent callers asking for the same URL with the same token."""
+    key = (url, token)
+    with _INFLIGHT_LOCK:
+        call = _INFLIGHT.get(key)
+        leader = call is None
+        if leader:
+            call = _InflightCall()
+            _INFLIGHT[key] = call
+            _SINGLEFLIGHT_STATS["upstream_gets"] += 1
+        else:
+            call.waiters += 1
+            _SINGLEFLIGHT_STATS["coalesced_gets"] += 1
+            metric_key = url.split("?", 1)[0]
+            if metric_key in _COALESCED_BY_URL or len(_COALESCED_BY_URL) < SINGLEFLIGHT_METRIC_KEYS:
+                _COALESCED_BY_URL[metric_key] = _COALESCED_BY_URL.get(metric_key, 0) + 1
+
+    if not leader:
+        call.done.wait()
+    else:
+        try:
+            call.content = _send_gcp_request(url, "GET", None, token)
+        except Exception as e:
+            call.error = e
+        finally:
+            with _INFLIGHT_LOCK:
+                del _INFLIGHT[key]
+            call.done.set()
+
+    if call.error is not None:
+        raise Exception(str(call.error))
+    return call.content
+
+def get_request_metrics():
+    """Snapshot of upstream GET coalescing: totals, current waiters per URL and the most coalesced URLs."""
+    with _INFLIGHT_LOCK:
+        inflight = [{"url": url.split("?", 1)[0], "waiters": call.waiters} for (url, _), call in _INFLIGHT.items()]
+        top = sorted(_COALESCED_BY_URL.items(), key=lambda item: item[1], reverse=True)[:20]
+        return {
+            "upstream_gets": _SINGLEFLIGHT_STATS["upstream_gets"],
+            "coalesced_gets": _SINGLEFLIGHT_STATS["coalesced_gets"],
+            "inflight": inflight,
+            "top_coalesced": [{"url": url, "waiters": count} for url, count in top]
+        }
+
+def make_gcp_request(url, method="GET", data=None, token=None):
+    if method == "GET" and not data:
+        content = _singleflight_get(url, token)
+    else:
+        content = _send_gcp_request(url, method, data, token)
+    # Every caller parses its own copy, so shared GET results can be modified safely
+    if not content:
+        return {}
+    return json.loads(content)
+
 def get_project_number(project_id, token):
     if project_id in _PROJECT_NUMBER_CACHE:
         return _PROJECT_NUMBER_CACHE[project_id]
@@ -100,45 +233,67 @@ def get_project_number(project_id, token):
     num = resp.get("projectNumber")
     if num:
         _PROJECT_NUMBER_CACHE[project_id] = num
+        set_disk_cached("project_numbers", project_id, num)
     return num
 
-def check_bucket_iam(bucket_name, service_accounts, roles, token):
+def _bucket_iam_url(bucket_name):
+    return f"https://storage.googleapis.com/storage/v1/b/{bucket_name}/iam"
+
+def get_bucket_iam_policy(bucket_name, token, refresh=False):
+    """Returns a bucket's IAM policy, served from a short-lived cache unless refresh is set."""
+    cached = _IAM_POLICY_CACHE.get(bucket_name)
+    if cached and not refresh and time.time() - cached["fetched_at"] < IAM_POLICY_TTL:
+        return cached["policy"]
+    policy = make_gcp_request(_bucket_iam_url(bucket_name), token=token)
+    _IAM_POLICY_CACHE[bucket_name] = {"policy": policy, "fetched_at": time.time()}
+    return policy
+
+def _members_by_role(policy):
+    return {b.get("role"): set(b.get("members", [])) for b in policy.get("bindings", []) if not b.get("condition")}
+
+def check_bucket_iam(bucket_name, service_accounts, roles, token, refresh=False):
     """Checks if any of the service accounts have any of the roles on a bucket."""
-    url = f"https://storage.googleapis.com/storage/v1/b/{bucket_name}/iam"
-    policy = make_gcp_request(url, token=token)
-    
-    for binding in policy.get("bindings", []):
-        if binding.get("role") in roles:
-            for sa in service_accounts:
-                member = f"serviceAccount:{sa}"
-                if member in binding.get("members", []):
-                    return True
-    return False
+    by_role = _members_by_role(get_bucket_iam_policy(bucket_name, token, refresh))
+    members = {f"serviceAccount:{sa}" for sa in service_accounts}
+    return any(by_role.get(role, set()) & members for role in roles)
 
 def grant_bucket_iam(bucket_name, service_accounts, roles, token):
-    """Grants multiple roles to multiple service accounts on a bucket."""
-    url = f"https://storage.googleapis.com/storage/v1/b/{bucket_name}/iam"
-    policy = make_gcp_request(url, token=token)
-    
-    for role in roles:
-        found_role = False
-        for binding in policy.get("bindings", []):
-            if binding.get("role") == role:
-                for sa in service_accounts:
-                    member = f"serviceAccount:{sa}"
-                    if member not in binding.get("members", []):
-                        binding.setdefault("members", []).append(member)
-                found_role = True
-                break
-        
-        if not found_role:
-            policy.setdefault("bindings", []).append({
-                "role": role,
-                "members": [f"serviceAccount:{sa}" for sa in service_accounts]
-            })
-    
-    # Set the updated policy
-    return make_gcp_request(url, method="PUT", data=policy, token=token)
+    """Grants multiple roles to multiple service accounts on a bucket.
+
+    The policy is written back with its etag; if another writer changed it in
+    between, GCS answers 412 and the read-modify-write is retried.
+    """
+    url = _bucket_iam_url(bucket_name)
+    members = [f"serviceAccount:{sa}" for sa in service_accounts]
+    for attempt in range(IAM_MAX_RETRIES):
+        policy = get_bucket_iam_policy(bucket_name, token, refresh=True)
+        bindings = {b.get("role"): b for b in policy.get("bindings", []) if not b.get("condition")}
+        changed = False
+        for role in roles:
+            binding = bindings.get(role)
+            if binding is None:
+                binding = {"role": role, "members": []}
+                policy.setdefault("bindings", []).append(binding)
+                bindings[role] = binding
+            for member in members:
+                if member not in binding.setdefault("members", []):
+                    binding["members"].append(member)
+                    changed = True
+        if not changed:
+            return policy
+        try:
+            # Set the updated policy; the etag in the body makes this a conditional write
+            result = make_gcp_request(url, method="PUT", data=policy, token=token)
+        except Exception as e:
+            # The cached copy was modified in place above and is no longer what GCS holds
+            _IAM_POLICY_CACHE.pop(bucket_name, None)
+            if "412" not in str(e) and "409" not in str(e):
+                raise
+            time.sleep(min(2 ** attempt * 0.2, 5) * (0.5 + random.random()))
+            continue
+        _IAM_POLICY_CACHE[bucket_name] = {"policy": result, "fetched_at": time.time()}
+        return result
+    raise Exception(f"IAM policy for {bucket_name} kept changing; gave up after {IAM_MAX_RETRIES} attempts")
 
 def create_gcs_bucket(bucket_name, project_id, location, token):
     """Creates a GCS bucket with versioning enabled."""
@@ -158,8 +313,8 @@ def create_gcs_bucket(bucket_name, project_id, location, token):
             return make_gcp_request(url_patch, method="PATCH", data=patch_body, token=token)
         raise e
 
-def upload_gcs_object(bucket_name, object_name, data, token, content_type="application/json"):
-    """Uploads an object to GCS."""
+def upload_gcs_object(bucket_name, object_name, data, token, content_type="application/json", metadata=None):
+    """Uploads an object to GCS, with custom metadata (string values) when given."""
     # Simple upload (not resumable for small configs)
     url = f"https://storage.googleapis.com/upload/storage/v1/b/{bucket_name}/o?uploadType=media&name={object_name}"
     
@@ -173,6 +328,17 @@ def upload_gcs_object(bucket_name, object_name, data, token, content_type="appli
     else:
         encoded_data = data.encode() if isinstance(data, str) else data
 
+    if metadata:
+        # Multipart upload carries the object resource (with metadata) and the content in one request
+        boundary = f"mcm-{random.getrandbits(64):016x}"
+        resource = json.dumps({"name": object_name, "contentType": content_type, "metadata": metadata})
+        encoded_data = (
+            f"--{boundary}\r\nContent-Type: application/json; charset=UTF-8\r\n\r\n{resource}\r\n"
+            f"--{boundary}\r\nContent-Type: {content_type}\r\n\r\n"
+        ).encode() + encoded_data + f"\r\n--{boundary}--\r\n".encode()
+        url = f"https://storage.googleapis.com/upload/storage/v1/b/{bucket_name}/o?uploadType=multipart"
+        headers["Content-Type"] = f"multipart/related; boundary={boundary}"
+
     req = urllib.request.Request(url, data=encoded_data, headers=headers, method="POST")
     
     with urllib.request.urlopen(req, timeout=10) as f:
@@ -194,3 +360,124 @@ def get_gcs_object_content(bucket_name, object_name, generation, token):
     req = urllib.request.Request(url, headers=headers)
     with urllib.request.urlopen(req, timeout=10) as f:
         return f.read().decode()
+
+def iter_resources(url, items_key, token):
+    """Yields the items of a paginated GCP collection page by page, following nextPageToken."""
+    page_token = None
+    while True:
+        page_url = url
+        if page_token:
+            sep = "&" if "?" in url else "?"
+            page_url = f"{url}{sep}pageToken={urllib.parse.quote(page_token)}"
+        resp = make_gcp_request(page_url, token=token)
+        yield from resp.get(items_key, [])
+        page_token = resp.get("nextPageToken")
+        if not page_token:
+            return
+
+def list_all_resources(url, items_key, token):
+    """Lists every item of a paginated GCP collection by following nextPageToken."""
+    return list(iter_resources(url, items_key, token))
+
+# Resumable upload chunks must be multiples of 256 KiB
+GCS_UPLOAD_CHUNK = 8 * 256 * 1024
+
+class GcsUploadStream:
+    """Write-only file object that streams to a GCS object through a resumable upload session.
+
+    At most one chunk is buffered; close() sends the remainder and finalizes
+    the object, abort() cancels the session.
+    """
+
+    def __init__(self, bucket_name, object_name, token, content_type="application/octet-stream", chunk_size=GCS_UPLOAD_CHUNK,
+                 metadata=None):
+        self.token = token
+        self.chunk_size = chunk_size
+        self.offset = 0
+        self.result = None
+        self._buffer = bytearray()
+        self._closed = False
+        url = (f"https://storage.googleapis.com/upload/storage/v1/b/{bucket_name}/o"
+               f"?uploadType=resumable&name={urllib.parse.quote(object_name, safe='')}")
+        req = urllib.request.Request(url, data=json.dumps({"contentType": content_type, "metadata": metadata or {}}).encode(), method="POST", headers={
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json; charset=UTF-8",
+            "X-Upload-Content-Type": content_type
+        })
+        try:
+            with urllib.request.urlopen(req, timeout=30) as f:
+                self.session_url = f.headers["Location"]
+        except urllib.error.HTTPError as e:
+            raise Exception(f"GCP API Error: {e.code} - {e.read().decode()}")
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._buffer.extend(data)
+        while len(self._buffer) >= self.chunk_size:
+            self._send(bytes(self._buffer[:self.chunk_size]), final=False)
+            del self._buffer[:self.chunk_size]
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def _send(self, chunk, final):
+        end = self.offset + len(chunk) - 1
+        total = str(self.offset + len(chunk)) if final else "*"
+        content_range = f"bytes {self.offset}-{end}/{total}" if chunk else f"bytes */{total}"
+        req = urllib.request.Request(self.session_url, data=chunk, method="PUT", headers={
+            "Authorization": f"Bearer {self.token}",
+            "Content-Range": content_range
+        })
+        try:
+            with urllib.request.urlopen(req, timeout=120) as f:
+                body = f.read().decode()
+                if final:
+                    self.result = json.loads(body) if body else {}
+        except urllib.error.HTTPError as e:
+            # 308 Resume Incomplete acknowledges an intermediate chunk
+            if e.code != 308 or final:
+                raise Exception(f"GCP API Error: {e.code} - {e.read().decode()}")
+        except (urllib.error.URLError, socket.timeout) as e:
+            raise Exception(f"Network Error (Timeout/Connection): {str(e)}")
+        self.offset += len(chunk)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._send(bytes(self._buffer), final=True)
+        self._buffer.clear()
+
+    def abort(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            urllib.request.urlopen(urllib.request.Request(self.session_url, method="DELETE",
+                                                          headers={"Authorization": f"Bearer {self.token}"}), timeout=30)
+        except Exception as e:
+            # GCS answers 499 for a cancelled session
+            log.debug("Upload session cancelled: %s", e)
+
+def list_gcs_objects(bucket_name, prefix, token):
+    """Lists all (live) objects in a bucket under a prefix."""
+    url = f"https://storage.googleapis.com/storage/v1/b/{bucket_name}/o?prefix={urllib.parse.quote(prefix)}"
+    return list_all_resources(url, "items", token)
+
+def open_gcs_object(bucket_name, object_name, token, generation=None):
+    """Opens a GCS object for streaming reads. The caller must close the response."""
+    url = f"https://storage.googleapis.com/storage/v1/b/{bucket_name}/o/{urllib.parse.quote(object_name, safe='')}?alt=media"
+    if generation:
+        url += f"&generation={generation}"
+    headers = {"Authorization": f"Bearer {token}"}
+    req = urllib.request.Request(url, headers=headers)
+    return urllib.request.urlopen(req, timeout=60)
+
+def access_secret_version(secret_version, token):
+    """Returns the raw payload bytes of a Secret Manager secret version."""
+    url = f"https://secretmanager.googleapis.com/v1/{secret_version}:access"
+    resp = make_gcp_request(url, token=token)
+    return base64.b64decode(resp["payload"]["data"])
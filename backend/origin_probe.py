@@ -0,0 +1,191 @@
+import argparse
+import json
+import math
+import socket
+import ssl
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_SAMPLES = 5
+DEFAULT_TIMEOUT = 5.0
+MAX_CONCURRENCY = 32
+# Upper bounds for API callers: a probe request holds a server thread until every sample finishes
+MAX_SAMPLES = 50
+MAX_TIMEOUT = 30.0
+MAX_ORIGINS = 20
+# Origins answering fewer probes than this are never recommended
+MIN_SUCCESS_RATE = 0.8
+PHASES = ("dns_ms", "connect_ms", "tls_ms", "ttfb_ms", "total_ms")
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers (None when empty)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def normalize_target(origin):
+    """Maps an origin (as sent to /api/origin) to a connect host, port, TLS flag, Host header and path."""
+    address = origin.get("origin_dns") or origin.get("address") or origin.get("originAddress")
+    if not address:
+        raise Exception("Origin address is required")
+    protocol = (origin.get("protocol") or "HTTPS").upper()
+    path = origin.get("path") or "/"
+    if not path.startswith("/"):
+        path = "/" + path
+    if address.startswith("gs://"):
+        # Cloud Storage origins are fetched as storage.googleapis.com/<bucket>/<path>
+        bucket = address[5:].strip("/")
+        return {"host": "storage.googleapis.com", "port": 443, "tls": True,
+                "host_header": "storage.googleapis.com", "path": f"/{bucket}{path}", "protocol": "HTTPS"}
+    tls = protocol in ("HTTPS", "HTTP2")
+    port = int(origin.get("port") or (443 if tls else 80))
+    return {"host": address, "port": port, "tls": tls, "host_header": origin.get("host_header") or address,
+            "path": path, "protocol": protocol}
+
+
+def probe_once(target, timeout=DEFAULT_TIMEOUT, verify_tls=True, method="GET"):
+    """Times one request phase by phase. Returns a sample dict; failures carry 'error'."""
+    sample = {}
+    sock = None
+    start = time.perf_counter()
+    try:
+        infos = socket.getaddrinfo(target["host"], target["port"], type=socket.SOCK_STREAM)
+        t_dns = time.perf_counter()
+        sample["dns_ms"] = (t_dns - start) * 1000
+        family, socktype, proto, _, sockaddr = infos[0]
+        sample["address"] = sockaddr[0]
+
+        sock = socket.socket(family, socktype, proto)
+        sock.settimeout(timeout)
+        sock.connect(sockaddr)
+        t_connect = time.perf_counter()
+        sample["connect_ms"] = (t_connect - t_dns) * 1000
+
+        t_tls = t_connect
+        if target["tls"]:
+            context = ssl.create_default_context()
+            if not verify_tls:
+                context.check_hostname = False
+                context.verify_mode = ssl.CERT_NONE
+            # HTTP/2 origins are timed over HTTP/1.1 so the request can be written by hand
+            context.set_alpn_protocols(["http/1.1"])
+            sock = context.wrap_socket(sock, server_hostname=target["host_header"].split(":")[0])
+            t_tls = time.perf_counter()
+            sample["tls_ms"] = (t_tls - t_connect) * 1000
+            sample["tls_version"] = sock.version()
+
+        request = (
+            f"{method} {target['path']} HTTP/1.1\r\n"
+            f"Host: {target['host_header']}\r\n"
+            "User-Agent: media-cdn-manager-probe\r\n"
+            "Accept: */*\r\n"
+            "Connection: close\r\n\r\n"
+        )
+        sock.sendall(request.encode())
+        first = sock.recv(1024)
+        t_first = time.perf_counter()
+        if not first:
+            raise Exception("Connection closed before response")
+        sample["ttfb_ms"] = (t_first - t_tls) * 1000
+        status_line = first.split(b"\r\n", 1)[0].decode("latin-1")
+        parts = status_line.split(" ", 2)
+        sample["status"] = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else None
+        sample["total_ms"] = (t_first - start) * 1000
+    except Exception as e:
+        sample["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+    return sample
+
+
+def summarize(origin, target, samples):
+    ok = [s for s in samples if "error" not in s and s.get("status") and s["status"] < 500]
+    summary = {
+        "origin": origin.get("origin_dns") or origin.get("address") or origin.get("originAddress"),
+        "target": f"{target['host']}:{target['port']}{target['path']}",
+        "protocol": target["protocol"],
+        "host_header": target["host_header"],
+        "samples": len(samples),
+        "successes": len(ok),
+        "success_rate": round(len(ok) / len(samples), 3) if samples else 0,
+        "statuses": sorted({s["status"] for s in samples if s.get("status")}),
+        "errors": sorted({s["error"] for s in samples if "error" in s})[:5],
+    }
+    for phase in PHASES:
+        values = [s[phase] for s in ok if phase in s]
+        if values:
+            summary[phase] = {p: round(percentile(values, n), 2) for p, n in (("p50", 50), ("p90", 90), ("p99", 99))}
+            summary[phase]["min"] = round(min(values), 2)
+    return summary
+
+
+def probe_origin(origin, samples=DEFAULT_SAMPLES, timeout=DEFAULT_TIMEOUT, verify_tls=True):
+    """Probes one origin `samples` times (sequentially, so samples do not compete)."""
+    try:
+        target = normalize_target(origin)
+    except Exception as e:
+        return {"origin": origin.get("origin_dns") or origin.get("address"), "error": str(e), "samples": 0, "success_rate": 0}
+    results = [probe_once(target, timeout, verify_tls) for _ in range(max(1, int(samples)))]
+    return summarize(origin, target, results)
+
+
+def recommend(summaries):
+    """Picks the healthy origin with the lowest median DNS+TCP+TLS+first byte time (what a cache fill pays)."""
+    healthy = [s for s in summaries if s.get("success_rate", 0) >= MIN_SUCCESS_RATE and "total_ms" in s]
+    if not healthy:
+        return {"origin": None, "reason": "No origin answered reliably; check address, port, protocol and host header."}
+    best = min(healthy, key=lambda s: s["total_ms"]["p50"])
+    reason = f"Lowest median time to first byte ({best['total_ms']['p50']} ms, p90 {best['total_ms']['p90']} ms)"
+    if len(healthy) > 1:
+        runner_up = sorted(healthy, key=lambda s: s["total_ms"]["p50"])[1]
+        reason += f"; next best {runner_up['origin']} at {runner_up['total_ms']['p50']} ms"
+    return {"origin": best["origin"], "reason": reason}
+
+
+def probe_origins(origins, samples=DEFAULT_SAMPLES, timeout=DEFAULT_TIMEOUT, verify_tls=True, concurrency=None):
+    """Probes candidate origins concurrently; returns per-origin percentiles and a recommendation."""
+    workers = max(1, min(concurrency or len(origins) or 1, MAX_CONCURRENCY))
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        summaries = list(pool.map(lambda o: probe_origin(o, samples, timeout, verify_tls), origins))
+    return {
+        "origins": summaries,
+        "recommendation": recommend(summaries),
+        "elapsed_seconds": round(time.time() - started, 3)
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure DNS/TCP/TLS/TTFB latency of candidate origins.")
+    parser.add_argument("origins", nargs="+", help="host[:port] or gs://bucket")
+    parser.add_argument("--protocol", default="HTTPS", choices=["HTTP", "HTTPS", "HTTP2"])
+    parser.add_argument("--host-header", help="Host header to send (defaults to the origin address)")
+    parser.add_argument("--path", default="/", help="Request path to probe")
+    parser.add_argument("--samples", type=int, default=DEFAULT_SAMPLES)
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT)
+    parser.add_argument("--insecure", action="store_true", help="Skip TLS certificate verification")
+    args = parser.parse_args(argv)
+
+    origins = []
+    for value in args.origins:
+        address, port = value, None
+        if not value.startswith("gs://") and value.count(":") == 1:
+            address, port = value.split(":")
+        origins.append({"origin_dns": address, "port": port, "protocol": args.protocol,
+                        "host_header": args.host_header, "path": args.path})
+    report = probe_origins(origins, args.samples, args.timeout, verify_tls=not args.insecure)
+    json.dump(report, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+import http.client
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import xml.etree.ElementTree as ET
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+DEFAULT_CONCURRENCY = 16
+READ_CHUNK = 64 * 1024
+MAX_DASH_SEGMENTS = 100000
+# Failed URLs kept in stats; the error count is always exact
+MAX_FAILURES = 50
+
+_URI_ATTR_RE = re.compile(r'URI="([^"]+)"')
+_DASH_NS_RE = re.compile(r"^\{[^}]*\}")
+_TEMPLATE_VAR_RE = re.compile(r"\$(RepresentationID|Number|Time|Bandwidth)(?:%0(\d+)d)?\$")
+
+
+def parse_hls_playlist(text, base_url):
+    """Returns (child_playlists, segments) as absolute URLs from an HLS playlist."""
+    playlists, segments = [], []
+    expect_playlist = False
+    for raw in text.splitlines():
+        line = raw.strip()
+        if not line:
+            continue
+        if line.startswith("#"):
+            if line.startswith("#EXT-X-STREAM-INF"):
+                expect_playlist = True
+            for uri in _URI_ATTR_RE.findall(line):
+                absolute = urllib.parse.urljoin(base_url, uri)
+                if line.startswith(("#EXT-X-MEDIA", "#EXT-X-I-FRAME-STREAM-INF")) or uri.split("?")[0].endswith(".m3u8"):
+                    playlists.append(absolute)
+                else:
+                    # EXT-X-MAP init segments, EXT-X-PART parts, keys
+                    segments.append(absolute)
+            continue
+        absolute = urllib.parse.urljoin(base_url, line)
+        if expect_playlist or line.split("?")[0].endswith(".m3u8"):
+            playlists.append(absolute)
+        else:
+            segments.append(absolute)
+        expect_playlist = False
+    return playlists, segments
+
+
+def _parse_iso_duration(value):
+    match = re.match(r"^P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:([\d.]+)S)?)?$", value or "")
+    if not match:
+        return 0.0
+    days, hours, minutes, seconds = match.groups()
+    return int(days or 0) * 86400 + int(hours or 0) * 3600 + int(minutes or 0) * 60 + float(seconds or 0)
+
+
+def _expand_template(template, rep_id, bandwidth, number=None, time_value=None):
+    def repl(m):
+        name, width = m.group(1), m.group(2)
+        value = {"RepresentationID": rep_id, "Bandwidth": bandwidth, "Number": number, "Time": time_value}[name]
+        if width and isinstance(value, int):
+            return str(value).zfill(int(width))
+        return str(value)
+    return _TEMPLATE_VAR_RE.sub(repl, template)
+
+
+def _strip_ns(root):
+    for el in root.iter():
+        el.tag = _DASH_NS_RE.sub("", el.tag)
+    return root
+
+
+def parse_dash_mpd(text, base_url):
+    """Returns segment URLs (init + media) for every representation in a static MPD."""
+    root = _strip_ns(ET.fromstring(text))
+    total = _parse_iso_duration(root.get("mediaPresentationDuration"))
+    urls = []
+
+    def base_of(el, current):
+        node = el.find("BaseURL")
+        return urllib.parse.urljoin(current, node.text.strip()) if node is not None and node.text else current
+
+    mpd_base = base_of(root, base_url)
+    for period in root.findall("Period"):
+        period_base = base_of(period, mpd_base)
+        for aset in period.findall("AdaptationSet"):
+            aset_base = base_of(aset, period_base)
+            aset_template = aset.find("SegmentTemplate")
+            for rep in aset.findall("Representation"):
+                rep_base = base_of(rep, aset_base)
+                rep_id = rep.get("id", "")
+                bandwidth = int(rep.get("bandwidth", 0) or 0)
+                template = rep.find("SegmentTemplate")
+                if template is None:
+                    template = aset_template
+                seg_list = rep.find("SegmentList")
+                if template is not None:
+                    init = template.get("initialization")
+                    if init:
+                        urls.append(urllib.parse.urljoin(rep_base, _expand_template(init, rep_id, bandwidth)))
+                    media = template.get("media")
+                    if not media:
+                        continue
+                    start_number = int(template.get("startNumber", 1))
+                    timeline = template.find("SegmentTimeline")
+                    if timeline is not None:
+                        number, t = start_number, 0
+                        for s in timeline.findall("S"):
+                            t = int(s.get("t", t))
+                            d = int(s.get("d"))
+                            for _ in range(int(s.get("r", 0)) + 1):
+                                urls.append(urllib.parse.urljoin(rep_base, _expand_template(media, rep_id, bandwidth, number, t)))
+                                number += 1
+                                t += d
+                    else:
+                        timescale = int(template.get("timescale", 1))
+                        duration = int(template.get("duration", 0) or 0)
+                        count = int(-(-total * timescale // duration)) if duration and total else 0
+                        for i in range(min(count, MAX_DASH_SEGMENTS)):
+                            urls.append(urllib.parse.urljoin(rep_base, _expand_template(media, rep_id, bandwidth, start_number + i, i * duration)))
+                elif seg_list is not None:
+                    init = seg_list.find("Initialization")
+                    if init is not None and init.get("sourceURL"):
+                        urls.append(urllib.parse.urljoin(rep_base, init.get("sourceURL")))
+                    for seg in seg_list.findall("SegmentURL"):
+                        if seg.get("media"):
+                            urls.append(urllib.parse.urljoin(rep_base, seg.get("media")))
+                else:
+                    urls.append(rep_base)
+    return urls
+
+
+class Prewarmer:
+    """Crawls manifests and pulls every referenced object through the edge once.
+
+    Requests run on a bounded thread pool; scheduling stops once `byte_budget`
+    bytes have been downloaded. `progress` is called with a stats dict.
+    """
+
+    def __init__(self, concurrency=DEFAULT_CONCURRENCY, byte_budget=None, progress=None, timeout=30, headers=None):
+        self.concurrency = max(1, int(concurrency))
+        self.byte_budget = byte_budget
+        self.progress = progress or (lambda stats: None)
+        self.timeout = timeout
+        self.headers = headers or {}
+        self.stats = {"manifests": 0, "segments": 0, "queued": 0, "bytes": 0, "errors": 0,
+                      "cache_hits": 0, "budget_exhausted": False}
+        self._lock = threading.Lock()
+        self._seen = set()
+
+    def _fetch(self, url, keep_body):
+        req = urllib.request.Request(url, headers=self.headers)
+        with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+            cache_status = resp.headers.get("X-Cache-Status", "")
+            if keep_body:
+                body = resp.read()
+                size = len(body)
+            else:
+                body, size = None, 0
+                while True:
+                    chunk = resp.read(READ_CHUNK)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+        with self._lock:
+            self.stats["bytes"] += size
+            if "hit" in cache_status.lower():
+                self.stats["cache_hits"] += 1
+        return body
+
+    def _over_budget(self):
+        return self.byte_budget is not None and self.stats["bytes"] >= self.byte_budget
+
+    def _task(self, url, is_manifest):
+        """Fetches one object; manifests return newly discovered (url, is_manifest) work."""
+        try:
+            if not is_manifest:
+                self._fetch(url, keep_body=False)
+                with self._lock:
+                    self.stats["segments"] += 1
+                return []
+            text = self._fetch(url, keep_body=True).decode("utf-8", errors="replace")
+            with self._lock:
+                self.stats["manifests"] += 1
+            if url.split("?")[0].endswith(".mpd") or text.lstrip().startswith("<"):
+                return [(u, False) for u in parse_dash_mpd(text, url)]
+            playlists, segments = parse_hls_playlist(text, url)
+            return [(u, True) for u in playlists] + [(u, False) for u in segments]
+        except (urllib.error.URLError, OSError, http.client.HTTPException, ET.ParseError, ValueError, TypeError) as e:
+            # One bad object (truncated body, malformed manifest attribute) must not fail the crawl
+            error = f"{type(e).__name__}: {e}"
+            with self._lock:
+                self.stats["errors"] += 1
+                self.stats["last_error"] = f"{url}: {error}"
+                failures = self.stats.setdefault("failures", [])
+                if len(failures) < MAX_FAILURES:
+                    failures.append({"url": url, "error": error})
+            return []
+
+    def run(self, manifest_urls):
+        # Manifests are served first so discovery stays ahead of segment downloads
+        manifests, segments = deque(), deque()
+        for url in manifest_urls:
+            if url not in self._seen:
+                self._seen.add(url)
+                manifests.append(url)
+        self.stats["queued"] = len(manifests)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            running = set()
+            while manifests or segments or running:
+                while (manifests or segments) and len(running) < self.concurrency * 2 and not self._over_budget():
+                    if manifests:
+                        running.add(pool.submit(self._task, manifests.popleft(), True))
+                    else:
+                        running.add(pool.submit(self._task, segments.popleft(), False))
+                if self._over_budget():
+                    self.stats["budget_exhausted"] = True
+                    manifests.clear()
+                    segments.clear()
+                if not running:
+                    break
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    for url, is_manifest in future.result():
+                        if url not in self._seen:
+                            self._seen.add(url)
+                            (manifests if is_manifest else segments).append(url)
+                            self.stats["queued"] += 1
+                self.progress(dict(self.stats))
+        return dict(self.stats)
+
+
+def prewarm(manifest_urls, concurrency=DEFAULT_CONCURRENCY, byte_budget=None, progress=None):
+    """Convenience wrapper returning final crawl stats."""
+    started = time.time()
+    stats = Prewarmer(concurrency, byte_budget, progress).run(manifest_urls)
+    stats["elapsed_seconds"] = round(time.time() - started, 2)
+    return stats
@@ -0,0 +1,138 @@
+import glob
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from logging_setup import get_logger
+from media_cdn_api import get_access_token
+
+log = get_logger("projects")
+
+# Concurrent upstream calls allowed per project during fan-out listings
+UPSTREAM_POOL_SIZE = 8
+ALL_PROJECTS = ("*", "all")
+
+
+class ProjectContext:
+    """Credentials and per-project state: cached token and a bounded upstream worker pool."""
+
+    def __init__(self, key_data, source):
+        self.key_data = key_data
+        self.project_id = key_data["project_id"]
+        self.source = source
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._closed = False
+
+    def token(self):
+        return get_access_token(self.key_data)
+
+    def map(self, fn, items):
+        """Runs fn over items on this project's pool, preserving order."""
+        with self._pool_lock:
+            if self._closed:
+                # Replaced by a newer key while a request still held this context
+                results = None
+            else:
+                # Created lazily so projects that are never queried cost no threads
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=UPSTREAM_POOL_SIZE, thread_name_prefix=f"gcp-{self.project_id}")
+                # Submitted under the lock so close() cannot shut the pool down mid-submit
+                results = self._pool.map(fn, items)
+        if results is None:
+            return [fn(item) for item in items]
+        return list(results)
+
+    def close(self):
+        """Releases the worker pool; work already queued still finishes."""
+        with self._pool_lock:
+            self._closed = True
+            if self._pool is not None:
+                self._pool.shutdown(wait=False)
+                self._pool = None
+
+
+class ProjectRegistry:
+    """Service-account keys from credentials/key.json (the default) and credentials/projects/*.json.
+
+    Key files are re-read when their modification time changes, so adding a
+    project does not require a restart.
+    """
+
+    def __init__(self, credentials_dir):
+        self.credentials_dir = credentials_dir
+        self._contexts = {}
+        self._mtimes = {}
+        self._default = None
+        self._lock = threading.Lock()
+
+    def _key_files(self):
+        files = [os.path.join(self.credentials_dir, "key.json")]
+        files += sorted(glob.glob(os.path.join(self.credentials_dir, "projects", "*.json")))
+        return [f for f in files if os.path.exists(f)]
+
+    def reload(self):
+        with self._lock:
+            files = self._key_files()
+            mtimes = {f: os.path.getmtime(f) for f in files}
+            if mtimes == self._mtimes:
+                return
+            contexts, default = {}, None
+            for path in files:
+                try:
+                    with open(path, "r") as f:
+                        key_data = json.load(f)
+                except (OSError, ValueError) as e:
+                    log.warning("Skipping unreadable key file %s: %s", path, e)
+                    continue
+                project_id = key_data.get("project_id")
+                if not project_id or "private_key" not in key_data:
+                    log.warning("Skipping %s: not a service account key", path)
+                    continue
+                previous = self._contexts.get(project_id)
+                if previous and previous.key_data == key_data:
+                    # Unchanged key: keep its warm caches and pool
+                    contexts[project_id] = previous
+                else:
+                    contexts[project_id] = ProjectContext(key_data, path)
+                if default is None:
+                    default = project_id
+            kept = {id(ctx) for ctx in contexts.values()}
+            for ctx in self._contexts.values():
+                if id(ctx) not in kept:
+                    # Replaced or removed key: its pool threads would otherwise never exit
+                    ctx.close()
+            self._contexts = contexts
+            self._default = default
+            self._mtimes = mtimes
+
+    def projects(self):
+        self.reload()
+        return list(self._contexts.values())
+
+    def get(self, project_id=None):
+        """Returns the context for project_id, or the default project when it is empty."""
+        self.reload()
+        project_id = project_id or self._default
+        if project_id is None:
+            raise Exception("No service account key found in credentials/")
+        ctx = self._contexts.get(project_id)
+        if ctx is None:
+            raise Exception(f"Unknown project: {project_id}")
+        return ctx
+
+    def fan_out(self, fn, max_workers=None):
+        """Calls fn(ctx) for every project concurrently; returns (results, errors) keyed by project ID."""
+        contexts = self.projects()
+        results, errors = {}, {}
+        if not contexts:
+            return results, errors
+        with ThreadPoolExecutor(max_workers=max_workers or len(contexts)) as pool:
+            futures = {ctx.project_id: pool.submit(fn, ctx) for ctx in contexts}
+            for project_id, future in futures.items():
+                try:
+                    results[project_id] = future.result()
+                except Exception as e:
+                    errors[project_id] = str(e)
+        return results, errors
@@ -0,0 +1,274 @@
+import argparse
+import gzip
+import json
+import re
+import sys
+import time
+import urllib.parse
+from collections import Counter
+
+from config_validator import compile_path_template, find_shadowed_rules
+
+# Upper bound on memoized path lookups; sample files repeat the same paths a lot
+MATCH_CACHE_SIZE = 100000
+
+
+def _match_rule_regex(match_rule):
+    """Returns the unanchored regex source for the path part of a matchRule, or None if it has none."""
+    if "fullPathMatch" in match_rule:
+        source = re.escape(match_rule["fullPathMatch"])
+    elif "prefixMatch" in match_rule:
+        source = re.escape(match_rule["prefixMatch"]) + ".*"
+    elif "pathTemplateMatch" in match_rule:
+        source = compile_path_template(match_rule["pathTemplateMatch"]).pattern[1:-1]
+    else:
+        return None
+    if match_rule.get("ignoreCase"):
+        return f"(?i:{source})"
+    return source
+
+
+def _value_matches(spec, value):
+    """Applies presentMatch/exactMatch/prefixMatch/suffixMatch/regexMatch to a value (None when absent)."""
+    if "presentMatch" in spec:
+        return (value is not None) == bool(spec["presentMatch"])
+    if value is None:
+        return False
+    if "exactMatch" in spec:
+        return value == spec["exactMatch"]
+    if "prefixMatch" in spec:
+        return value.startswith(spec["prefixMatch"])
+    if "suffixMatch" in spec:
+        return value.endswith(spec["suffixMatch"])
+    if "regexMatch" in spec:
+        return re.fullmatch(spec["regexMatch"], value) is not None
+    return True
+
+
+def conditions_match(match_rule, query, headers):
+    """True when the request's query parameters ({name: [values]}) and headers satisfy the matchRule."""
+    for qm in match_rule.get("queryParameterMatches", []):
+        values = query.get(qm.get("name"))
+        if values is None:
+            if not _value_matches(qm, None):
+                return False
+        elif not any(_value_matches(qm, v) for v in values):
+            return False
+    for hm in match_rule.get("headerMatches", []):
+        value = headers.get(str(hm.get("headerName", "")).lower())
+        matched = _value_matches(hm, value)
+        if matched == bool(hm.get("invertMatch")):
+            return False
+    return True
+
+
+def describe_cache_behaviour(rule):
+    """Summarizes the cdnPolicy of a route rule for reports."""
+    policy = rule.get("routeAction", {}).get("cdnPolicy", {})
+    mode = policy.get("cacheMode", "CACHE_ALL_STATIC")
+    if mode == "BYPASS_CACHE":
+        ttl = "bypass"
+    elif mode == "USE_ORIGIN_HEADERS":
+        ttl = "origin"
+    else:
+        ttl = policy.get("defaultTtl", "3600s")
+    return {
+        "cacheMode": mode,
+        "defaultTtl": ttl,
+        "clientTtl": policy.get("clientTtl"),
+        "signedRequestMode": policy.get("signedRequestMode", "DISABLED"),
+        "cacheKeyPolicy": policy.get("cacheKeyPolicy", {})
+    }
+
+
+class RouteMatcher:
+    """Priority-ordered matcher compiled from a service's routing section.
+
+    Each pathMatcher becomes one alternation regex ordered by priority, so a
+    lookup is a single regex call; the first alternative that matches is the
+    rule Media CDN would select. matchRules with header or query parameter
+    conditions are kept aside and checked per request, only ahead of the
+    path-only winner.
+    """
+
+    def __init__(self, service_body):
+        routing = service_body.get("routing", {})
+        self.rules = []
+        self.shadowed = []
+        self._compiled = {}
+        self._conditional = {}
+        self._cache = {}
+
+        for pm in routing.get("pathMatchers", []):
+            pm_name = pm.get("name")
+            route_rules = pm.get("routeRules", [])
+            ordered = sorted(enumerate(route_rules), key=lambda item: (int(item[1].get("priority", 999)), item[0]))
+            alternatives = []
+            group_to_rule = {}
+            conditional = []
+            for idx, rule in ordered:
+                rule_id = len(self.rules)
+                info = {
+                    "id": rule_id,
+                    "pathMatcher": pm_name,
+                    "index": idx,
+                    "priority": int(rule.get("priority", 999)),
+                    "description": rule.get("description", ""),
+                    "patterns": [mr.get("pathTemplateMatch") or mr.get("prefixMatch") or mr.get("fullPathMatch") for mr in rule.get("matchRules", [])],
+                    "conditional": False
+                }
+                info.update(describe_cache_behaviour(rule))
+                self.rules.append(info)
+                for m_idx, mr in enumerate(rule.get("matchRules", [])):
+                    source = _match_rule_regex(mr)
+                    if source is None:
+                        continue
+                    if mr.get("headerMatches") or mr.get("queryParameterMatches"):
+                        info["conditional"] = True
+                        conditional.append((rule_id, re.compile(f"^(?:{source})$"), mr))
+                        continue
+                    group = f"r{rule_id}_{m_idx}"
+                    group_to_rule[group] = rule_id
+                    alternatives.append(f"(?P<{group}>{source})")
+            regex = re.compile("^(?:" + "|".join(alternatives) + ")$") if alternatives else None
+            self._compiled[pm_name] = (regex, group_to_rule)
+            self._conditional[pm_name] = conditional
+            for idx, prio, prev_idx, prev_prio in find_shadowed_rules(route_rules):
+                self.shadowed.append({
+                    "pathMatcher": pm_name,
+                    "index": idx,
+                    "priority": prio,
+                    "shadowedByIndex": prev_idx,
+                    "shadowedByPriority": prev_prio
+                })
+
+        self._exact_hosts = {}
+        self._wildcard_hosts = []
+        self._default_matcher = None
+        for hr in routing.get("hostRules", []):
+            for host in hr.get("hosts", []):
+                host = host.lower()
+                if host == "*":
+                    self._default_matcher = hr.get("pathMatcher")
+                elif host.startswith("*."):
+                    self._wildcard_hosts.append((host[1:], hr.get("pathMatcher")))
+                else:
+                    self._exact_hosts[host] = hr.get("pathMatcher")
+        if self._default_matcher is None and routing.get("hostRules"):
+            self._default_matcher = routing["hostRules"][0].get("pathMatcher")
+        self._wildcard_hosts.sort(key=lambda item: len(item[0]), reverse=True)
+
+    def path_matcher_for_host(self, host=None):
+        if host:
+            host = host.lower().split(":")[0]
+            if host in self._exact_hosts:
+                return self._exact_hosts[host]
+            for suffix, pm_name in self._wildcard_hosts:
+                if host.endswith(suffix):
+                    return pm_name
+        return self._default_matcher
+
+    def match(self, path, host=None, headers=None):
+        """Returns the rule info dict that serves `path` (query string included), or None if nothing matches.
+
+        `headers` is any mapping of request headers; conditions on headers it
+        does not contain are evaluated as if the header were absent.
+        """
+        path, _, query = path.split("#", 1)[0].partition("?")
+        path = path or "/"
+        pm_name = self.path_matcher_for_host(host)
+        key = (host, path)
+        if key in self._cache:
+            rule = self._cache[key]
+        else:
+            regex, group_to_rule = self._compiled.get(pm_name, (None, {}))
+            rule = None
+            if regex is not None:
+                m = regex.match(path)
+                if m:
+                    rule = self.rules[group_to_rule[m.lastgroup]]
+            if len(self._cache) >= MATCH_CACHE_SIZE:
+                self._cache.clear()
+            self._cache[key] = rule
+
+        conditional = self._conditional.get(pm_name)
+        if conditional:
+            params = urllib.parse.parse_qs(query, keep_blank_values=True)
+            lowered = {str(k).lower(): v for k, v in (headers or {}).items()}
+            for rule_id, regex, mr in conditional:
+                if rule is not None and rule_id >= rule["id"]:
+                    break
+                if regex.match(path) and conditions_match(mr, params, lowered):
+                    return self.rules[rule_id]
+        return rule
+
+
+def simulate(service_body, paths, host=None, headers=None):
+    """Runs sample paths through the service's routing and reports per-rule hits and TTLs."""
+    matcher = RouteMatcher(service_body)
+    hits = Counter()
+    ttl_hits = Counter()
+    mode_hits = Counter()
+    unmatched = Counter()
+    total = 0
+    start = time.time()
+
+    for path in paths:
+        total += 1
+        rule = matcher.match(path, host, headers)
+        if rule is None:
+            unmatched[path.split("?", 1)[0]] += 1
+            continue
+        hits[rule["id"]] += 1
+        ttl_hits[rule["defaultTtl"]] += 1
+        mode_hits[rule["cacheMode"]] += 1
+
+    elapsed = time.time() - start
+    rules = []
+    for rule in matcher.rules:
+        entry = dict(rule)
+        entry["hits"] = hits[rule["id"]]
+        entry["share"] = round(entry["hits"] / total, 4) if total else 0
+        rules.append(entry)
+
+    return {
+        "total": total,
+        "matched": total - sum(unmatched.values()),
+        "unmatched": sum(unmatched.values()),
+        "top_unmatched": [{"path": p, "count": c} for p, c in unmatched.most_common(20)],
+        "rules": rules,
+        "never_hit": [r["id"] for r in rules if r["hits"] == 0],
+        "shadowed": matcher.shadowed,
+        "ttl_distribution": dict(ttl_hits.most_common()),
+        "cache_mode_distribution": dict(mode_hits.most_common()),
+        "elapsed_seconds": round(elapsed, 3),
+        "paths_per_second": int(total / elapsed) if elapsed > 0 else total
+    }
+
+
+def iter_paths(filename):
+    """Yields request paths from a text file (one per line, optionally gzipped)."""
+    opener = gzip.open if filename.endswith(".gz") else open
+    with opener(filename, "rt") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield line
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate which route rule serves each sample path.")
+    parser.add_argument("service", help="Service config JSON file (API or system bucket format)")
+    parser.add_argument("paths", help="File with one request path per line (.gz supported)")
+    parser.add_argument("--host", help="Host header to route with (defaults to the '*' host rule)")
+    args = parser.parse_args(argv)
+
+    with open(args.service, "r") as f:
+        service_body = json.load(f)
+    report = simulate(service_body, iter_paths(args.paths), host=args.host)
+    json.dump(report, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+import gzip
+import json
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fleet import (API_BASE, DEFAULT_CONCURRENCY, OPERATION_POLL_INTERVAL, _short, normalize_refs, fetch_live,
+                   compute_plan, apply_plan)
+from config_validator import READ_ONLY_FIELDS
+from logging_setup import get_logger
+from media_cdn_api import iter_resources, list_all_resources, list_gcs_objects, open_gcs_object, GcsUploadStream
+
+log = get_logger("snapshot")
+
+SNAPSHOT_FORMAT = "media-cdn-manager/snapshot"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_PREFIX = "snapshots/"
+# Services are restored this many at a time, so only one batch of bodies is held in memory
+RESTORE_BATCH = 50
+# Per-kind export spools move to a temp file beyond this size
+SPOOL_MEMORY = 1024 * 1024
+
+# Archive order is restore order: references, origins, then services
+EXPORT_KINDS = {
+    "keyset": (f"{API_BASE}/projects/{{project_id}}/locations/global/edgeCacheKeysets", "edgeCacheKeysets"),
+    "certificate": ("https://certificatemanager.googleapis.com/v1/projects/{project_id}/locations/global/certificates", "certificates"),
+    "origin": (f"{API_BASE}/projects/{{project_id}}/locations/global/edgeCacheOrigins", "edgeCacheOrigins"),
+    "service": (f"{API_BASE}/projects/{{project_id}}/locations/global/edgeCacheServices", "edgeCacheServices"),
+}
+# Keysets and certificates are recorded as references only: shared keys live in
+# Secret Manager and certificate private keys cannot be exported
+REFERENCE_FIELDS = {
+    "keyset": ("name", "description", "labels", "publicKeys", "validationSharedKeys"),
+    "certificate": ("name", "description", "labels", "scope", "sanDnsnames", "expireTime", "managed"),
+}
+
+
+def snapshot_name(project_id, when=None):
+    return f"{SNAPSHOT_PREFIX}{project_id}-{time.strftime('%Y%m%dT%H%M%SZ', time.gmtime(when))}.jsonl.gz"
+
+
+def _record(kind, item):
+    if kind in REFERENCE_FIELDS:
+        return {"kind": kind, "id": _short(item["name"]),
+                "reference": {k: item[k] for k in REFERENCE_FIELDS[kind] if k in item}}
+    body = {k: v for k, v in item.items() if k not in READ_ONLY_FIELDS}
+    return {"kind": kind, "id": _short(item["name"]), "body": body}
+
+
+def export_snapshot(project_id, token, bucket_name, object_name, concurrency=DEFAULT_CONCURRENCY, on_progress=None):
+    """Writes every origin, service, keyset and certificate reference to one gzip JSON Lines object.
+
+    Kinds are listed concurrently into spools, then streamed in restore order
+    through a resumable upload. Returns the object name, generation, size and counts.
+    """
+    on_progress = on_progress or (lambda kind, count: None)
+    spools = {kind: tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY) for kind in EXPORT_KINDS}
+
+    def export_kind(kind):
+        url, items_key = EXPORT_KINDS[kind]
+        count = 0
+        for item in iter_resources(url.format(project_id=project_id), items_key, token):
+            if item.get("name"):
+                spools[kind].write((json.dumps(_record(kind, item)) + "\n").encode())
+                count += 1
+        on_progress(kind, count)
+        return count
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(int(concurrency), len(EXPORT_KINDS)))) as pool:
+            counts = dict(zip(EXPORT_KINDS, pool.map(export_kind, EXPORT_KINDS)))
+        header = {"format": SNAPSHOT_FORMAT, "version": SNAPSHOT_VERSION, "project": project_id,
+                  "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), "counts": counts}
+        metadata = {"snapshot-version": str(SNAPSHOT_VERSION), "project": project_id}
+        metadata.update({f"{kind}-count": str(count) for kind, count in counts.items()})
+        stream = GcsUploadStream(bucket_name, object_name, token, content_type="application/gzip", metadata=metadata)
+        try:
+            with gzip.GzipFile(filename="", mode="wb", fileobj=stream) as archive:
+                archive.write((json.dumps(header) + "\n").encode())
+                for kind in EXPORT_KINDS:
+                    spools[kind].seek(0)
+                    shutil.copyfileobj(spools[kind], archive)
+            stream.close()
+        except Exception:
+            stream.abort()
+            raise
+    finally:
+        for spool in spools.values():
+            spool.close()
+    return {"object": object_name, "generation": stream.result.get("generation"),
+            "size": int(stream.result.get("size", stream.offset)), "counts": counts}
+
+
+def list_snapshots(bucket_name, token):
+    try:
+        objects = list_gcs_objects(bucket_name, SNAPSHOT_PREFIX, token)
+    except Exception as e:
+        if "404" not in str(e):
+            raise
+        return []
+    return sorted(({"object": o["name"], "generation": o.get("generation"), "size": int(o.get("size", 0)),
+                    "updated": o.get("updated"), "metadata": o.get("metadata", {})} for o in objects),
+                  key=lambda s: s["updated"] or "", reverse=True)
+
+
+def read_snapshot(bucket_name, object_name, token, generation=None):
+    """Yields the header, then each record, decompressing the object as it downloads."""
+    resp = open_gcs_object(bucket_name, object_name, token, generation)
+    with resp, gzip.GzipFile(fileobj=resp, mode="rb") as archive:
+        header = json.loads(archive.readline() or b"{}")
+        if header.get("format") != SNAPSHOT_FORMAT:
+            raise Exception(f"{object_name} is not a snapshot archive")
+        if header.get("version", 0) > SNAPSHOT_VERSION:
+            raise Exception(f"Snapshot version {header['version']} is newer than supported ({SNAPSHOT_VERSION})")
+        yield header
+        for line in archive:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _restore_batch(definitions, live, project_id, token, concurrency, dry_run, poll_interval, on_result):
+    results = []
+    plan = compute_plan(definitions, live)
+    rejected = {}
+    for error in plan["errors"]:
+        rejected.setdefault(error["resource"], []).append(error["message"])
+    if rejected:
+        # Invalid resources are reported and the rest of the batch still restored
+        definitions = [d for d in definitions if f"{d['kind']}/{d['id']}" not in rejected]
+        results.extend({"kind": r.split("/", 1)[0], "id": r.split("/", 1)[-1], "action": "restore", "status": "failed",
+                        "error": "; ".join(messages)} for r, messages in rejected.items())
+        plan = compute_plan(definitions, live)
+        if plan["errors"]:
+            results.extend({"kind": d["kind"], "id": d["id"], "action": "restore", "status": "failed",
+                            "error": plan["errors"][0]["message"]} for d in definitions)
+            definitions = []
+    if definitions:
+        results.extend({"kind": a["kind"], "id": a["id"], "action": a["action"], "status": "unchanged"}
+                       for a in plan["actions"] if a["action"] == "noop")
+        if dry_run:
+            results.extend({"kind": a["kind"], "id": a["id"], "action": a["action"], "status": "planned",
+                            "update_mask": a.get("update_mask")} for a in plan["actions"] if a["action"] != "noop")
+        else:
+            results.extend(apply_plan(plan, definitions, project_id, token, concurrency=concurrency,
+                                      poll_interval=poll_interval))
+    restored = {(r["kind"], r["id"]) for r in results if r["status"] in ("done", "unchanged", "planned")}
+    for d in definitions:
+        if (d["kind"], d["id"]) in restored:
+            # Later batches validate their origin references against what is now in place
+            live[d["kind"]][d["id"]] = d["body"]
+    for result in results:
+        on_result(result)
+    return results
+
+
+def restore_snapshot(project_id, token, bucket_name, object_name, generation=None, concurrency=DEFAULT_CONCURRENCY,
+                     dry_run=False, on_result=None, poll_interval=OPERATION_POLL_INTERVAL):
+    """Creates or patches the origins and services of a snapshot in project_id.
+
+    Origins are gathered first and applied in failover order; services then
+    stream through in batches of RESTORE_BATCH. Keyset and certificate
+    references are checked for presence, not recreated. References are
+    rewritten to project_id, so a snapshot can be restored into another project.
+    """
+    on_result = on_result or (lambda result: None)
+    records = read_snapshot(bucket_name, object_name, token, generation)
+    header = next(records)
+    live = fetch_live(project_id, token, concurrency)
+    present = {kind: {_short(item.get("name")) for item in list_all_resources(url.format(project_id=project_id), items_key, token)}
+               for kind, (url, items_key) in EXPORT_KINDS.items() if kind in REFERENCE_FIELDS}
+    report = {"snapshot": object_name, "source_project": header.get("project"), "created_at": header.get("created_at"),
+              "dry_run": dry_run, "missing_references": [], "results": []}
+    origins, batch = [], []
+
+    def flush(definitions):
+        report["results"].extend(_restore_batch(definitions, live, project_id, token, concurrency, dry_run,
+                                                poll_interval, on_result))
+
+    for record in records:
+        kind = record.get("kind")
+        if kind in REFERENCE_FIELDS:
+            if record["id"] not in present[kind]:
+                report["missing_references"].append(f"{kind}/{record['id']}")
+            continue
+        if kind not in ("origin", "service"):
+            log.warning("Skipping unknown snapshot record kind: %s", kind)
+            continue
+        definition = {"kind": kind, "id": record["id"], "body": normalize_refs(kind, record["body"], project_id),
+                      "source": object_name}
+        if kind == "origin":
+            origins.append(definition)
+            continue
+        if origins is not None:
+            if origins:
+                flush(origins)
+            origins = None
+        batch.append(definition)
+        if len(batch) >= RESTORE_BATCH:
+            flush(batch)
+            batch = []
+    if origins:
+        flush(origins)
+    if batch:
+        flush(batch)
+    if report["missing_references"]:
+        log.warning("Snapshot %s references resources missing from %s: %s", object_name, project_id,
+                    ", ".join(report["missing_references"]))
+    summary = {}
+    for result in report["results"]:
+        summary[result["status"]] = summary.get(result["status"], 0) + 1
+    report["summary"] = summary
+    return report
@@ -0,0 +1,395 @@
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import os
+import re
+import sys
+import time
+import urllib.parse
+from concurrent.futures import ProcessPoolExecutor
+
+# Batches smaller than this are signed in-process; worker start-up costs more than it saves
+PARALLEL_THRESHOLD = 2000
+CHUNK_SIZE = 500
+
+ALGORITHMS = ["HMAC_SHA_256", "ED25519"]
+
+
+# --- Ed25519 (RFC 8032), pure Python so no third-party crypto package is required ---
+
+_P = 2 ** 255 - 19
+_Q = 2 ** 252 + 27742317777372353535851937790883648493
+_D = -121665 * pow(121666, _P - 2, _P) % _P
+_SQRT_M1 = pow(2, (_P - 1) // 4, _P)
+
+
+def _recover_x(y, sign):
+    x2 = (y * y - 1) * pow(_D * y * y + 1, _P - 2, _P)
+    x = pow(x2, (_P + 3) // 8, _P)
+    if (x * x - x2) % _P != 0:
+        x = x * _SQRT_M1 % _P
+    if (x & 1) != sign:
+        x = _P - x
+    return x
+
+
+_GY = 4 * pow(5, _P - 2, _P) % _P
+_GX = _recover_x(_GY, 0)
+_G = (_GX, _GY, 1, _GX * _GY % _P)
+
+
+def _point_add(p1, p2):
+    a = (p1[1] - p1[0]) * (p2[1] - p2[0]) % _P
+    b = (p1[1] + p1[0]) * (p2[1] + p2[0]) % _P
+    c = 2 * p1[3] * p2[3] * _D % _P
+    d = 2 * p1[2] * p2[2] % _P
+    e, f, g, h = b - a, d - c, d + c, b + a
+    return (e * f % _P, g * h % _P, f * g % _P, e * h % _P)
+
+
+def _point_mul(s, point):
+    result = (0, 1, 1, 0)
+    while s > 0:
+        if s & 1:
+            result = _point_add(result, point)
+        point = _point_add(point, point)
+        s >>= 1
+    return result
+
+
+def _point_equal(p1, p2):
+    return (p1[0] * p2[2] - p2[0] * p1[2]) % _P == 0 and (p1[1] * p2[2] - p2[1] * p1[2]) % _P == 0
+
+
+def _point_decompress(data):
+    if len(data) != 32:
+        return None
+    y = int.from_bytes(data, "little")
+    sign = y >> 255
+    y &= (1 << 255) - 1
+    if y >= _P:
+        return None
+    x = _recover_x(y, sign)
+    if (x * x * (_D * y * y + 1) - (y * y - 1)) % _P != 0:
+        return None
+    return (x, y, 1, x * y % _P)
+
+
+# Precomputed 2^i * G so base-point multiplication needs additions only
+_G_POWERS = [_G]
+for _ in range(255):
+    _G_POWERS.append(_point_add(_G_POWERS[-1], _G_POWERS[-1]))
+
+
+def _base_mul(s):
+    result = (0, 1, 1, 0)
+    i = 0
+    while s > 0:
+        if s & 1:
+            result = _point_add(result, _G_POWERS[i])
+        s >>= 1
+        i += 1
+    return result
+
+
+def _point_compress(point):
+    zinv = pow(point[2], _P - 2, _P)
+    x = point[0] * zinv % _P
+    y = point[1] * zinv % _P
+    return int.to_bytes(y | ((x & 1) << 255), 32, "little")
+
+
+def _sha512_mod_q(data):
+    return int.from_bytes(hashlib.sha512(data).digest(), "little") % _Q
+
+
+class Ed25519Key:
+    """Ed25519 signing key built from a 32-byte seed; the public half is derived once."""
+
+    def __init__(self, seed):
+        seed = seed[:32]
+        if len(seed) != 32:
+            raise ValueError("Ed25519 private key must be 32 bytes")
+        h = hashlib.sha512(seed).digest()
+        a = int.from_bytes(h[:32], "little")
+        a &= (1 << 254) - 8
+        a |= 1 << 254
+        self._a = a
+        self._prefix = h[32:]
+        self.public_key = _point_compress(_base_mul(a))
+
+    def sign(self, message):
+        r = _sha512_mod_q(self._prefix + message)
+        r_enc = _point_compress(_base_mul(r))
+        k = _sha512_mod_q(r_enc + self.public_key + message)
+        s = (r + k * self._a) % _Q
+        return r_enc + int.to_bytes(s, 32, "little")
+
+
+def ed25519_verify(public_key, message, signature):
+    """Verifies an Ed25519 signature against a 32-byte public key."""
+    if len(signature) != 64:
+        return False
+    a_point = _point_decompress(public_key)
+    r_point = _point_decompress(signature[:32])
+    if a_point is None or r_point is None:
+        return False
+    s = int.from_bytes(signature[32:], "little")
+    if s >= _Q:
+        return False
+    k = _sha512_mod_q(signature[:32] + public_key + message)
+    return _point_equal(_base_mul(s), _point_add(r_point, _point_mul(k, a_point)))
+
+
+# --- Token construction ---
+
+def decode_key(value):
+    """Decodes a base64/base64url key string (padding optional) into raw bytes."""
+    value = value.strip()
+    value += "=" * (-len(value) % 4)
+    return base64.urlsafe_b64decode(value.replace("+", "-").replace("/", "_"))
+
+
+class TokenSigner:
+    """Mints Media CDN dual-token (hdnts/hdntl) values with a fixed key and algorithm."""
+
+    def __init__(self, key, algorithm="HMAC_SHA_256"):
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Unsupported signature algorithm '{algorithm}' (expected one of {', '.join(ALGORITHMS)})")
+        self.algorithm = algorithm
+        self.key = key
+        self._ed_key = Ed25519Key(key) if algorithm == "ED25519" else None
+
+    def sign_token(self, expires, url_prefix=None, full_path=None, path_globs=None, starts=None,
+                   session_id=None, data=None, headers=None, ip_ranges=None):
+        """Returns a token string such as 'URLPrefix=...~Expires=...~hmac=...'."""
+        fields = []
+        to_sign = []
+        if url_prefix:
+            encoded = base64.urlsafe_b64encode(url_prefix.encode()).decode()
+            fields.append(f"URLPrefix={encoded}")
+            to_sign.append(f"URLPrefix={encoded}")
+        elif path_globs:
+            fields.append(f"PathGlobs={path_globs}")
+            to_sign.append(f"PathGlobs={path_globs}")
+        elif full_path:
+            # FullPath is signed but only its marker travels in the token
+            fields.append("FullPath")
+            to_sign.append(f"FullPath={full_path}")
+        if starts:
+            fields.append(f"Starts={int(starts)}")
+            to_sign.append(f"Starts={int(starts)}")
+        fields.append(f"Expires={int(expires)}")
+        to_sign.append(f"Expires={int(expires)}")
+        if session_id:
+            fields.append(f"SessionID={session_id}")
+            to_sign.append(f"SessionID={session_id}")
+        if data:
+            fields.append(f"Data={data}")
+            to_sign.append(f"Data={data}")
+        if headers:
+            fields.append("Headers=" + ",".join(name for name, _ in headers))
+            to_sign.append("Headers=" + ",".join(f"{name}={value}" for name, value in headers))
+        if ip_ranges:
+            fields.append(f"IPRanges={ip_ranges}")
+            to_sign.append(f"IPRanges={ip_ranges}")
+
+        message = "~".join(to_sign).encode()
+        if self._ed_key:
+            signature = base64.urlsafe_b64encode(self._ed_key.sign(message)).decode()
+            fields.append(f"Signature={signature}")
+        else:
+            fields.append("hmac=" + hmac.new(self.key, message, hashlib.sha256).hexdigest())
+        return "~".join(fields)
+
+    def sign_url(self, base_url, path, expires, url_prefix=None, path_globs=None, param="hdnts", **kwargs):
+        """Returns base_url + path with the token appended as a query parameter."""
+        url = base_url.rstrip("/") + "/" + path.lstrip("/")
+        if url_prefix is True:
+            # Scope the token to the title directory so child playlists and segments validate too
+            url_prefix = url.split("?", 1)[0].rsplit("/", 1)[0] + "/"
+        token = self.sign_token(
+            expires,
+            url_prefix=url_prefix or None,
+            path_globs=path_globs,
+            full_path=None if (url_prefix or path_globs) else urllib.parse.urlsplit(url).path,
+            **kwargs
+        )
+        sep = "&" if "?" in url else "?"
+        return f"{url}{sep}{param}={token}"
+
+
+def _glob_to_regex(glob):
+    out = []
+    for part in re.split(r"(\*\*|\*)", glob):
+        if part == "**":
+            out.append(".*")
+        elif part == "*":
+            out.append("[^/]*")
+        else:
+            out.append(re.escape(part))
+    return re.compile("^" + "".join(out) + "$")
+
+
+def verify_token(token, url, keys, request_headers=None, now=None):
+    """Checks a dual-token value the way the edge would.
+
+    `keys` is a list of (algorithm, key_bytes) pairs; HMAC entries hold the shared
+    secret and Ed25519 entries the public key. Returns (valid, reason).
+    """
+    now = now or time.time()
+    fields = token.split("~")
+    signed = []
+    values = {}
+    signature = None
+    for field in fields:
+        name, _, value = field.partition("=")
+        if name in ("hmac", "Signature"):
+            signature = (name, value)
+            break
+        if name == "FullPath":
+            signed.append("FullPath=" + urllib.parse.urlsplit(url).path)
+        elif name == "Headers":
+            headers = request_headers or {}
+            signed.append("Headers=" + ",".join(f"{h}={headers.get(h, '')}" for h in value.split(",") if h))
+        else:
+            signed.append(field)
+        values[name] = value
+    if signature is None:
+        return False, "Token has no signature"
+    if "Expires" not in values:
+        return False, "Token has no Expires field"
+    try:
+        if int(values["Expires"]) < now:
+            return False, "Token expired"
+        if "Starts" in values and int(values["Starts"]) > now:
+            return False, "Token not yet valid"
+    except ValueError:
+        return False, "Malformed time field"
+
+    if "URLPrefix" in values:
+        try:
+            prefix = decode_key(values["URLPrefix"]).decode()
+        except (ValueError, UnicodeDecodeError):
+            return False, "Malformed URLPrefix"
+        if not url.startswith(prefix):
+            return False, "URL does not match URLPrefix"
+    elif "PathGlobs" in values:
+        path = urllib.parse.urlsplit(url).path
+        if not any(_glob_to_regex(g).match(path) for g in values["PathGlobs"].split(",")):
+            return False, "Path does not match PathGlobs"
+
+    message = "~".join(signed).encode()
+    for algorithm, key in keys:
+        if signature[0] == "hmac" and algorithm == "HMAC_SHA_256":
+            expected = hmac.new(key, message, hashlib.sha256).hexdigest()
+            if hmac.compare_digest(expected, signature[1]):
+                return True, "ok"
+        elif signature[0] == "Signature" and algorithm == "ED25519":
+            try:
+                raw = decode_key(signature[1])
+            except ValueError:
+                return False, "Malformed signature"
+            if ed25519_verify(key, message, raw):
+                return True, "ok"
+    return False, "Signature mismatch"
+
+
+# --- Batch signing ---
+
+_worker_signer = None
+
+
+def _init_worker(key, algorithm):
+    global _worker_signer
+    _worker_signer = TokenSigner(key, algorithm)
+
+
+def _sign_chunk(args):
+    base_url, items, options = args
+    return [_worker_signer.sign_url(base_url, path, expires, **options) for path, expires in items]
+
+
+def sign_urls(key, algorithm, base_url, paths, expires_in=3600, expires=None, workers=None,
+              url_prefix=None, path_globs=None, param="hdnts", session_id=None, data=None):
+    """Signs many URLs, fanning out across processes (at most one per CPU) for large batches.
+
+    Process fan-out forks, so long-running multi-threaded callers such as the
+    HTTP server should pass workers=1.
+
+    `paths` items are either a path string or a (path, expires) pair; unpaired
+    paths expire at `expires` or now + `expires_in` seconds.
+    """
+    default_expiry = int(expires or (time.time() + int(expires_in)))
+    items = [(p, default_expiry) if isinstance(p, str) else (p[0], int(p[1])) for p in paths]
+    options = {"url_prefix": url_prefix, "path_globs": path_globs, "param": param,
+               "session_id": session_id, "data": data}
+
+    workers = max(1, min(int(workers or os.cpu_count() or 1), os.cpu_count() or 1))
+    if workers <= 1 or len(items) < PARALLEL_THRESHOLD:
+        _init_worker(key, algorithm)
+        return _sign_chunk((base_url, items, options))
+
+    chunks = [(base_url, items[i:i + CHUNK_SIZE], options) for i in range(0, len(items), CHUNK_SIZE)]
+    urls = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(key, algorithm)) as pool:
+        for result in pool.map(_sign_chunk, chunks):
+            urls.extend(result)
+    return urls
+
+
+def benchmark(key, algorithm, count=20000, workers=None):
+    """Signs `count` synthetic master-manifest URLs and reports throughput."""
+    paths = [f"/vod/title-{i}/manifest.m3u8" for i in range(count)]
+    start = time.time()
+    sign_urls(key, algorithm, "https://cdn.example.com", paths, workers=workers, url_prefix=True)
+    elapsed = time.time() - start
+    return {
+        "algorithm": algorithm,
+        "tokens": count,
+        "workers": workers or os.cpu_count() or 1,
+        "elapsed_seconds": round(elapsed, 3),
+        "tokens_per_second": int(count / elapsed) if elapsed > 0 else count
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mint Media CDN dual-token (hdnts) signed URLs in bulk.")
+    key_group = parser.add_mutually_exclusive_group(required=True)
+    key_group.add_argument("--key", help="Base64 key (HMAC secret or 32-byte Ed25519 seed)")
+    key_group.add_argument("--key-file", help="File with the raw key bytes")
+    parser.add_argument("--algorithm", default="HMAC_SHA_256", choices=ALGORITHMS)
+    parser.add_argument("--base-url", help="Edge base URL, e.g. https://cdn.example.com")
+    parser.add_argument("--paths", help="File with one path per line (defaults to stdin)")
+    parser.add_argument("--ttl", type=int, default=3600, help="Token lifetime in seconds")
+    parser.add_argument("--url-prefix", nargs="?", const=True, help="Scope tokens to a URL prefix (default: each path's directory)")
+    parser.add_argument("--path-globs", help="Comma-separated PathGlobs to scope tokens to")
+    parser.add_argument("--param", default="hdnts", help="Token query parameter name")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: CPU count)")
+    parser.add_argument("--benchmark", type=int, metavar="N", help="Sign N synthetic URLs and report tokens/second")
+    args = parser.parse_args(argv)
+
+    if args.key_file:
+        with open(args.key_file, "rb") as f:
+            key = f.read()
+    else:
+        key = decode_key(args.key)
+
+    if args.benchmark:
+        print(json.dumps(benchmark(key, args.algorithm, args.benchmark, args.workers), indent=2))
+        return
+    if not args.base_url:
+        parser.error("--base-url is required unless --benchmark is used")
+
+    stream = open(args.paths, "r") if args.paths else sys.stdin
+    with stream:
+        paths = [line.strip() for line in stream if line.strip()]
+    for url in sign_urls(key, args.algorithm, args.base_url, paths, expires_in=args.ttl, workers=args.workers,
+                         url_prefix=args.url_prefix, path_globs=args.path_globs, param=args.param):
+        print(url)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import threading
+
+from cache_invalidator import InvalidationCoalescer, add_targets, collapse_paths, plan_invalidations
+
+
+def _plan(*requests):
+    targets = {}
+    for paths, hosts in requests:
+        add_targets(targets, paths, hosts)
+    return plan_invalidations(targets=targets)
+
+
+def test_host_only_and_path_only_requests_keep_their_targets():
+    bodies = _plan(([], ["H1"]), (["/x"], []))
+    assert {"host": "h1", "path": "/*"} in bodies
+    assert {"path": "/x"} in bodies
+    assert len(bodies) == 2
+
+
+def test_host_specific_path_covered_by_global_purge_is_dropped():
+    bodies = _plan((["/live/*"], []), (["/live/a.ts", "/vod/b.ts"], ["h1"]))
+    assert bodies == [{"path": "/live/*"}, {"host": "h1", "path": "/vod/b.ts"}]
+
+
+def test_identical_targets_are_deduped():
+    assert _plan((["/a"], ["h1"]), (["/a"], ["H1"])) == [{"host": "h1", "path": "/a"}]
+
+
+def test_single_request_behaviour():
+    assert plan_invalidations(paths=["/a"], hosts=["h1", "h2"], tags=["t"]) == [
+        {"host": "h1", "path": "/a"}, {"host": "h2", "path": "/a"}, {"cacheTags": ["t"]}]
+    assert plan_invalidations(hosts=["h1"]) == [{"host": "h1", "path": "/*"}]
+
+
+def test_collapse_paths():
+    siblings = [f"/seg/{i}.ts" for i in range(25)]
+    assert collapse_paths(siblings + ["/seg/0.ts", "/other"]) == ["/seg/*", "/other"]
+
+
+def test_coalescer_merges_without_narrowing():
+    flushed = threading.Event()
+    batches = []
+
+    def flush(service_id, batch):
+        batches.append(batch)
+        flushed.set()
+
+    ids = iter(["b1", "b2"])
+    coalescer = InvalidationCoalescer(flush, window=0.05)
+    assert coalescer.submit("svc", hosts=["H1"], new_batch_id=lambda: next(ids)) == ("b1", False)
+    assert coalescer.submit("svc", paths=["/x"], new_batch_id=lambda: next(ids)) == ("b1", True)
+    assert flushed.wait(5)
+    bodies = plan_invalidations(tags=batches[0]["tags"], targets=batches[0]["targets"])
+    assert sorted(bodies, key=str) == sorted([{"host": "h1", "path": "/*"}, {"path": "/x"}], key=str)
+
+
+def test_root_level_files_are_not_collapsed_into_a_full_purge():
+    paths = [f"/seg{i}.ts" for i in range(20)]
+    assert plan_invalidations(paths=paths) == [{"path": p} for p in sorted(paths)]
+    bodies = plan_invalidations(paths=paths, hosts=["a.com"])
+    assert {"host": "a.com", "path": "/*"} not in bodies
+    assert len(bodies) == 20
+    assert plan_invalidations(paths=[f"/live/seg{i}.ts" for i in range(20)]) == [{"path": "/live/*"}]
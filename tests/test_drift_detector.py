@@ -0,0 +1,44 @@
+import json
+
+import drift_detector
+from config_model import ServiceConfig
+from drift_detector import CONTENT_HASH_KEY, DriftDetector, drift_hash
+
+ROUTING = {"hostRules": [{"hosts": ["video.example.com"], "pathMatcher": "routes"}],
+           "pathMatchers": [{"name": "routes", "routeRules": [{"priority": "1", "matchRules": [{"prefixMatch": "/"}],
+                                                              "origin": "origin-a"}]}]}
+
+
+def _service(description, routing=ROUTING):
+    return {"name": "projects/p/locations/global/edgeCacheServices/svc", "description": description,
+            "routing": routing, "etag": description}
+
+
+def test_drift_hash_ignores_description():
+    staged = ServiceConfig.from_api(_service("[STAGING] notes"))
+    assert drift_hash(staged) == drift_hash(ServiceConfig.from_api(_service("production")))
+    assert staged.description == "[STAGING] notes"
+    changed = dict(ROUTING, hostRules=[{"hosts": ["other.example.com"], "pathMatcher": "routes"}])
+    assert drift_hash(staged) != drift_hash(ServiceConfig.from_api(_service("production", changed)))
+
+
+def test_scan_matches_metadata_hash_without_downloading(monkeypatch):
+    stored = ServiceConfig.from_api(_service("[STAGING] notes"))
+    objects = [{"name": "svc.json", "generation": "1", "metadata": {CONTENT_HASH_KEY: drift_hash(stored)}}]
+    live = [_service("production")]
+    downloads = []
+    monkeypatch.setattr(drift_detector, "list_all_resources", lambda url, key, token: live)
+    monkeypatch.setattr(drift_detector, "list_gcs_objects", lambda bucket, prefix, token: objects)
+    monkeypatch.setattr(drift_detector, "get_gcs_object_content",
+                        lambda *args: downloads.append(args) or json.dumps(stored.to_dict()))
+
+    report = DriftDetector().scan("p", "token", "bucket")
+    assert report["services"]["svc"]["status"] == "in_sync"
+    assert report["stats"]["fingerprint_matches"] == 1
+    assert downloads == []
+
+    # A changed live body misses the hash and is diffed against the stored generation
+    live[0] = _service("edited", dict(ROUTING, hostRules=[{"hosts": ["other.example.com"], "pathMatcher": "routes"}]))
+    report = DriftDetector().scan("p", "token", "bucket")
+    assert report["services"]["svc"]["status"] == "drifted"
+    assert len(downloads) == 1
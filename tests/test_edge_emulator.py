@@ -0,0 +1,92 @@
+import http.server
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from edge_emulator import EdgeEmulator, compute_cache_ttl, serve
+
+SERVICE = {"routing": {
+    "hostRules": [{"hosts": ["*"], "pathMatcher": "routes"}],
+    "pathMatchers": [{"name": "routes", "routeRules": [
+        {"priority": "1", "description": "all", "origin": "primary", "matchRules": [{"prefixMatch": "/"}],
+         "routeAction": {"cdnPolicy": {"cacheMode": "FORCE_CACHE_ALL", "defaultTtl": "3600s", "negativeCaching": True,
+                                       "negativeCachingPolicy": {"404": "5s"}}}},
+    ]}]}}
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start(server):
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _get(port, path):
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=10) as resp:
+            return resp.status, resp.headers.get("X-Cache-Status")
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers.get("X-Cache-Status")
+
+
+def _metrics(emulator, outcome):
+    # Handlers record metrics after the response is written
+    deadline = time.time() + 5
+    while True:
+        metrics = emulator.metrics.snapshot(emulator.cache)
+        if outcome in metrics["outcomes"] or time.time() > deadline:
+            return metrics
+        time.sleep(0.01)
+
+
+def test_negative_caching_ttls():
+    policy = SERVICE["routing"]["pathMatchers"][0]["routeRules"][0]["routeAction"]["cdnPolicy"]
+    assert compute_cache_ttl(policy, 404, {}) == 5
+    assert compute_cache_ttl(policy, 410, {}) == 0
+    assert compute_cache_ttl({"negativeCaching": True}, 404, {}) == 120
+    assert compute_cache_ttl({}, 404, {}) == 0
+    assert compute_cache_ttl({"cacheMode": "BYPASS_CACHE", "negativeCaching": True}, 404, {}) == 0
+
+
+def test_unreachable_origin_returns_502_and_is_recorded():
+    emulator = EdgeEmulator(SERVICE, f"http://127.0.0.1:{_free_port()}")
+    server = _start(serve(emulator, port=0))
+    try:
+        assert _get(server.server_address[1], "/a.ts") == (502, "origin_error")
+        metrics = _metrics(emulator, "origin_error")
+        assert metrics["outcomes"]["origin_error"] == 1
+        assert metrics["statuses"]["502"] == 1
+    finally:
+        server.shutdown()
+
+
+def test_origin_404_is_negatively_cached():
+    requests = []
+
+    class Origin(http.server.BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            requests.append(self.path)
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+    origin = _start(http.server.ThreadingHTTPServer(("127.0.0.1", 0), Origin))
+    emulator = EdgeEmulator(SERVICE, f"http://127.0.0.1:{origin.server_address[1]}")
+    server = _start(serve(emulator, port=0))
+    try:
+        port = server.server_address[1]
+        assert _get(port, "/missing.ts") == (404, "miss")
+        assert _get(port, "/missing.ts") == (404, "hit")
+        assert requests == ["/missing.ts"]
+    finally:
+        server.shutdown()
+        origin.shutdown()
@@ -0,0 +1,131 @@
+import http.server
+import json
+import threading
+import time
+import urllib.parse
+
+import pytest
+
+from edge_metrics import EdgePerformance, choose_period, _epoch, _rfc3339
+
+END = 1_699_999_980  # a multiple of 60, 300 and 3600
+LATENCIES = {"REDUCE_PERCENTILE_50": 20.0, "REDUCE_PERCENTILE_95": 80.0, "REDUCE_PERCENTILE_99": 150.0}
+
+
+class _Monitoring(http.server.BaseHTTPRequestHandler):
+    """Answers timeSeries queries with one point per alignment period of the requested interval."""
+
+    def do_GET(self):
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+        self.server.requests.append(query)
+        time.sleep(self.server.delay)
+        metric = query["filter"][0].split('"')[1].rsplit("/", 1)[-1]
+        start, end = _epoch(query["interval.startTime"][0]), _epoch(query["interval.endTime"][0])
+        period = int(query["aggregation.alignmentPeriod"][0].rstrip("s"))
+        grid = range(start + period, end + 1, period)
+
+        def series(value, labels=None):
+            return {"metric": {"labels": labels or {}},
+                    "points": [{"interval": {"endTime": _rfc3339(t)}, "value": value} for t in reversed(grid)]}
+
+        if metric == "request_count":
+            # Cache results arrive on separate pages, as a paginated response would
+            if "pageToken" in query:
+                body = {"timeSeries": [series({"int64Value": "1"}, {"cache_result": "MISS"})]}
+            else:
+                body = {"timeSeries": [series({"int64Value": "3"}, {"cache_result": "HIT"})], "nextPageToken": "2"}
+        elif metric == "response_bytes_count":
+            body = {"timeSeries": [series({"int64Value": "1000"})]}
+        else:
+            body = {"timeSeries": [series({"doubleValue": LATENCIES[query["aggregation.crossSeriesReducer"][0]]})]}
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def monitoring():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Monitoring)
+    server.requests = []
+    server.delay = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+
+
+def _performance(server):
+    return EdgePerformance(api_base=f"http://127.0.0.1:{server.server_address[1]}")
+
+
+def test_choose_period_keeps_points_within_limit():
+    assert choose_period(3600, 60) == 60
+    assert choose_period(6 * 3600, 120) == 300
+    assert choose_period(7 * 86400, 10) == 86400
+    assert choose_period(3600, 0) == 3600
+
+
+def test_query_snaps_window_and_aligns_grid(monitoring):
+    result = _performance(monitoring).query("p", "token", "svc", window=3600, points=60, end=END + 45)
+    assert result["period_seconds"] == 60
+    assert result["end"] == _rfc3339(END)
+    assert result["start"] == _rfc3339(END - 3600)
+    assert len(result["timestamps"]) == 60
+    assert result["timestamps"][0] == _rfc3339(END - 3600 + 60)
+    assert result["timestamps"][-1] == _rfc3339(END)
+
+    request = monitoring.requests[0]
+    assert request["interval.startTime"] == [_rfc3339(END - 3600)]
+    assert request["interval.endTime"] == [_rfc3339(END)]
+    assert request["aggregation.alignmentPeriod"] == ["60s"]
+
+
+def test_hit_ratio_and_totals(monitoring):
+    result = _performance(monitoring).query("p", "token", "svc", window=3600, points=60, end=END)
+    series = result["series"]
+    assert series["requests"] == [4] * 60
+    assert series["cache_hit_ratio"] == [0.75] * 60
+    assert series["requests_per_second"][0] == round(4 / 60, 3)
+    assert series["latency_ms_p95"] == [80.0] * 60
+    assert result["totals"] == {"requests": 240, "egress_bytes": 60000, "cache_hit_ratio": 0.75,
+                                "by_cache_result": {"HIT": 180, "MISS": 60}}
+
+
+def test_narrower_window_is_sliced_from_cache(monitoring):
+    performance = _performance(monitoring)
+    performance.query("p", "token", "svc", window=3600, points=60, end=END)
+    upstream = len(monitoring.requests)
+
+    result = performance.query("p", "token", "svc", window=1800, points=30, end=END + 10)
+    assert result["source"] == "cache"
+    assert result["period_seconds"] == 60
+    assert len(result["timestamps"]) == 30
+    assert result["series"]["requests"] == [4] * 30
+    assert len(monitoring.requests) == upstream
+    assert performance.stats == {"fetches": 1, "hits": 1, "coalesced": 0}
+
+
+def test_concurrent_identical_queries_fetch_once(monitoring):
+    monitoring.delay = 0.2
+    performance = _performance(monitoring)
+    results = []
+
+    def run():
+        results.append(performance.query("p", "token", "svc", window=3600, points=60, end=END))
+
+    threads = [threading.Thread(target=run) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert performance.stats == {"fetches": 1, "hits": 0, "coalesced": 3}
+    # One request per series, plus the second page of request counts
+    assert len(monitoring.requests) == 6
+    assert sorted(r["source"] for r in results) == ["coalesced"] * 3 + ["upstream"]
+    assert all(r["series"] == results[0]["series"] for r in results)
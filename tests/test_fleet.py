@@ -0,0 +1,127 @@
+import os
+
+import pytest
+
+from fleet import compute_plan, load_definitions, normalize_refs, parse_definitions, parse_yaml, update_mask
+
+SAMPLES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sample-configs")
+
+
+def _origin(address, failover=None):
+    body = {"originAddress": address, "protocol": "HTTPS", "port": 443}
+    if failover:
+        body["failoverOrigin"] = failover
+    return body
+
+
+def _service(origin, priority=1):
+    return {"routing": {"hostRules": [{"hosts": ["*"], "pathMatcher": "routes"}],
+                        "pathMatchers": [{"name": "routes", "routeRules": [
+                            {"priority": priority, "matchRules": [{"prefixMatch": "/"}], "origin": origin}]}]}}
+
+
+def _definitions(origins=None, services=None):
+    return parse_definitions({"origins": [dict(body, name=oid) for oid, body in (origins or {}).items()],
+                              "services": [dict(body, name=sid) for sid, body in (services or {}).items()]},
+                             "test.yaml", "proj")
+
+
+def _live(origins=None, services=None):
+    return {"origin": {oid: normalize_refs("origin", dict(body), "proj") for oid, body in (origins or {}).items()},
+            "service": {sid: normalize_refs("service", dict(body), "proj") for sid, body in (services or {}).items()}}
+
+
+def _by_id(plan):
+    return {(a["kind"], a["id"]): a for a in plan["actions"]}
+
+
+def test_sample_configs_parse_into_portable_service_definitions():
+    definitions = load_definitions(SAMPLES, "proj")
+    assert sorted(d["id"] for d in definitions) == ["live-example", "vod-example"]
+    for d in definitions:
+        assert d["kind"] == "service"
+        rule = d["body"]["routing"]["pathMatchers"][0]["routeRules"][0]
+        assert rule["priority"] == 1
+        assert rule["origin"] == "projects/proj/locations/global/edgeCacheOrigins/steel-origin"
+        assert rule["headerAction"]["responseHeadersToAdd"][0]["headerValue"] == "1"
+        assert d["body"]["routing"]["hostRules"][0]["hosts"] == ["*"]
+        assert d["body"]["logConfig"] == {"enable": True, "sampleRate": 1.0}
+        assert "name" not in d["body"]
+
+
+def test_sample_configs_match_a_full_yaml_parser():
+    yaml = pytest.importorskip("yaml")
+    for name in sorted(os.listdir(SAMPLES)):
+        with open(os.path.join(SAMPLES, name)) as f:
+            text = f.read()
+        assert parse_yaml(text) == yaml.safe_load(text)
+
+
+def test_yaml_subset_features():
+    text = """
+# comment
+a: 'it''s'   # trailing comment
+b: [1, "two", {c: d}]
+block: |
+  line one
+  line two
+folded: >-
+  one
+  two
+items:
+- name: x
+  value: ~
+- - nested
+---
+second: true
+"""
+    first, second = parse_yaml(text)
+    assert first == {"a": "it's", "b": [1, "two", {"c": "d"}], "block": "line one\nline two\n", "folded": "one two",
+                     "items": [{"name": "x", "value": None}, ["nested"]]}
+    assert second == {"second": True}
+    with pytest.raises(Exception, match="anchors"):
+        parse_yaml("a: &anchor 1")
+
+
+def test_update_mask_treats_int64_strings_as_equal():
+    live = normalize_refs("service", _service("o", priority="1"), "proj")
+    desired = normalize_refs("service", _service("o", priority=1), "proj")
+    assert update_mask(desired, live) == []
+    desired = normalize_refs("service", dict(_service("o", priority=2), description="new"), "proj")
+    assert update_mask(desired, live) == ["description", "routing"]
+
+    plan = compute_plan(_definitions(origins={"o": _origin("o.example.com")}, services={"svc": _service("o")}),
+                        _live(origins={"o": _origin("o.example.com")}, services={"svc": _service("o", priority="1")}))
+    assert plan["summary"]["noop"] == 2
+    assert plan["errors"] == []
+
+
+def test_failover_chain_waves_with_prune():
+    definitions = _definitions(origins={"a": _origin("a.example.com", "b"), "b": _origin("b.example.com", "c"),
+                                        "c": _origin("c.example.com")},
+                               services={"svc": _service("a")})
+    live = _live(origins={"legacy": _origin("legacy.example.com", "legacy-backup"),
+                          "legacy-backup": _origin("backup.example.com"), "orphan": _origin("orphan.example.com")},
+                 services={"gone": _service("legacy")})
+    plan = compute_plan(definitions, live, prune=True)
+    assert plan["errors"] == []
+    waves = {key: a["wave"] for key, a in _by_id(plan).items()}
+    # Failover targets are created before the origins that point at them, services after all origins
+    assert waves[("origin", "c")] < waves[("origin", "b")] < waves[("origin", "a")] < waves[("service", "svc")]
+    # Deletes run services first, then origins parent before failover
+    assert waves[("service", "svc")] < waves[("service", "gone")] < waves[("origin", "legacy")]
+    assert waves[("origin", "legacy")] < waves[("origin", "legacy-backup")]
+    assert _by_id(plan)[("origin", "orphan")]["action"] == "delete"
+
+
+def test_prune_keeps_failover_targets_and_reports_missing_ones():
+    definitions = _definitions(origins={"a": _origin("a.example.com", "backup")}, services={"svc": _service("a")})
+    live = _live(origins={"a": _origin("a.example.com", "backup"), "backup": _origin("backup.example.com")})
+    plan = compute_plan(definitions, live, prune=True)
+    assert _by_id(plan)[("origin", "backup")]["action"] == "skip"
+    assert plan["errors"] == [{"resource": "origin/a", "message": "Failover origin 'backup' is neither defined nor live"}]
+
+    # Without prune the live failover stays and the plan is valid
+    plan = compute_plan(definitions, live)
+    assert plan["errors"] == []
+    assert ("origin", "backup") not in _by_id(plan)
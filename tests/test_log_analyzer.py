@@ -0,0 +1,81 @@
+import gzip
+import io
+import json
+
+from log_analyzer import LogAnalyzer, open_log_stream
+
+SERVICE = {"routing": {
+    "hostRules": [{"hosts": ["*"], "pathMatcher": "routes"}],
+    "pathMatchers": [{"name": "routes", "routeRules": [
+        {"priority": "1", "description": "manifests", "matchRules": [{"pathTemplateMatch": "/**.m3u8"}]},
+        {"priority": "2", "description": "segments", "matchRules": [{"pathTemplateMatch": "/**.ts"}]},
+    ]}]}}
+
+
+def _entry(path, hit, size=1000):
+    return {"httpRequest": {"requestUrl": f"https://cdn.example.com{path}", "status": 200, "responseSize": size,
+                            "cacheFillBytes": 0 if hit else size},
+            "jsonPayload": {"cacheStatus": "hit" if hit else "miss"}}
+
+
+def _lines():
+    entries = [_entry("/v/1/index.m3u8", hit=i % 2 == 0) for i in range(4)]
+    entries += [_entry(f"/v/1/seg{i}.ts", hit=i < 5) for i in range(6)]
+    entries.append(_entry("/other.jpg", hit=True))
+    return ("\n".join(json.dumps(e) for e in entries) + "\nnot json\n").encode()
+
+
+def _check(report):
+    assert report["summary"]["requests"] == 11
+    assert report["summary"]["hits"] == 8
+    assert report["summary"]["hit_ratio"] == round(8 / 11, 4)
+    rules = {r["description"]: r for r in report["rules"]}
+    assert rules["manifests"]["requests"] == 4 and rules["manifests"]["hit_ratio"] == 0.5
+    assert rules["segments"]["requests"] == 6 and rules["segments"]["hits"] == 5
+    assert report["unrouted"]["requests"] == 1
+    assert report["bad_lines"] == 1
+
+
+def _analyze(*paths):
+    analyzer = LogAnalyzer(SERVICE)
+    for path in paths:
+        with open(path, "rb") as f:
+            analyzer.add_stream(open_log_stream(f))
+    return analyzer.report()
+
+
+def test_plain_jsonl(tmp_path):
+    path = tmp_path / "logs.jsonl"
+    path.write_bytes(_lines())
+    _check(_analyze(path))
+
+
+def test_gzipped_jsonl(tmp_path):
+    path = tmp_path / "logs.jsonl.gz"
+    path.write_bytes(gzip.compress(_lines()))
+    _check(_analyze(path))
+
+
+def test_gz_name_with_decompressed_content(tmp_path):
+    # GCS decompresses Content-Encoding: gzip objects for clients that do not accept gzip
+    path = tmp_path / "logs.jsonl.gz"
+    path.write_bytes(_lines())
+    _check(_analyze(path))
+
+
+def test_unbuffered_stream_is_sniffed():
+    class Raw(io.RawIOBase):
+        def __init__(self, data):
+            self.data = io.BytesIO(data)
+
+        def readable(self):
+            return True
+
+        def readinto(self, b):
+            chunk = self.data.read(len(b))
+            b[:len(chunk)] = chunk
+            return len(chunk)
+
+    analyzer = LogAnalyzer(SERVICE)
+    analyzer.add_stream(open_log_stream(Raw(gzip.compress(_lines()))))
+    _check(analyzer.report())
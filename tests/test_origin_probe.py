@@ -0,0 +1,101 @@
+import http.server
+import shutil
+import socket
+import ssl
+import subprocess
+import threading
+
+import pytest
+
+from origin_probe import probe_origin, probe_origins
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        status = 503 if self.path == "/down" else 200
+        self.send_response(status)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+def _serve(context=None):
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    if context is not None:
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+@pytest.fixture
+def http_origin():
+    server = _serve()
+    yield server.server_address[1]
+    server.shutdown()
+
+
+@pytest.fixture
+def https_origin(tmp_path):
+    if not shutil.which("openssl"):
+        pytest.skip("openssl is needed to create a self-signed certificate")
+    cert, key = tmp_path / "cert.pem", tmp_path / "key.pem"
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1", "-subj", "/CN=localhost",
+                    "-keyout", str(key), "-out", str(cert)], check=True, capture_output=True)
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(str(cert), str(key))
+    server = _serve(context)
+    yield server.server_address[1]
+    server.shutdown()
+
+
+@pytest.fixture
+def closed_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_http_probe_times_each_phase(http_origin):
+    summary = probe_origin({"origin_dns": "127.0.0.1", "port": http_origin, "protocol": "HTTP"}, samples=3)
+    assert summary["successes"] == 3
+    assert summary["statuses"] == [200]
+    for phase in ("dns_ms", "connect_ms", "ttfb_ms", "total_ms"):
+        assert set(summary[phase]) == {"p50", "p90", "p99", "min"}
+    assert "tls_ms" not in summary
+
+
+def test_https_probe_includes_tls_phase(https_origin):
+    origin = {"origin_dns": "127.0.0.1", "port": https_origin, "protocol": "HTTPS", "host_header": "localhost"}
+    summary = probe_origin(origin, samples=2, verify_tls=False)
+    assert summary["successes"] == 2
+    assert summary["tls_ms"]["p50"] >= 0
+
+    # The self-signed certificate fails verification unless it is skipped
+    verified = probe_origin(origin, samples=1)
+    assert verified["successes"] == 0
+    assert "SSL" in verified["errors"][0]
+
+
+def test_server_errors_and_refused_connections_fail(http_origin, closed_port):
+    down = probe_origin({"origin_dns": "127.0.0.1", "port": http_origin, "protocol": "HTTP", "path": "/down"}, samples=2)
+    assert down["statuses"] == [503]
+    assert down["success_rate"] == 0
+
+    refused = probe_origin({"origin_dns": "127.0.0.1", "port": closed_port, "protocol": "HTTP"}, samples=2, timeout=1)
+    assert refused["success_rate"] == 0
+    assert refused["errors"][0].startswith("ConnectionRefusedError")
+    assert "total_ms" not in refused
+
+
+def test_recommends_only_healthy_origins(http_origin, closed_port):
+    healthy = {"origin_dns": "127.0.0.1", "port": http_origin, "protocol": "HTTP"}
+    refused = {"origin_dns": "localhost", "port": closed_port, "protocol": "HTTP"}
+    report = probe_origins([refused, healthy], samples=2, timeout=1)
+    assert [s["success_rate"] for s in report["origins"]] == [0, 1]
+    assert report["recommendation"]["origin"] == "127.0.0.1"
+
+    report = probe_origins([refused], samples=1, timeout=1)
+    assert report["recommendation"]["origin"] is None
@@ -0,0 +1,70 @@
+import functools
+import http.server
+import threading
+
+import pytest
+
+from prewarm import Prewarmer
+
+SEGMENT = b"x" * 1000
+
+MPD = """<?xml version="1.0"?>
+<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static" mediaPresentationDuration="PT6S">
+  <Period><AdaptationSet>
+    <SegmentTemplate initialization="$RepresentationID$/init.mp4" media="$RepresentationID$/$Number$.m4s" startNumber="1">
+      <SegmentTimeline><S t="0" d="2" r="2"/></SegmentTimeline>
+    </SegmentTemplate>
+    <Representation id="a" bandwidth="1000"/>
+  </AdaptationSet></Period>
+</MPD>"""
+
+
+class _QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def origin(tmp_path):
+    files = {
+        "hls/master.m3u8": "#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH=1000\nv1/index.m3u8\n",
+        "hls/v1/index.m3u8": "#EXTM3U\n#EXT-X-MAP:URI=\"init.mp4\"\n" + "".join(f"#EXTINF:2,\nseg{i}.ts\n" for i in range(5)),
+        "dash/stream.mpd": MPD,
+        "bad/stream.mpd": MPD.replace('d="2" r="2"', 'r="2"'),
+    }
+    for name, text in files.items():
+        (tmp_path / name).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / name).write_text(text)
+    for name in ["hls/v1/init.mp4"] + [f"hls/v1/seg{i}.ts" for i in range(5)] + ["dash/a/init.mp4"] + [f"dash/a/{i}.m4s" for i in (1, 2, 3)]:
+        (tmp_path / name).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / name).write_bytes(SEGMENT)
+
+    handler = functools.partial(_QuietHandler, directory=str(tmp_path))
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+def test_crawls_hls_and_dash_trees(origin):
+    stats = Prewarmer(concurrency=4).run([f"{origin}/hls/master.m3u8", f"{origin}/dash/stream.mpd"])
+    assert stats["manifests"] == 3
+    assert stats["segments"] == 6 + 4
+    assert stats["errors"] == 0
+    assert not stats["budget_exhausted"]
+    assert stats["bytes"] > 10 * len(SEGMENT)
+
+
+def test_byte_budget_stops_scheduling(origin):
+    stats = Prewarmer(concurrency=1, byte_budget=3 * len(SEGMENT)).run([f"{origin}/hls/master.m3u8"])
+    assert stats["budget_exhausted"]
+    assert stats["bytes"] >= 3 * len(SEGMENT)
+    assert stats["segments"] < 6
+
+
+def test_bad_objects_are_recorded_per_url(origin):
+    stats = Prewarmer(concurrency=2).run([f"{origin}/bad/stream.mpd", f"{origin}/hls/missing.m3u8", f"{origin}/hls/master.m3u8"])
+    assert stats["errors"] == 2
+    assert {f["url"].rsplit("/", 2)[-2] for f in stats["failures"]} == {"bad", "hls"}
+    assert any("TypeError" in f["error"] for f in stats["failures"])
+    assert stats["segments"] == 6
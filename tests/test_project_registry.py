@@ -0,0 +1,51 @@
+import json
+import os
+import threading
+import time
+
+from project_registry import ProjectRegistry
+
+
+def _write_key(path, project_id, private_key, mtime):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({"project_id": project_id, "private_key": private_key}))
+    os.utime(path, (mtime, mtime))
+
+
+def _pool_threads(project_id):
+    return [t for t in threading.enumerate() if t.name.startswith(f"gcp-{project_id}_")]
+
+
+def test_replaced_and_removed_contexts_release_their_pools(tmp_path):
+    _write_key(tmp_path / "key.json", "rotated", "k1", 1000)
+    _write_key(tmp_path / "projects" / "other.json", "removed", "k1", 1000)
+    registry = ProjectRegistry(str(tmp_path))
+    old, removed = registry.get("rotated"), registry.get("removed")
+    assert old.map(lambda x: x * 2, [1, 2, 3]) == [2, 4, 6]
+    removed.map(str, [1])
+    assert _pool_threads("rotated") and _pool_threads("removed")
+
+    _write_key(tmp_path / "key.json", "rotated", "k2", 2000)
+    (tmp_path / "projects" / "other.json").unlink()
+    registry.reload()
+
+    assert registry.get("rotated") is not old
+    deadline = time.time() + 5
+    while (_pool_threads("rotated") or _pool_threads("removed")) and time.time() < deadline:
+        time.sleep(0.05)
+    assert not _pool_threads("rotated") and not _pool_threads("removed")
+    # A request still holding the replaced context keeps working, without a new pool
+    assert old.map(lambda x: x + 1, [1, 2]) == [2, 3]
+    assert not _pool_threads("rotated")
+
+
+def test_unchanged_key_keeps_its_pool(tmp_path):
+    _write_key(tmp_path / "key.json", "steady", "k1", 1000)
+    registry = ProjectRegistry(str(tmp_path))
+    ctx = registry.get()
+    ctx.map(str, [1])
+    os.utime(tmp_path / "key.json", (2000, 2000))
+    registry.reload()
+    assert registry.get() is ctx
+    assert ctx.map(str, [2]) == ["2"]
+    assert _pool_threads("steady")
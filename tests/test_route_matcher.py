@@ -0,0 +1,49 @@
+from route_matcher import RouteMatcher, simulate
+
+
+def _service(*rules):
+    return {"routing": {"hostRules": [{"hosts": ["*"], "pathMatcher": "routes"}],
+                        "pathMatchers": [{"name": "routes", "routeRules": list(rules)}]}}
+
+
+BLOCKING = {"priority": "2", "description": "blocking",
+            "matchRules": [{"pathTemplateMatch": "/**.m3u8", "queryParameterMatches": [{"name": "_HLS_msn", "presentMatch": True}]}]}
+PLAYLIST = {"priority": "3", "description": "playlist", "matchRules": [{"pathTemplateMatch": "/**.m3u8"}]}
+DEFAULT = {"priority": "49", "description": "default", "matchRules": [{"prefixMatch": "/"}]}
+
+
+def test_query_parameter_present_match():
+    matcher = RouteMatcher(_service(BLOCKING, PLAYLIST, DEFAULT))
+    assert matcher.match("/live/index.m3u8?_HLS_msn=12&_HLS_part=1")["description"] == "blocking"
+    assert matcher.match("/live/index.m3u8")["description"] == "playlist"
+    assert matcher.match("/live/index.m3u8?other=1")["description"] == "playlist"
+    # The path-only result is cached; the condition is still evaluated per request
+    assert matcher.match("/live/index.m3u8?_HLS_msn=13")["description"] == "blocking"
+
+
+def test_exact_and_regex_matches():
+    rule = {"priority": "1", "description": "hd",
+            "matchRules": [{"prefixMatch": "/", "queryParameterMatches": [{"name": "q", "exactMatch": "hd"}]},
+                           {"prefixMatch": "/", "queryParameterMatches": [{"name": "v", "regexMatch": "[0-9]+"}]}]}
+    matcher = RouteMatcher(_service(rule, DEFAULT))
+    assert matcher.match("/a?q=hd")["description"] == "hd"
+    assert matcher.match("/a?q=sd")["description"] == "default"
+    assert matcher.match("/a?v=42")["description"] == "hd"
+    assert matcher.match("/a?v=4x")["description"] == "default"
+
+
+def test_header_matches():
+    rule = {"priority": "1", "description": "tv",
+            "matchRules": [{"prefixMatch": "/", "headerMatches": [{"headerName": "User-Agent", "prefixMatch": "SmartTV"}]}]}
+    inverted = {"priority": "2", "description": "no-referer",
+                "matchRules": [{"prefixMatch": "/", "headerMatches": [{"headerName": "Referer", "presentMatch": True, "invertMatch": True}]}]}
+    matcher = RouteMatcher(_service(rule, inverted, DEFAULT))
+    assert matcher.match("/a", headers={"user-agent": "SmartTV/1.0"})["description"] == "tv"
+    assert matcher.match("/a", headers={"User-Agent": "curl", "Referer": "x"})["description"] == "default"
+    assert matcher.match("/a")["description"] == "no-referer"
+
+
+def test_simulate_attributes_blocking_reloads():
+    report = simulate(_service(BLOCKING, PLAYLIST, DEFAULT), ["/l/i.m3u8?_HLS_msn=1", "/l/i.m3u8", "/l/1.ts"])
+    hits = {r["description"]: r["hits"] for r in report["rules"]}
+    assert hits == {"blocking": 1, "playlist": 1, "default": 1}
@@ -0,0 +1,21 @@
+from main import build_service_body
+
+
+def _rules(**payload):
+    payload = dict({"project_id": "p", "origin_name": "o", "domain": "live.example.com", "setup_type": "LowLatency"},
+                   **payload)
+    rules = build_service_body(payload)["routing"]["pathMatchers"][0]["routeRules"]
+    return {rule["description"]: rule["routeAction"]["cdnPolicy"] for rule in rules}
+
+
+def test_default_part_patterns_skip_negative_caching():
+    policies = _rules()
+    assert "negativeCaching" not in policies["LL-HLS Partial Segments"]
+    assert policies["LL Media Segments (ts)"]["negativeCachingPolicy"] == {"410": "60s"}
+
+
+def test_custom_part_patterns_are_tuned_as_parts():
+    policies = _rules(ll_part_patterns=["/**-part*.m4s", "/**/parts/**"])
+    part = policies["LL-HLS Partial Segments"]
+    assert "negativeCaching" not in part
+    assert part["cacheKeyPolicy"] == {"excludeQueryString": True}
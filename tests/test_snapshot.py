@@ -0,0 +1,70 @@
+import gzip
+import io
+import json
+
+import snapshot
+from fleet import normalize_refs
+from snapshot import SNAPSHOT_FORMAT, SNAPSHOT_VERSION, restore_snapshot
+
+
+def _origin(address, failover=None):
+    body = {"originAddress": address, "protocol": "HTTPS", "port": 443}
+    if failover:
+        body["failoverOrigin"] = failover
+    return body
+
+
+def _service(origin):
+    return {"routing": {"hostRules": [{"hosts": ["*"], "pathMatcher": "routes"}],
+                        "pathMatchers": [{"name": "routes", "routeRules": [
+                            {"priority": "1", "matchRules": [{"prefixMatch": "/"}], "origin": origin}]}]}}
+
+
+def _archive(records):
+    header = {"format": SNAPSHOT_FORMAT, "version": SNAPSHOT_VERSION, "project": "source", "created_at": "2026-01-01T00:00:00Z"}
+    lines = [json.dumps(header)] + [json.dumps(r) for r in records]
+    return gzip.compress(("\n".join(lines) + "\n").encode())
+
+
+def test_dry_run_restore_batches_origins_then_services(monkeypatch):
+    records = [
+        {"kind": "keyset", "id": "ks", "reference": {"name": "projects/source/locations/global/edgeCacheKeysets/ks"}},
+        {"kind": "certificate", "id": "cert", "reference": {"name": "projects/source/locations/global/certificates/cert"}},
+        {"kind": "origin", "id": "primary", "body": _origin("primary.example.com", "backup")},
+        {"kind": "origin", "id": "backup", "body": _origin("backup.example.com")},
+        {"kind": "origin", "id": "bad", "body": {"protocol": "HTTPS"}},
+        {"kind": "service", "id": "s1", "body": _service("primary")},
+        {"kind": "service", "id": "s2", "body": _service("missing")},
+        {"kind": "service", "id": "s3", "body": _service("backup")},
+    ]
+    data = _archive(records)
+    live = {"origin": {"backup": normalize_refs("origin", _origin("backup.example.com"), "target")}, "service": {}}
+    present = {"edgeCacheKeysets": [{"name": "projects/target/locations/global/edgeCacheKeysets/ks"}], "certificates": []}
+    monkeypatch.setattr(snapshot, "RESTORE_BATCH", 2)
+    monkeypatch.setattr(snapshot, "open_gcs_object", lambda bucket, name, token, generation=None: io.BytesIO(data))
+    monkeypatch.setattr(snapshot, "fetch_live", lambda project_id, token, concurrency: live)
+    monkeypatch.setattr(snapshot, "list_all_resources", lambda url, key, token: present[key])
+    streamed = []
+
+    report = restore_snapshot("target", "token", "bucket", "snap.jsonl.gz", dry_run=True, on_result=streamed.append)
+
+    results = {(r["kind"], r["id"]): r for r in report["results"]}
+    assert results[("origin", "backup")]["status"] == "unchanged"
+    assert results[("origin", "primary")]["status"] == "planned"
+    assert results[("origin", "primary")]["action"] == "create"
+    # Invalid resources are rejected without failing the rest of their batch
+    assert results[("origin", "bad")]["status"] == "failed"
+    assert "originAddress" in results[("origin", "bad")]["error"]
+    assert results[("service", "s2")]["status"] == "failed"
+    assert "'missing'" in results[("service", "s2")]["error"]
+    # s1 is validated against 'primary', planned in the earlier origin batch
+    assert results[("service", "s1")]["status"] == "planned"
+    assert results[("service", "s3")]["status"] == "planned"
+
+    assert [r["kind"] for r in report["results"]][:3] == ["origin"] * 3
+    assert report["missing_references"] == ["certificate/cert"]
+    assert report["summary"] == {"unchanged": 1, "planned": 3, "failed": 2}
+    assert report["source_project"] == "source"
+    assert streamed == report["results"]
+    # Planned resources join the in-memory inventory that later batches validate against
+    assert "primary" in live["origin"] and "s1" in live["service"]